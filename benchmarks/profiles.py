@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool key profile benchmarks
+#
+# For every key profile (--key-type, --key-size, --key-primes) a CA and a
+# server key set of that profile are generated, then timed:
+#
+#   keygen     generating a private key
+#   sign       signing the server certificate (genServerCert)
+#   handshake  a full TLS handshake against the server key set, both ends
+#              in this process over memory BIOs (no network, no resumption)
+#
+# The results (seconds per call: min, median, mean, max) are printed as JSON
+# like benchmarks/stages.py does, or as a table of the medians (--table).
+#
+#   python3 benchmarks/profiles.py --table
+#
+# $Id$
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import ssl
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from katello_certs_tools import api, katello_ssl_tool, sslToolBackend  # noqa: E402
+from katello_certs_tools.sslToolConfig import keyProfileName  # noqa: E402
+
+from stages import PASSWORD, HOSTNAME, _time, _openssl  # noqa: E402
+
+# (key type, key size, RSA primes)
+PROFILES = (
+    ('rsa', 2048, 2),
+    ('rsa', 3072, 2),
+    ('rsa', 4096, 2),
+    ('rsa', 4096, 3),
+    ('ecdsa', 256, 2),
+    ('ecdsa', 384, 2),
+    ('ed25519', 256, 2),
+)
+
+
+def _handshake(serverContext, clientContext):
+    """ one TLS handshake between two contexts, pumped through memory BIOs """
+
+    serverIn, serverOut, clientIn, clientOut = [ssl.MemoryBIO() for _i in range(4)]
+    server = serverContext.wrap_bio(serverIn, serverOut, server_side=True)
+    client = clientContext.wrap_bio(clientIn, clientOut, server_hostname=HOSTNAME)
+    ends = [(client, clientOut, serverIn), (server, serverOut, clientIn)]
+    done = set()
+    for _i in range(20):
+        for end, out, peerIn in ends:
+            if end not in done:
+                try:
+                    end.do_handshake()
+                    done.add(end)
+                except ssl.SSLWantReadError:
+                    pass
+            data = out.read()
+            if data:
+                peerIn.write(data)
+        if len(done) == 2:
+            return
+    raise RuntimeError('the TLS handshake did not complete')
+
+
+def runProfile(profile, workDir, args):
+    """ {benchmark: summary} of one key profile """
+
+    keyType, keySize, primes = profile
+    buildDir = os.path.join(workDir, keyProfileName(profile))
+    options = dict(dir=buildDir, crypto_backend=args.backend, key_type=keyType,
+                   key_size=keySize, key_primes=primes)
+
+    ca = api.genCa(PASSWORD, force=True, rpm=False, set_common_name='example.com', **options)
+    server = api.genServer(HOSTNAME, PASSWORD, rpm=False, **options)
+    d = api.settings(0, set_hostname=HOSTNAME, **options)
+
+    results = {}
+    keyFile = os.path.join(workDir, '%s.key' % keyProfileName(profile))
+    backend = sslToolBackend.getBackend(args.backend)
+    results['keygen'] = _time(lambda: backend.genPrivateKey(keyFile, profile=profile),
+                              args.key_iterations)
+    results['sign'] = _time(lambda: katello_ssl_tool.genServerCert(PASSWORD, d, -1), args.iterations)
+
+    serverContext = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    serverContext.load_cert_chain(server.paths['server-cert'], server.paths['server-key'])
+    clientContext = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    clientContext.load_verify_locations(ca.paths['ca-cert'])
+    results['handshake'] = _time(lambda: _handshake(serverContext, clientContext),
+                                 args.handshakes)
+    return results
+
+
+def table(report):
+    """ the medians of every profile, in milliseconds """
+
+    header = ('PROFILE', 'KEYGEN ms', 'SIGN ms', 'HANDSHAKE ms', 'HANDSHAKES/s')
+    lines = ["%-14s %12s %12s %14s %14s" % header]
+    for name, results in report['results'].items():
+        if 'skipped' in results:
+            lines.append("%-14s skipped: %s" % (name, results['skipped']))
+            continue
+        handshake = results['handshake']['median']
+        lines.append("%-14s %12.1f %12.1f %14.2f %14.0f"
+                     % (name, results['keygen']['median'] * 1000, results['sign']['median'] * 1000,
+                        handshake * 1000, 1 / handshake if handshake else 0))
+    return '\n'.join(lines)
+
+
+def main():
+    names = [keyProfileName(p) for p in PROFILES]
+    parser = argparse.ArgumentParser(description='key profile benchmarks of katello-ssl-tool')
+    parser.add_argument('--profile', action='append', choices=names,
+                        help='profile to run, can be given more than once (default: all)')
+    parser.add_argument('--backend', choices=sorted(sslToolBackend.BACKENDS), default='openssl',
+                        help='crypto backend (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=10,
+                        help='certificates signed per profile (default: %(default)s)')
+    parser.add_argument('--key-iterations', type=int, default=3,
+                        help='keys generated per profile (default: %(default)s)')
+    parser.add_argument('--handshakes', type=int, default=200,
+                        help='TLS handshakes per profile (default: %(default)s)')
+    parser.add_argument('--label', help='free form name of this run, such as a release')
+    parser.add_argument('-o', '--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--table', action='store_true',
+                        help='print a table of the medians instead of the JSON')
+    args = parser.parse_args()
+
+    profiles = [p for p in PROFILES if keyProfileName(p) in (args.profile or names)]
+    workDir = tempfile.mkdtemp(prefix='katello-bench-')
+    cwd = os.getcwd()
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'openssl': _openssl(),
+        'ssl': ssl.OPENSSL_VERSION,
+        'backend': args.backend,
+        'iterations': args.iterations,
+        'key_iterations': args.key_iterations,
+        'handshakes': args.handshakes,
+        'results': {},
+    }
+    try:
+        # openssl writes into its working directory
+        os.chdir(workDir)
+        for profile in profiles:
+            name = keyProfileName(profile)
+            sys.stderr.write("benchmarking %s...\n" % name)
+            try:
+                report['results'][name] = runProfile(profile, workDir, args)
+            except (api.KatelloSslToolException, ssl.SSLError) as e:
+                # such as multi-prime keys with the cryptography backend
+                report['results'][name] = {'skipped': str(e).strip().splitlines()[-1]}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    text = table(report) if args.table else json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fo:
+            fo.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
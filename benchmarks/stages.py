@@ -0,0 +1,325 @@
+#!/usr/bin/python3
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool per-stage micro-benchmarks
+#
+# Times the stages of issuing a key set one by one, each in a scratch build
+# directory, in up to three modes:
+#
+#   openssl       the openssl and katello-certs-gen-rpm binaries
+#   standin       shell stand-ins for both that copy pre-made output: what
+#                 is left is process and Python overhead, no crypto or rpmbuild
+#   cryptography  the in-process python3-cryptography backend
+#
+# The results (seconds per call: min, median, mean, max) are printed as JSON,
+# so that runs of two releases can be compared (--compare OLD.json).
+#
+#   python3 benchmarks/stages.py --iterations 20 --rpms 200 -o results.json
+#
+# $Id$
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from katello_certs_tools import api, katello_ssl_tool, sslToolBackend  # noqa: E402
+from katello_certs_tools.fileutils import rotateFile  # noqa: E402
+from katello_certs_tools.sslToolCaCache import getCaInfo  # noqa: E402
+from katello_certs_tools.sslToolConfig import ConfigFile, SERVER_OPENSSL_CNF_NAME  # noqa: E402
+from katello_certs_tools.sslToolRpm import writeRpm  # noqa: E402
+from katello_certs_tools.sslToolSerial import allocateSerials  # noqa: E402
+
+MODES = ('openssl', 'standin', 'cryptography')
+PASSWORD = 'benchmark'
+HOSTNAME = 'bench.example.com'
+RPM_BUILDER = 'katello-certs-gen-rpm'
+
+STANDIN_OPENSSL = """\
+#!/bin/sh
+# benchmark stand-in for openssl: copies pre-made output, no crypto
+FIXTURES='%(fixtures)s'
+out=
+prev=
+for arg in "$@" ; do
+  [ "$prev" = "-out" ] && out=$arg
+  prev=$arg
+done
+case "$1" in
+  genpkey|genrsa) cp "$FIXTURES/server.key" "$out" ;;
+  req) case " $* " in
+         *" -x509 "*) cp "$FIXTURES/ca.crt" "$out" ;;
+         *) cp "$FIXTURES/server.csr" "$out" ;;
+       esac ;;
+  ca) cp "$FIXTURES/server.crt" "$out" ;;
+  *) exec '%(openssl)s' "$@" ;;
+esac
+"""
+
+STANDIN_GEN_RPM = """\
+#!/bin/sh
+# benchmark stand-in for katello-certs-gen-rpm: empty files, no rpmbuild
+while [ $# -gt 0 ] ; do
+  case "$1" in
+    --name) name=$2 ; shift ;;
+    --version) version=$2 ; shift ;;
+    --release) release=$2 ; shift ;;
+    --*) shift ;;
+  esac
+  shift
+done
+: > "$name-$version-$release.noarch.rpm"
+: > "$name-$version-$release.src.rpm"
+"""
+
+
+def _summary(times):
+    return {
+        'n': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+    }
+
+
+def _time(func, iterations, setup=None):
+    times = []
+    for _i in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return _summary(times)
+
+
+def _which(program):
+    return shutil.which(program)
+
+
+def _rpmModule():
+    try:
+        import rpm  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _writeStandins(binDir, fixtures):
+    scripts = {
+        'openssl': STANDIN_OPENSSL % {'fixtures': fixtures, 'openssl': sslToolBackend.OPENSSL},
+        RPM_BUILDER: STANDIN_GEN_RPM,
+    }
+    for name, text in scripts.items():
+        path = os.path.join(binDir, name)
+        with open(path, 'w') as fo:
+            fo.write(text)
+        os.chmod(path, 0o755)
+    return os.path.join(binDir, 'openssl')
+
+
+def _makeFixtures(workDir):
+    """ a real CA and key set, the output the stand-ins hand out """
+
+    buildDir = os.path.join(workDir, 'fixtures-build')
+    ca = api.genCa(PASSWORD, force=True, rpm=False, dir=buildDir, set_common_name='example.com')
+    server = api.genServer(HOSTNAME, PASSWORD, rpm=False, dir=buildDir)
+    fixtures = os.path.join(workDir, 'fixtures')
+    os.mkdir(fixtures)
+    shutil.copy(ca.paths['ca-cert'], os.path.join(fixtures, 'ca.crt'))
+    for step, name in (('server-key', 'server.key'), ('server-cert-req', 'server.csr'),
+                       ('server-cert', 'server.crt')):
+        shutil.copy(server.paths[step], os.path.join(fixtures, name))
+    return fixtures
+
+
+def _makeRpms(rpmDir, count):
+    """ count versions of one package, written natively (no rpmbuild) """
+
+    os.mkdir(rpmDir)
+    payload = os.path.join(rpmDir, 'payload')
+    with open(payload, 'w') as fo:
+        fo.write('benchmark\n')
+    for i in range(count):
+        writeRpm(rpmDir, 'bench-rpm', '1.0', str(i + 1), ['/etc/bench=%s' % payload],
+                 'benchmark', 'benchmark')
+    return os.path.join(rpmDir, 'bench-rpm')
+
+
+def runStages(mode, workDir, args):
+    """ {stage: summary} of one mode """
+
+    results = {}
+    skip = {}
+    backend = 'cryptography' if mode == 'cryptography' else 'openssl'
+    buildDir = os.path.join(workDir, mode)
+    options = dict(dir=buildDir, crypto_backend=backend)
+
+    # the CA itself is not benchmarked
+    api.genCa(PASSWORD, force=True, rpm=False, set_common_name='example.com', **options)
+    d = api.settings(0, set_hostname=HOSTNAME, **options)
+    hostDir = os.path.join(buildDir, HOSTNAME)
+    katello_ssl_tool.genServerKey(d, -1)
+
+    if not _rpmModule():
+        skip['rpm-version-cold'] = skip['rpm-version-warm'] = skip['server-rpm'] = \
+            skip['server-rpm-native'] = 'the rpm python module is not available'
+    elif mode == 'openssl' and not _which(RPM_BUILDER):
+        skip['server-rpm'] = '%s is not on the PATH' % RPM_BUILDER
+
+    keyFile = os.path.join(workDir, '%s.key' % mode)
+    results['keygen'] = _time(lambda: sslToolBackend.getBackend(backend).genPrivateKey(keyFile),
+                              args.key_iterations)
+    results['csr'] = _time(lambda: katello_ssl_tool.genServerCertReq(d, -1), args.iterations)
+    results['sign'] = _time(lambda: katello_ssl_tool.genServerCert(PASSWORD, d, -1), args.iterations)
+
+    caSerial = getCaInfo(os.path.join(buildDir, d['--ca-cert']), buildDir, backend)['serial']
+    results['serial'] = _time(lambda: allocateSerials(d, caSerial), args.iterations)
+
+    hostCnf = os.path.join(hostDir, SERVER_OPENSSL_CNF_NAME)
+    saveCnf = os.path.join(workDir, '%s-save.cnf' % mode)
+    results['config-parse'] = _time(lambda: ConfigFile(hostCnf).parse(), args.iterations)
+    results['config-save'] = _time(lambda: ConfigFile(saveCnf).save(d, 0, -1), args.iterations)
+
+    rotated = os.path.join(workDir, '%s-rotated.txt' % mode)
+    with open(rotated, 'w') as fo:
+        fo.write('benchmark\n')
+    results['rotate'] = _time(lambda: rotateFile(rotated, verbosity=-1), args.iterations)
+
+    if 'rpm-version-cold' not in skip:
+        prefix = _makeRpms(os.path.join(workDir, '%s-rpms' % mode), args.rpms)
+        index = os.path.join(os.path.dirname(prefix), 'katello-rpm-index.json')
+
+        def dropIndex():
+            if os.path.exists(index):
+                os.unlink(index)
+
+        lookup = lambda: katello_ssl_tool.get_max_rpm_version('bench-rpm', prefix)  # noqa: E731
+        results['rpm-version-cold'] = _time(lookup, args.iterations, dropIndex)
+        results['rpm-version-warm'] = _time(lookup, args.iterations)
+
+    for stage, builder in (('server-rpm', RPM_BUILDER), ('server-rpm-native', 'native')):
+        if stage not in skip:
+            rd = api.settings(0, set_hostname=HOSTNAME, rpm_builder=builder, **options)
+            results[stage] = _time(lambda: katello_ssl_tool.genServerRpm(rd, -1), args.iterations)
+
+    for stage, reason in skip.items():
+        results[stage] = {'skipped': reason}
+    return results
+
+
+def _openssl():
+    try:
+        return subprocess.check_output([sslToolBackend.OPENSSL, 'version']).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """ print the median of every stage of two result files side by side """
+
+    print("%-20s %-13s %12s %12s %8s" % ('STAGE', 'MODE', 'OLD', 'NEW', 'NEW/OLD'))
+    for mode in MODES:
+        for stage in sorted(new['results'].get(mode, {})):
+            a = old['results'].get(mode, {}).get(stage, {}).get('median')
+            b = new['results'][mode][stage].get('median')
+            if a is None or b is None:
+                continue
+            print("%-20s %-13s %12.6f %12.6f %8.2f" % (stage, mode, a, b, b / a if a else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='per-stage micro-benchmarks of katello-ssl-tool')
+    parser.add_argument('--mode', action='append', choices=MODES,
+                        help='mode to run, can be given more than once (default: all available)')
+    parser.add_argument('--iterations', type=int, default=10,
+                        help='calls per stage (default: %(default)s)')
+    parser.add_argument('--key-iterations', type=int, default=3,
+                        help='calls of the (slow) key generation stage (default: %(default)s)')
+    parser.add_argument('--rpms', type=int, default=100,
+                        help='RPMs in the directory for the RPM version lookup (default: %(default)s)')
+    parser.add_argument('--label', help='free form name of this run, such as a release')
+    parser.add_argument('-o', '--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--compare', metavar='OLD_JSON',
+                        help='also print the medians of OLD_JSON next to these results')
+    args = parser.parse_args()
+
+    modes = args.mode or list(MODES)
+    if 'cryptography' in modes:
+        try:
+            sslToolBackend.getBackend('cryptography')
+        except sslToolBackend.CryptoBackendException:
+            sys.stderr.write("skipping cryptography: python3-cryptography is not available\n")
+            modes.remove('cryptography')
+
+    workDir = tempfile.mkdtemp(prefix='katello-bench-')
+    cwd = os.getcwd()
+    path = os.environ.get('PATH', '')
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'openssl': _openssl(),
+        'iterations': args.iterations,
+        'key_iterations': args.key_iterations,
+        'rpms': args.rpms,
+        'results': {},
+    }
+    try:
+        # rpmbuild and openssl write into their working directory
+        os.chdir(workDir)
+        fixtures = _makeFixtures(workDir)
+        for mode in modes:
+            sys.stderr.write("benchmarking %s...\n" % mode)
+            if mode == 'standin':
+                binDir = os.path.join(workDir, 'bin')
+                os.mkdir(binDir)
+                sslToolBackend._backends['openssl'] = \
+                    sslToolBackend.OpensslBackend(_writeStandins(binDir, fixtures))
+                os.environ['PATH'] = binDir + os.pathsep + path
+            try:
+                report['results'][mode] = runStages(mode, workDir, args)
+            finally:
+                sslToolBackend._backends.pop('openssl', None)
+                os.environ['PATH'] = path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fo:
+            fo.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as fo:
+            compare(json.load(fo), report)
+
+
+if __name__ == '__main__':
+    main()
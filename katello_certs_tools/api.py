@@ -0,0 +1,246 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool python API
+#
+# The key set steps of katello-ssl-tool for use within another python
+# process: nothing is printed, nothing calls sys.exit() and the current
+# directory is left alone, so one process can issue any number of key sets.
+#
+# Options are keyword arguments named like the long commandline options
+# (dir, ca_key, ca_cert, set_cname, set_org, cert_expiration, crypto_backend,
+# rpm_builder, use_key_pool, ...). Whatever is not given is figured the way
+# the commandline does it. Every function returns a Result; failures raise
+# the exceptions below, all KatelloSslToolException subclasses (ERROR_CODES
+# maps them to katello-ssl-tool's exit codes).
+#
+# progress, if given, is called as progress(step, path, seconds) after each
+# step: 'ca-key', 'ca-cert', 'ca-rpm', 'server-key', 'server-cert-req',
+# 'server-cert' or 'server-rpm'.
+#
+#   from katello_certs_tools import api
+#   result = api.genServer('web1.example.com', password, dir='/root/ssl-build',
+#                          set_cname=['web1.internal'], rpm=False)
+#   result.paths['server-cert'], result.serial, result.fingerprint
+#
+# $Id$
+
+import time
+from optparse import Values
+
+from katello_certs_tools import katello_ssl_tool
+from katello_certs_tools.katello_ssl_tool import ERROR_CODES, \
+        GenPrivateCaKeyException, GenPublicCaCertException, GenCaCertRpmException, \
+        GenServerKeyException, GenServerCertReqException, GenServerCertException, \
+        GenServerRpmException, FailedFileDependencyException, FileExistsException, \
+        MissingPasswordException
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+from katello_certs_tools.sslToolCli import checkSettings, CertExpTooShortException, \
+        CertExpTooLongException, InvalidCountryCodeException, InvalidKeyProfileException
+from katello_certs_tools.sslToolSettings import Settings
+from katello_certs_tools.sslToolBackend import certFingerprint
+from katello_certs_tools.sslToolCaCache import getCaInfo
+from katello_certs_tools.sslToolSerial import allocateSerials
+
+__all__ = [
+    'Result', 'settings',
+    'genCaKey', 'genCaCert', 'genCaRpm', 'genCa',
+    'genServerKey', 'genServerCertReq', 'genServerCert', 'genServerRpm', 'genServer',
+    'ERROR_CODES', 'KatelloSslToolException',
+    'GenPrivateCaKeyException', 'GenPublicCaCertException', 'GenCaCertRpmException',
+    'GenServerKeyException', 'GenServerCertReqException', 'GenServerCertException',
+    'GenServerRpmException', 'FailedFileDependencyException', 'FileExistsException',
+    'MissingPasswordException', 'CertExpTooShortException', 'CertExpTooLongException',
+    'InvalidCountryCodeException', 'InvalidKeyProfileException',
+    ]
+
+# nothing is printed at this verbosity
+_QUIET = -1
+
+# the keyword arguments settings() understands
+_OPTIONS = frozenset(key[2:].replace('-', '_') for key in Settings(None))
+
+
+class Result:
+    """ what a call produced """
+
+    def __init__(self):
+        self.paths = {}             # step --> the file it wrote
+        self.serial = None          # serial number (int) of the certificate
+        self.fingerprint = None     # SHA256 fingerprint, AB:CD:...
+        self.timings = {}           # step --> seconds
+
+    def __repr__(self):
+        return '<Result paths=%r serial=%r fingerprint=%r>' \
+            % (self.paths, self.serial, self.fingerprint)
+
+
+def settings(caYN=0, **options):
+    """ the Settings (the '--option' mapping the generation code reads)
+        for keyword options, checked like a commandline is.
+    """
+
+    unknown = set(options) - _OPTIONS
+    if unknown:
+        raise TypeError("unknown option(s): %s" % ', '.join(sorted(unknown)))
+
+    overrides = {}
+    if options.get('purpose'):
+        # the commandline only knows --gen-server and --gen-client
+        overrides['--purpose'] = options.pop('purpose')
+    s = Settings(Values(options), caYN, overrides)
+    checkSettings(s)
+    return s
+
+
+def _runSteps(steps, progress):
+    """ run [(step, func, args), ...], every func returning the file it
+        wrote. Returns the Result.
+    """
+
+    result = Result()
+    for step, func, args in steps:
+        start = time.time()
+        path = func(*args)
+        result.timings[step] = time.time() - start
+        result.paths[step] = path
+        if progress is not None:
+            progress(step, path, result.timings[step])
+    return result
+
+
+def _caInfo(result, d):
+    info = getCaInfo(result.paths['ca-cert'], d['--dir'], d.get('--crypto-backend'))
+    result.serial = info['serial']
+    result.fingerprint = info['fingerprint']
+    return result
+
+
+def _reserveSerial(d, serial=None):
+    """ the serial for a server certificate, reserved up front so that the
+        result can tell it
+    """
+
+    if serial is None:
+        ca_cert = katello_ssl_tool.pathJoin(d['--dir'], d['--ca-cert'])
+        caInfo = getCaInfo(ca_cert, d['--dir'], d.get('--crypto-backend'))
+        serial = allocateSerials(d, caInfo['serial'])[0]
+    return serial
+
+
+def _certResult(result, serial):
+    result.serial = serial
+    result.fingerprint = certFingerprint(result.paths['server-cert'])
+    return result
+
+
+#
+# CA
+#
+
+def genCaKey(password, force=False, progress=None, **options):
+    """ the CA private key """
+
+    d = settings(1, **options)
+    return _runSteps([('ca-key', katello_ssl_tool.genPrivateCaKey, (password, d, _QUIET, force))],
+                     progress)
+
+
+def genCaCert(password, force=False, progress=None, **options):
+    """ the CA certificate, for an existing CA private key """
+
+    d = settings(1, **options)
+    result = _runSteps([('ca-cert', katello_ssl_tool.genPublicCaCert, (password, d, _QUIET, force))],
+                       progress)
+    return _caInfo(result, d)
+
+
+def genCaRpm(progress=None, **options):
+    """ the CA certificate RPM """
+
+    d = settings(1, **options)
+    katello_ssl_tool.genCaRpm_dependencies(d)
+    return _runSteps([('ca-rpm', katello_ssl_tool.genCaRpm, (d, _QUIET))], progress)
+
+
+def genCa(password, force=False, rpm=True, progress=None, **options):
+    """ CA private key, certificate and (rpm) the certificate RPM """
+
+    d = settings(1, **options)
+    steps = [('ca-key', katello_ssl_tool.genPrivateCaKey, (password, d, _QUIET, force)),
+             ('ca-cert', katello_ssl_tool.genPublicCaCert, (password, d, _QUIET, force))]
+    if rpm:
+        steps.append(('ca-rpm', katello_ssl_tool.genCaRpm, (d, _QUIET)))
+    return _caInfo(_runSteps(steps, progress), d)
+
+
+#
+# server (or client) key sets
+#
+
+def genServerKey(hostname, progress=None, **options):
+    """ the private key of hostname """
+
+    d = settings(0, set_hostname=hostname, **options)
+    return _runSteps([('server-key', katello_ssl_tool.genServerKey, (d, _QUIET))], progress)
+
+
+def genServerCertReq(hostname, progress=None, **options):
+    """ the certificate request of hostname, for an existing private key """
+
+    d = settings(0, set_hostname=hostname, **options)
+    katello_ssl_tool.genServerCertReq_dependencies(d)
+    return _runSteps([('server-cert-req', katello_ssl_tool.genServerCertReq, (d, _QUIET))],
+                     progress)
+
+
+def genServerCert(hostname, password, serial=None, progress=None, **options):
+    """ the certificate of hostname, signed for an existing request. serial
+        defaults to the next one of the CA (or a random one, random_serial).
+    """
+
+    d = settings(0, set_hostname=hostname, **options)
+    katello_ssl_tool.genServerCert_dependencies(password, d)
+    serial = _reserveSerial(d, serial)
+    result = _runSteps([('server-cert', katello_ssl_tool.genServerCert, (password, d, _QUIET, serial))],
+                       progress)
+    return _certResult(result, serial)
+
+
+def genServerRpm(hostname, progress=None, **options):
+    """ the key set RPM of hostname, for an existing key, request and certificate """
+
+    d = settings(0, set_hostname=hostname, **options)
+    katello_ssl_tool.genServerRpm_dependencies(d)
+    return _runSteps([('server-rpm', katello_ssl_tool.genServerRpm, (d, _QUIET))], progress)
+
+
+def genServer(hostname, password, rpm=True, client=False, progress=None, **options):
+    """ the whole key set of hostname: private key, certificate request,
+        certificate and (rpm) key set RPM. client: a client certificate.
+    """
+
+    if client:
+        options.setdefault('purpose', 'client')
+    d = settings(0, set_hostname=hostname, **options)
+    katello_ssl_tool.genServer_dependencies(password, d)
+    serial = _reserveSerial(d)
+
+    steps = [('server-key', katello_ssl_tool.genServerKey, (d, _QUIET)),
+             ('server-cert-req', katello_ssl_tool.genServerCertReq, (d, _QUIET)),
+             ('server-cert', katello_ssl_tool.genServerCert, (password, d, _QUIET, serial))]
+    if rpm:
+        steps.append(('server-rpm', katello_ssl_tool.genServerRpm, (d, _QUIET)))
+    return _certResult(_runSteps(steps, progress), serial)
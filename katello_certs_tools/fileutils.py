@@ -13,20 +13,88 @@
 # in this software or its documentation.
 #
 
+import glob
+import hashlib
+import json
 import os
-import select
+import selectors
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 
+from katello_certs_tools.sslToolTrace import traced, tracing, span, commandName
 
-def _file_contents_match(first, second):
-    if os.path.getsize(first) != os.path.getsize(second):
+# per stream output kept in memory by rhn_run()/rhn_popen() before spilling
+# over to a temporary file
+SPOOL_SIZE = 1024 * 1024
+
+# how rotateFile() keeps backups:
+#   cascade:  x.1 (newest) ... x.N, every rotation renames all of them
+#   numbered: x.~1~, x.~2~ ... numbered once and never renamed; an index
+#             (.x.backups) remembers them and x.1 is a symlink to the newest
+ROTATE_SCHEMES = ('cascade', 'numbered')
+_rotateScheme = 'cascade'
+
+
+# path --> (stat key, sha256 hexdigest), see fileDigest()
+_digestCache = {}
+DIGEST_CHUNK_SIZE = 65536
+
+
+def _digestKey(st):
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def fileDigest(path):
+    """ sha256 hexdigest of a file, read in chunks. Cached per process while
+        the file's device, inode, mtime and size stay the same.
+    """
+
+    st = os.stat(path)
+    key = _digestKey(st)
+    cached = _digestCache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fo:
+        chunk = fo.read(DIGEST_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            chunk = fo.read(DIGEST_CHUNK_SIZE)
+    digest = digest.hexdigest()
+
+    # a file modified within the timestamp granularity could change again
+    # without its key changing; only cache what has been left alone a while
+    if time.time() - st.st_mtime > 2:
+        _digestCache[path] = (key, digest)
+    return digest
+
+
+def filesMatch(first, second):
+    """ do two files have the same content? (size, then digests) """
+
+    st1, st2 = os.stat(first), os.stat(second)
+    if st1.st_size != st2.st_size:
         return False
+    if (st1.st_dev, st1.st_ino) == (st2.st_dev, st2.st_ino):
+        return True
+    return fileDigest(first) == fileDigest(second)
+
 
-    with open(first) as first_fp, open(second) as second_fp:
-        return first_fp.read() == second_fp.read()
+def contentChanged(path, content):
+    """ would writing content (str or bytes) to path change it? """
+
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    try:
+        if os.path.getsize(path) != len(content):
+            return True
+        return fileDigest(path) != hashlib.sha256(content).hexdigest()
+    except OSError:
+        return True
 
 
 def cleanupAbsPath(path):
@@ -64,9 +132,20 @@ def cleanupNormPath(path, dotYN=0):
     return path
 
 
-def rotateFile(filepath, depth=5, suffix='.', verbosity=0):
+def setRotateScheme(scheme):
+    """ the backup scheme rotateFile() uses by default """
+
+    global _rotateScheme
+    if scheme not in ROTATE_SCHEMES:
+        raise ValueError("unknown backup scheme: %s" % scheme)
+    _rotateScheme = scheme
+
+
+@traced
+def rotateFile(filepath, depth=5, suffix='.', verbosity=0, scheme=None):
     """ backup/rotate a file
         depth (-1==no limit) refers to num. of backups (rotations) to keep.
+        scheme: 'cascade' or 'numbered' (default: see setRotateScheme())
 
         Behavior:
           (1)
@@ -97,6 +176,9 @@ def rotateFile(filepath, depth=5, suffix='.', verbosity=0):
     if not os.path.isfile(filepath):
         raise ValueError("filepath '%s' does not lead to a file" % filepath)
 
+    if (scheme or _rotateScheme) == 'numbered':
+        return _rotateNumbered(filepath, depth, suffix, verbosity)
+
     pathNSuffix = filepath + suffix
     pathNSuffix1 = pathNSuffix + '1'
 
@@ -106,9 +188,9 @@ def rotateFile(filepath, depth=5, suffix='.', verbosity=0):
 
     # is there anything to do? (existence, then size, then checksum)
     if os.path.exists(pathNSuffix1) and os.path.isfile(pathNSuffix1) \
-            and _file_contents_match(filepath, pathNSuffix1):
+            and filesMatch(filepath, pathNSuffix1):
         # nothing to do
-        if verbosity:
+        if verbosity > 0:
             sys.stderr.write("File '%s' is identical to its rotation. "
                              "Nothing to do.\n" % os.path.basename(filepath))
         return None
@@ -132,13 +214,13 @@ def rotateFile(filepath, depth=5, suffix='.', verbosity=0):
         for i in range(depth+1, last+1):
             path = '%s%d' % (pathNSuffix, i)
             os.unlink(path)
-            if verbosity:
+            if verbosity > 0:
                 sys.stderr.write("Rotated out: '%s'\n" % (
                     os.path.basename(path)))
 
     # do the actual rotation
     shutil.copy2(filepath, pathNSuffix1)
-    if os.path.exists(pathNSuffix1) and verbosity:
+    if os.path.exists(pathNSuffix1) and verbosity > 0:
         sys.stderr.write("Backup made: '%s' --> '%s'\n"
                          % (os.path.basename(filepath),
                             os.path.basename(pathNSuffix1)))
@@ -147,78 +229,238 @@ def rotateFile(filepath, depth=5, suffix='.', verbosity=0):
     return pathNSuffix1
 
 
-def rhn_popen(cmd, progressCallback=None, bufferSize=16384, outputLog=None):
-    """ popen-like function, that accepts execvp-style arguments too (i.e. an
-        array of params, thus making shell escaping unnecessary)
+def statKey(path):
+    """ [mtime in ns, size] of path, what a cache of something read from
+        the file compares to notice it changed
+    """
 
-        cmd can be either a string (like "ls -l /dev"), or an array of
-        arguments ["ls", "-l", "/dev"]
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
 
-        Returns the command's error code, a stream with stdout's contents
-        and a stream with stderr's contents
 
-        progressCallback --> progress bar twiddler
-        outputLog --> optional log file file object write method
+def readJson(path):
+    """ the dictionary in the JSON file path; {} if it is missing, broken
+        or holds something else
+    """
+
+    try:
+        with open(path) as fo:
+            data = json.load(fo)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return data
+
+
+def writeJsonAtomic(path, data, bestEffortYN=0):
+    """ (re)write the JSON file path by renaming a temporary file over it,
+        so a reader sees either the old or the new content.
+
+        bestEffortYN: path is a cache and an error writing it (e.g. a
+        read-only build directory) is ignored
     """
+
+    try:
+        with open(path + '.tmp', 'w') as fo:
+            json.dump(data, fo, indent=2, sort_keys=True)
+        os.rename(path + '.tmp', path)
+    except (IOError, OSError):
+        if not bestEffortYN:
+            raise
+
+
+def _rotateIndex(filepath):
+    return os.path.join(os.path.dirname(filepath),
+                        '.%s.backups' % os.path.basename(filepath))
+
+
+def _readRotateIndex(filepath, suffix, verbosity=0):
+    """ the numbered backups of filepath: {'next': N, 'backups': [oldest..newest]}
+
+        Without an index, numbered backups lying around are picked up and
+        x.1, x.2 ... of the cascade scheme are renumbered (once).
+    """
+
+    index = readJson(_rotateIndex(filepath))
+    if isinstance(index.get('next'), int) and isinstance(index.get('backups'), list):
+        return index
+
+    pathNSuffix = filepath + suffix
+    backups = []
+    for path in glob.glob(glob.escape(pathNSuffix) + '~*~'):
+        number = path[len(pathNSuffix)+1:-1]
+        if number.isdigit():
+            backups.append(int(number))
+    backups.sort()
+    number = backups[-1] + 1 if backups else 1
+
+    last = 0
+    while os.path.isfile('%s%d' % (pathNSuffix, last+1)) \
+            and not os.path.islink('%s%d' % (pathNSuffix, last+1)):
+        last = last+1
+    for i in range(last, 0, -1):
+        os.rename('%s%d' % (pathNSuffix, i), '%s~%d~' % (pathNSuffix, number))
+        if verbosity > 1:
+            filename = os.path.basename(pathNSuffix)
+            sys.stderr.write("Moving file: %s%d --> %s~%d~\n" % (filename, i,
+                                                                 filename, number))
+        backups.append(number)
+        number = number+1
+
+    return {'next': number, 'backups': backups}
+
+
+def _rotateNumbered(filepath, depth, suffix, verbosity):
+    """ rotateFile() for the numbered scheme: one copy, at most one unlink
+        (unless depth shrank) and a fresh x.1 symlink per rotation.
+    """
+
+    pathNSuffix = filepath + suffix
+    index = _readRotateIndex(filepath, suffix, verbosity)
+    backups = index['backups']
+
+    # is there anything to do?
+    if backups:
+        newest = '%s~%d~' % (pathNSuffix, backups[-1])
+        if os.path.isfile(newest) and filesMatch(filepath, newest):
+            if verbosity > 0:
+                sys.stderr.write("File '%s' is identical to its rotation. "
+                                 "Nothing to do.\n" % os.path.basename(filepath))
+            return None
+
+    backup = '%s~%d~' % (pathNSuffix, index['next'])
+    shutil.copy2(filepath, backup)
+    backups.append(index['next'])
+    index['next'] = index['next'] + 1
+    if verbosity > 0:
+        sys.stderr.write("Backup made: '%s' --> '%s'\n"
+                         % (os.path.basename(filepath), os.path.basename(backup)))
+
+    # blow away excess rotations:
+    while depth != -1 and len(backups) > depth:
+        path = '%s~%d~' % (pathNSuffix, backups.pop(0))
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        if verbosity > 0:
+            sys.stderr.write("Rotated out: '%s'\n" % os.path.basename(path))
+
+    writeJsonAtomic(_rotateIndex(filepath), index)
+
+    # x.1 keeps pointing at the newest backup
+    link = pathNSuffix + '1'
+    os.symlink(os.path.basename(backup), link + '.tmp')
+    os.rename(link + '.tmp', link)
+
+    return backup
+
+
+def _execute(cmd, progressCallback=None, bufferSize=65536, outputLog=None,
+             spoolSize=SPOOL_SIZE, cwd=None):
+    """ run cmd, collecting stdout and stderr into two spooled buffers.
+        Returns the exit code and both buffers, rewound.
+    """
+
+    if not tracing():
+        return _executeChild(cmd, progressCallback, bufferSize, outputLog, spoolSize, cwd)
+    with span(commandName(cmd), 'process') as s:
+        exitcode, child_out, child_err = _executeChild(cmd, progressCallback, bufferSize,
+                                                       outputLog, spoolSize, cwd)
+        child_out.seek(0, 2)
+        child_err.seek(0, 2)
+        s.set(exitcode=exitcode, stdout_bytes=child_out.tell(), stderr_bytes=child_err.tell())
+        child_out.seek(0, 0)
+        child_err.seek(0, 0)
+    return exitcode, child_out, child_err
+
+
+def _executeChild(cmd, progressCallback=None, bufferSize=65536, outputLog=None,
+                  spoolSize=SPOOL_SIZE, cwd=None):
     cmd_is_list = isinstance(cmd, list) or isinstance(cmd, tuple)
     if cmd_is_list:
-        cmd = map(str, cmd)
-    c = subprocess.Popen(cmd, bufsize=0, stdin=subprocess.PIPE,
+        cmd = [str(arg) for arg in cmd]
+    c = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                         close_fds=True, shell=(not cmd_is_list))
-
-    # We don't write to the child process
-    c.stdin.close()
+                         close_fds=True, shell=(not cmd_is_list), cwd=cwd)
 
-    # Create two temporary streams to hold the info from stdout and stderr
-    child_out = tempfile.TemporaryFile(prefix='/tmp/my-popen-', mode='r+b')
-    child_err = tempfile.TemporaryFile(prefix='/tmp/my-popen-', mode='r+b')
+    # in memory, unless the child gets chatty
+    child_out = tempfile.SpooledTemporaryFile(max_size=spoolSize, mode='w+b')
+    child_err = tempfile.SpooledTemporaryFile(max_size=spoolSize, mode='w+b')
 
-    # Map the input file descriptor with the temporary (output) one
-    fd_mappings = [(c.stdout, child_out), (c.stderr, child_err)]
-    exitcode = None
+    sel = selectors.DefaultSelector()
+    sel.register(c.stdout, selectors.EVENT_READ, child_out)
+    sel.register(c.stderr, selectors.EVENT_READ, child_err)
     count = 1
+    try:
+        # read until both pipes are closed
+        while sel.get_map():
+            for key, _events in sel.select():
+                output = os.read(key.fd, bufferSize)
+                if not output:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+
+                # show progress
+                if progressCallback:
+                    count = count + len(output)
+                    progressCallback(count)
 
-    while 1:
-        # Is the child process done?
-        status = c.poll()
-        if status is not None:
-            if status >= 0:
-                # Save the exit code, we still have to read from the pipes
-                exitcode = status
-            else:
-                # Some signal sent to this process
                 if outputLog is not None:
-                    outputLog("rhn_popen: Signal %s received\n" % (-status))
-                exitcode = status
-                break
-
-        fd_set = map(lambda x: x[0], fd_mappings)
-        readfds = select.select(fd_set, [], [])[0]
-
-        for in_fd, out_fd in fd_mappings:
-            if in_fd in readfds:
-                # There was activity on this file descriptor
-                output = os.read(in_fd.fileno(), bufferSize)
-                if output:
-                    # show progress
-                    if progressCallback:
-                        count = count + len(output)
-                        progressCallback(count)
-
-                    if outputLog is not None:
-                        outputLog(output)
-
-                    # write to the output buffer(s)
-                    out_fd.write(output)
-                    out_fd.flush()
-
-        if exitcode is not None:
-            # Child process is done
-            break
-
-    for f_in, f_out in fd_mappings:
-        f_in.close()
-        f_out.seek(0, 0)
+                    outputLog(output)
 
+                key.data.write(output)
+    finally:
+        sel.close()
+
+    exitcode = c.wait()
+    if exitcode < 0 and outputLog is not None:
+        # Some signal sent to this process
+        outputLog("rhn_popen: Signal %s received\n" % (-exitcode))
+
+    child_out.seek(0, 0)
+    child_err.seek(0, 0)
     return exitcode, child_out, child_err
+
+
+def rhn_run(cmd, progressCallback=None, bufferSize=65536, outputLog=None,
+            spoolSize=SPOOL_SIZE, cwd=None):
+    """ run a command and collect its output.
+
+        cmd can be either a string (like "ls -l /dev"), which is run through
+        the shell, or an array of arguments ["ls", "-l", "/dev"], which is
+        executed directly (no shell, no escaping necessary).
+
+        Output is buffered in memory and only spills over to a temporary
+        file once a stream grows past spoolSize bytes.
+
+        Returns the command's exit code (negative: killed by that signal),
+        and stdout's and stderr's contents as bytes.
+
+        progressCallback --> progress bar twiddler
+        outputLog --> optional log file file object write method
+        cwd --> directory to run the command in
+    """
+
+    exitcode, child_out, child_err = _execute(cmd, progressCallback, bufferSize,
+                                              outputLog, spoolSize, cwd)
+    with child_out, child_err:
+        return exitcode, child_out.read(), child_err.read()
+
+
+def rhn_popen(cmd, progressCallback=None, bufferSize=65536, outputLog=None,
+              spoolSize=SPOOL_SIZE, cwd=None):
+    """ popen-like function, that accepts execvp-style arguments too (i.e. an
+        array of params, thus making shell escaping unnecessary)
+
+        cmd can be either a string (like "ls -l /dev"), or an array of
+        arguments ["ls", "-l", "/dev"]
+
+        Returns the command's error code, a stream with stdout's contents
+        and a stream with stderr's contents. See rhn_run() for the other
+        arguments.
+    """
+
+    return _execute(cmd, progressCallback, bufferSize, outputLog, spoolSize, cwd)
@@ -33,29 +33,45 @@
 # language imports
 from __future__ import print_function
 
-import functools
 import getpass
-import glob
 import os
+import shlex
 import sys
-
-# Package imports
-import rpm
+import time
 
 # local imports
 from katello_certs_tools.sslToolCli import processCommandline, CertExpTooShortException, \
-        CertExpTooLongException, InvalidCountryCodeException
+        CertExpTooLongException, InvalidCountryCodeException, InvalidKeyProfileException
 
 from katello_certs_tools.sslToolLib import KatelloSslToolException, \
-        gendir, chdir, TempDir, \
+        gendir, getJobCount, \
         errnoGeneralError
 
-from katello_certs_tools.fileutils import rotateFile, rhn_popen, cleanupAbsPath
+from katello_certs_tools.fileutils import rotateFile, rhn_run, cleanupAbsPath
+
+from katello_certs_tools.sslToolBackend import getBackend
+from katello_certs_tools.sslToolCaCache import getCaInfo, invalidateCaInfo
+from katello_certs_tools.sslToolRpm import writeRpm
+from katello_certs_tools.sslToolRpmIndex import indexRpm, maxRpmVersion, inputDigest, cachedRpm
+from katello_certs_tools.sslToolReconcile import STAGES, checkServer, tarUpToDate
+
+from katello_certs_tools.sslToolKeygen import genKeys
+from katello_certs_tools.sslToolKeyPool import claimKey, fillKeyPool
+from katello_certs_tools.sslToolSerial import allocateSerials
+from katello_certs_tools.sslToolServe import IssuanceServer, errnoBadRequest
+from katello_certs_tools.sslToolInventory import scanInventory, expiringWithin, \
+        formatTable, formatJson
+from katello_certs_tools import sslToolLedger
+from katello_certs_tools.sslToolLedger import LedgerException, recordCertificate
+
+from katello_certs_tools.sslToolBatch import readManifest, hostDEFS, BatchResults, \
+        BatchManifestException, GenServerBatchException
 
-from katello_certs_tools.sslToolConfig import ConfigFile, figureSerial, getOption, \
-        DEFS, MD, CRYPTO, \
+from katello_certs_tools.sslToolConfig import ConfigFile, getOption, keyProfile, \
+        DEFS, \
         CA_OPENSSL_CNF_NAME, SERVER_OPENSSL_CNF_NAME, POST_UNINSTALL_SCRIPT, \
         SERVER_RPM_SUMMARY, CA_CERT_RPM_SUMMARY
+from katello_certs_tools.sslToolTrace import traced, span, startTrace, finishTrace
 
 
 class GenPrivateCaKeyException(KatelloSslToolException):
@@ -86,10 +102,22 @@ class GenServerRpmException(KatelloSslToolException):
     """ server RPM generation error """
 
 
-class FailedFileDependencyException(Exception):
+class GenServerTarException(KatelloSslToolException):
+    """ server key set archive generation error """
+
+
+class FailedFileDependencyException(KatelloSslToolException):
     """ missing a file needed for this step """
 
 
+class FileExistsException(KatelloSslToolException):
+    """ the file to generate exists already (and --force was not given) """
+
+
+class MissingPasswordException(KatelloSslToolException):
+    """ a CA password is needed for this step """
+
+
 def dependencyCheck(filename):
     if not os.path.exists(filename):
         raise FailedFileDependencyException(filename)
@@ -100,41 +128,33 @@ def pathJoin(path, filename):
     return os.path.join(path, filename)
 
 
-_workDirObj = None
+def _getBackend(d):
+    return getBackend(d.get('--crypto-backend'))
 
 
-def _getWorkDir():
-    global _workDirObj
-    if not _workDirObj:
-        _workDirObj = TempDir()
-    return _workDirObj.getdir()
+def _getCaInfo(d, ca_cert):
+    return getCaInfo(ca_cert, d['--dir'], d.get('--crypto-backend'))
 
 
+def _caCerts(d):
+    """ the CA certificate names of the build directory, for the inventory
+        scan: --ca-cert does not need to end in .crt
+    """
+    return (os.path.basename(d['--ca-cert']),)
+
+
+@traced
 def get_max_rpm_version(package_name, glob_prefix=None):
     """
-    Get the maximum RPM version for a package name. This looks
-    at the installed packages and globs all noarch packages in
-    the current directory.
+    Get the maximum RPM version for a package name as a (version, release)
+    tuple. This looks at the installed packages and all noarch packages
+    in the directory of glob_prefix (see sslToolRpmIndex).
     """
 
     if not glob_prefix:
         glob_prefix = package_name
 
-    headers = []
-
-    ts = rpm.TransactionSet()
-
-    # Find installed version
-    headers.extend(ts.dbMatch("name", package_name))
-
-    # find RPMs in the directory
-    filenames = glob.glob("%s-[0-9]*.noarch.rpm" % glob_prefix)
-    headers += [ts.hdrFromFdno(open(filename)) for filename in filenames]
-
-    if not headers:
-        return None
-
-    return max(headers, key=functools.cmp_to_key(rpm.versionCompare))
+    return maxRpmVersion(package_name, glob_prefix)
 
 
 def getCAPassword(options, confirmYN=1):
@@ -162,8 +182,7 @@ def getCAPassword(options, confirmYN=1):
 
 def appendOtherCACerts(d, ca_cert):
     if d['--other-ca-certs']:
-        with open(cleanupAbsPath(ca_cert)) as ca_cert_fp:
-            ca_cert_content = ca_cert_fp.read()
+        orig_content = ca_cert_content = _getCaInfo(d, ca_cert)['pem']
 
         for fname in d['--other-ca-certs'].split(','):
             with open(fname) as infile:
@@ -171,10 +190,13 @@ def appendOtherCACerts(d, ca_cert):
                 if content not in ca_cert_content:
                     ca_cert_content += content
 
-        with open(cleanupAbsPath(ca_cert), 'w') as ca_cert_fp:
-            ca_cert_fp.writelines(content)
+        if ca_cert_content != orig_content:
+            with open(cleanupAbsPath(ca_cert), 'w') as ca_cert_fp:
+                ca_cert_fp.write(ca_cert_content)
+            invalidateCaInfo(ca_cert, d['--dir'])
 
 
+@traced
 def genPrivateCaKey(password, d, verbosity=0, forceYN=0):
     """ private CA key generation """
 
@@ -182,20 +204,13 @@ def genPrivateCaKey(password, d, verbosity=0, forceYN=0):
     ca_key = os.path.join(d['--dir'], os.path.basename(d['--ca-key']))
 
     if not forceYN and os.path.exists(ca_key):
-        sys.stderr.write("""\
-ERROR: a CA private key already exists:
+        raise FileExistsException("""\
+a CA private key already exists:
        %s
-       If you wish to generate a new one, use the --force option.
-""" % ca_key)
-        sys.exit(errnoGeneralError)
-
-    args = ("/usr/bin/openssl genpkey -pass pass:%s %s -out %s -algorithm rsa -pkeyopt rsa_keygen_bits:4096"
-                % ('%s', CRYPTO, repr(cleanupAbsPath(ca_key))))
+       If you wish to generate a new one, use the --force option.""" % ca_key)
 
     if verbosity >= 0:
         print("Generating private CA key: %s" % ca_key)
-        if verbosity > 1:
-            print("Commandline:", args % "PASSWORD")
     try:
         rotated = rotateFile(filepath=ca_key, verbosity=verbosity)
         if verbosity >= 0 and rotated:
@@ -204,16 +219,9 @@ ERROR: a CA private key already exists:
     except ValueError:
         pass
 
-    cwd = chdir(_getWorkDir())
-    try:
-        ret, out_stream, err_stream = rhn_popen(args % repr(password))
-    finally:
-        chdir(cwd)
-
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    backend = _getBackend(d)
+    ca_key_path = cleanupAbsPath(ca_key)
+    ret, out, err = backend.genPrivateKey(ca_key_path, password, verbosity, keyProfile(d))
 
     if ret:
         raise GenPrivateCaKeyException("Certificate Authority private SSL "
@@ -227,6 +235,7 @@ ERROR: a CA private key already exists:
 
     # permissions:
     os.chmod(ca_key, 0o600)
+    return ca_key
 
 
 def genPublicCaCert_dependencies(password, d, forceYN=0):
@@ -237,20 +246,18 @@ def genPublicCaCert_dependencies(password, d, forceYN=0):
     ca_cert = os.path.join(d['--dir'], os.path.basename(d['--ca-cert']))
 
     if not forceYN and os.path.exists(ca_cert):
-        sys.stderr.write("""\
-ERROR: a CA public certificate already exists:
+        raise FileExistsException("""\
+a CA public certificate already exists:
        %s
-       If you wish to generate a new one, use the --force option.
-""" % ca_cert)
-        sys.exit(errnoGeneralError)
+       If you wish to generate a new one, use the --force option.""" % ca_cert)
 
     dependencyCheck(ca_key)
 
     if password is None:
-        sys.stderr.write('ERROR: a CA password must be supplied.\n')
-        sys.exit(errnoGeneralError)
+        raise MissingPasswordException('a CA password must be supplied.')
 
 
+@traced
 def genPublicCaCert(password, d, verbosity=0, forceYN=0):
     """ public CA certificate (client-side) generation """
 
@@ -262,25 +269,14 @@ def genPublicCaCert(password, d, verbosity=0, forceYN=0):
     genPublicCaCert_dependencies(password, d, forceYN)
 
     configFile = ConfigFile(ca_openssl_cnf)
-    if '--set-hostname' in d:
-        del d['--set-hostname']
     configFile.save(d, caYN=1, verbosity=verbosity)
 
-    args = ("/usr/bin/openssl req -passin pass:%s -config %s "
-            "-new -x509 -days %s -%s -key %s -out %s"
-            % ('%s', repr(cleanupAbsPath(configFile.filename)),
-               repr(d['--cert-expiration']),
-               MD, repr(cleanupAbsPath(ca_key)),
-               repr(cleanupAbsPath(ca_cert))))
-
     if verbosity >= 0:
         print("\nGenerating public CA certificate: %s" % ca_cert)
         print("Using distinguishing variables:")
         for k in ('--set-country', '--set-state', '--set-city', '--set-org',
                   '--set-org-unit', '--set-common-name', '--set-email'):
             print('    %s%s = "%s"' % (k, ' '*(18-len(k)), d[k]))
-        if verbosity > 1:
-            print("Commandline:", args % "PASSWORD")
 
     try:
         rotated = rotateFile(filepath=ca_cert, verbosity=verbosity)
@@ -290,16 +286,9 @@ def genPublicCaCert(password, d, verbosity=0, forceYN=0):
     except ValueError:
         pass
 
-    cwd = chdir(_getWorkDir())
-    try:
-        ret, out_stream, err_stream = rhn_popen(args % repr(password))
-    finally:
-        chdir(cwd)
-
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    backend = _getBackend(d)
+    paths = [cleanupAbsPath(p) for p in (ca_key, ca_cert, configFile.filename)]
+    ret, out, err = backend.genCaCert(d, *paths, password=password, verbosity=verbosity)
 
     if ret:
         raise GenPublicCaCertException("Certificate Authority public "
@@ -311,6 +300,7 @@ def genPublicCaCert(password, d, verbosity=0, forceYN=0):
         if err:
             print("STDERR:", err)
 
+    invalidateCaInfo(ca_cert, d['--dir'])
     appendOtherCACerts(d, ca_cert)
 
     latest_txt = os.path.join(d['--dir'], 'latest.txt')
@@ -320,8 +310,11 @@ def genPublicCaCert(password, d, verbosity=0, forceYN=0):
     # permissions:
     os.chmod(ca_cert, 0o644)
     os.chmod(latest_txt, 0o644)
+    recordCertificate(d['--dir'], ca_cert)
+    return ca_cert
 
 
+@traced
 def genServerKey(d, verbosity=0):
     """ private server key generation """
 
@@ -332,14 +325,15 @@ def genServerKey(d, verbosity=0):
     server_key = os.path.join(serverKeyPairDir,
                               os.path.basename(d['--server-key']))
 
-    args = ("/usr/bin/openssl genpkey -out %s -algorithm rsa -pkeyopt rsa_keygen_bits:4096"
-                % (repr(cleanupAbsPath(server_key))))
+    if d.get('--use-key-pool'):
+        if verbosity >= 0:
+            print("\nClaiming the web server's SSL private key from the key pool: %s" % server_key)
+        if claimKey(d['--dir'], server_key, verbosity, keyProfile(d)):
+            return server_key
 
     # generate the server key
     if verbosity >= 0:
         print("\nGenerating the web server's SSL private key: %s" % server_key)
-        if verbosity > 1:
-            print("Commandline:", args)
 
     try:
         rotated = rotateFile(filepath=server_key, verbosity=verbosity)
@@ -349,16 +343,9 @@ def genServerKey(d, verbosity=0):
     except ValueError:
         pass
 
-    cwd = chdir(_getWorkDir())
-    try:
-        ret, out_stream, err_stream = rhn_popen(args)
-    finally:
-        chdir(cwd)
-
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    backend = _getBackend(d)
+    server_key_path = cleanupAbsPath(server_key)
+    ret, out, err = backend.genPrivateKey(server_key_path, None, verbosity, keyProfile(d))
 
     if ret:
         raise GenServerKeyException("web server's SSL key generation failed:\n%s\n%s"
@@ -371,6 +358,7 @@ def genServerKey(d, verbosity=0):
 
     # permissions:
     os.chmod(server_key, 0o600)
+    return server_key
 
 
 def genServerCertReq_dependencies(d):
@@ -385,6 +373,7 @@ def genServerCertReq_dependencies(d):
     dependencyCheck(server_key)
 
 
+@traced
 def genServerCertReq(d, verbosity=0):
     """ private server cert request generation """
 
@@ -405,19 +394,12 @@ def genServerCertReq(d, verbosity=0):
     configFile.save(d, caYN=0, verbosity=verbosity)
 
     # generate the server cert request
-    args = ("/usr/bin/openssl req -%s -config %s -new -key %s -out %s "
-            % (MD, repr(cleanupAbsPath(configFile.filename)),
-               repr(cleanupAbsPath(server_key)),
-               repr(cleanupAbsPath(server_cert_req))))
-
     if verbosity >= 0:
         print("\nGenerating web server's SSL certificate request: %s" % server_cert_req)
         print("Using distinguished names:")
         for k in ('--set-country', '--set-state', '--set-city', '--set-org',
                   '--set-org-unit', '--set-hostname', '--set-email'):
             print('    %s%s = "%s"' % (k, ' '*(18-len(k)), d[k]))
-        if verbosity > 1:
-            print("Commandline:", args)
 
     try:
         rotated = rotateFile(filepath=server_cert_req, verbosity=verbosity)
@@ -427,16 +409,9 @@ def genServerCertReq(d, verbosity=0):
     except ValueError:
         pass
 
-    cwd = chdir(_getWorkDir())
-    try:
-        ret, out_stream, err_stream = rhn_popen(args)
-    finally:
-        chdir(cwd)
-
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    backend = _getBackend(d)
+    paths = [cleanupAbsPath(p) for p in (server_key, server_cert_req, configFile.filename)]
+    ret, out, err = backend.genCertReq(d, *paths, verbosity=verbosity)
 
     if ret:
         raise GenServerCertReqException(
@@ -450,14 +425,14 @@ def genServerCertReq(d, verbosity=0):
 
     # permissions:
     os.chmod(server_cert_req, 0o600)
+    return server_cert_req
 
 
 def genServerCert_dependencies(password, d):
     """ server cert generation and signing dependency check """
 
     if password is None:
-        sys.stderr.write('ERROR: a CA password must be supplied.\n')
-        sys.exit(errnoGeneralError)
+        raise MissingPasswordException('a CA password must be supplied.')
 
     serverKeyPairDir = os.path.join(d['--dir'],
                                     d['--set-hostname'])
@@ -476,8 +451,13 @@ def genServerCert_dependencies(password, d):
     dependencyCheck(server_cert_req)
 
 
-def genServerCert(password, d, verbosity=0):
-    """ server cert generation and signing """
+@traced
+def genServerCert(password, d, verbosity=0, serial=None):
+    """ server cert generation and signing
+
+        serial: the serial number for the certificate, allocated here if
+        the caller has not reserved one already (batch runs)
+    """
 
     serverKeyPairDir = os.path.join(d['--dir'],
                                     d['--set-hostname'])
@@ -493,39 +473,17 @@ def genServerCert(password, d, verbosity=0):
                                os.path.basename(d['--server-cert']))
     ca_openssl_cnf = os.path.join(d['--dir'], CA_OPENSSL_CNF_NAME)
 
-    index_txt = os.path.join(d['--dir'], 'index.txt')
-    serial = os.path.join(d['--dir'], 'serial')
-
-    purpose = d['--purpose']
-
-    try:
-        os.unlink(index_txt)
-    except OSError:
-        pass
-
-    # figure out the serial file and truncate the index.txt file.
-    ser = figureSerial(ca_cert, serial, index_txt)
+    backend = _getBackend(d)
+    if serial is None:
+        serial = allocateSerials(d, _getCaInfo(d, ca_cert)['serial'])[0]
 
     # need to insure the directory declared in the ca_openssl.cnf
     # file is current:
     configFile = ConfigFile(ca_openssl_cnf)
     configFile.updateDir()
 
-    args = ("/usr/bin/openssl ca -extensions req_%s_x509_extensions -passin pass:%s -outdir ./ -config %s "
-            "-in %s -batch -cert %s -keyfile %s -startdate %s -days %s "
-            "-md %s -out %s"
-            % (purpose,
-               '%s', repr(cleanupAbsPath(ca_openssl_cnf)),
-               repr(cleanupAbsPath(server_cert_req)),
-               repr(cleanupAbsPath(ca_cert)),
-               repr(cleanupAbsPath(ca_key)), d['--startdate'],
-               repr(d['--cert-expiration']), MD,
-               repr(cleanupAbsPath(server_cert))))
-
     if verbosity >= 0:
         print("\nGenerating/signing web server's SSL certificate: %s" % d['--server-cert'])
-        if verbosity > 1:
-            print("Commandline:", args % 'PASSWORD')
     try:
         rotated = rotateFile(filepath=server_cert, verbosity=verbosity)
         if verbosity >= 0 and rotated:
@@ -534,16 +492,10 @@ def genServerCert(password, d, verbosity=0):
     except ValueError:
         pass
 
-    cwd = chdir(_getWorkDir())
-    try:
-        ret, out_stream, err_stream = rhn_popen(args % repr(password))
-    finally:
-        chdir(cwd)
-
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    paths = [cleanupAbsPath(p) for p in (ca_key, ca_cert, ca_openssl_cnf, server_cert_req,
+                                         server_cert)]
+    ret, out, err = backend.signCert(d, *paths, serial=serial, password=password,
+                                     verbosity=verbosity)
 
     if ret:
         # signature for a mistyped CA password
@@ -566,23 +518,8 @@ def genServerCert(password, d, verbosity=0):
 
     # permissions:
     os.chmod(server_cert, 0o644)
-
-    # cleanup duplicate XX.pem file:
-    pemFilename = os.path.basename(ser.upper()+'.pem')
-    if pemFilename != server_cert and os.path.exists(pemFilename):
-        os.unlink(pemFilename)
-
-    # cleanup the old index.txt file
-    try:
-        os.unlink(index_txt + '.old')
-    except OSError:
-        pass
-
-    # cleanup the old serial file
-    try:
-        os.unlink(serial + '.old')
-    except OSError:
-        pass
+    recordCertificate(d['--dir'], server_cert, d['--set-hostname'])
+    return server_cert
 
 
 def _disableRpmMacros():
@@ -599,6 +536,65 @@ def _reenableRpmMacros():
         os.rename(macTmp, mac)
 
 
+def _buildRpm(d, rpmDir, name, ver, rel, summary, description, fileSpecs,
+              postun=None, verbosity=0):
+    """ build name-ver-rel.noarch.rpm in rpmDir, either in-process
+        (--rpm-builder native) or via katello-certs-gen-rpm and rpmbuild.
+
+        fileSpecs: list of "dest-path[:mode]=source-path"
+        postun: %postun scriptlet content (or None)
+        Returns (ret, out, err).
+    """
+
+    if d.get('--rpm-builder') == 'native':
+        try:
+            writeRpm(rpmDir, name, ver, rel, fileSpecs, summary, description,
+                     packager=d['--rpm-packager'], vendor=d['--rpm-vendor'],
+                     postun=postun)
+        except (IOError, OSError, ValueError) as e:
+            return 1, '', str(e)
+        return 0, '', ''
+
+    postun_scriptlet = None
+    args = ['katello-certs-gen-rpm', '--name', name, '--version', ver, '--release', rel,
+            '--packager', d['--rpm-packager'], '--vendor', d['--rpm-vendor'],
+            '--group', 'Applications/System', '--summary', summary,
+            '--description', description]
+    if postun is not None:
+        postun_scriptlet = os.path.join(rpmDir, 'postun.scriptlet')
+        args += ['--postun', cleanupAbsPath(postun_scriptlet)]
+    args += fileSpecs
+
+    if verbosity > 1:
+        print("Commandline:", " ".join([shlex.quote(str(arg)) for arg in args]))
+
+    if postun_scriptlet:
+        if verbosity >= 4:
+            print('Current working directory:', os.getcwd())
+            print("Writing postun_scriptlet:", postun_scriptlet)
+        with open(postun_scriptlet, 'w') as scriptlet_fp:
+            scriptlet_fp.write(postun)
+
+    _disableRpmMacros()
+    try:
+        ret, out, err = rhn_run(args, cwd=rpmDir)
+    finally:
+        _reenableRpmMacros()
+        if postun_scriptlet:
+            os.unlink(postun_scriptlet)
+
+    return ret, out.decode('utf-8'), err.decode('utf-8')
+
+
+def _rpmInputs(d, name, summary, description, fileSpecs, postun=None):
+    """ digest of everything _buildRpm() builds name from (see
+        sslToolRpmIndex.inputDigest)
+    """
+
+    return inputDigest(fileSpecs, name, summary, description, postun,
+                       d['--rpm-packager'], d['--rpm-vendor'], d.get('--rpm-builder'))
+
+
 def genCaRpm_dependencies(d):
     """ generates ssl cert RPM. """
 
@@ -608,6 +604,7 @@ def genCaRpm_dependencies(d):
     dependencyCheck(ca_cert)
 
 
+@traced
 def genCaRpm(d, verbosity=0):
     """ generates ssl cert RPM. """
 
@@ -623,16 +620,20 @@ def genCaRpm(d, verbosity=0):
     if verbosity >= 0:
         sys.stderr.write("\n...working...")
     # Work out the release number.
-    hdr = get_max_rpm_version(ca_cert_rpm)
+    latest = get_max_rpm_version(ca_cert_rpm)
+
+    fileSpecs = ["%s=%s" % (os.path.join(ca_cert_path, ca_cert_name), cleanupAbsPath(ca_cert))]
+    inputs = _rpmInputs(d, ca_cert_rpm_name, CA_CERT_RPM_SUMMARY, CA_CERT_RPM_SUMMARY, fileSpecs)
 
     ver, rel = '1.0', '0'
-    if hdr is not None:
-        try:
-            ver = str(hdr['version'].decode('utf-8'))
-            rel = str(hdr['release'].decode('utf-8'))
-        except AttributeError:
-            ver = str(hdr['version'])
-            rel = str(hdr['release'])
+    if latest is not None:
+        ver, rel = latest
+        # the latest RPM holds exactly this already
+        cached = cachedRpm(ca_cert_rpm, ver, rel, inputs)
+        if cached:
+            if verbosity >= 0:
+                print("\nCA public certificate RPM is up to date:\n    %s" % cached)
+            return cached
 
     # bump the release - and let's not be too smart about it
     #                    assume the release is a number.
@@ -640,50 +641,18 @@ def genCaRpm(d, verbosity=0):
         rel = str(int(rel)+1)
 
     # build the CA certificate RPM
-    args = [
-        'katello-certs-gen-rpm',
-        "--name %s",
-        "--version %s",
-        "--release %s",
-        "--packager %s",
-        "--vendor %s",
-        "--group 'Applications/System'",
-        "--summary %s",
-        "--description %s",
-        os.path.join(ca_cert_path, "%s=%s")
-    ]
-
-    args = " ".join(args)
-
-    args = args % ((repr(ca_cert_rpm_name), ver, rel, repr(d['--rpm-packager']),
-                    repr(d['--rpm-vendor']), repr(CA_CERT_RPM_SUMMARY),
-                    repr(CA_CERT_RPM_SUMMARY), repr(ca_cert_name),
-                    repr(cleanupAbsPath(ca_cert))))
+    srpmYN = d.get('--rpm-builder') != 'native'
 
     clientRpmName = '%s-%s-%s' % (ca_cert_rpm, ver, rel)
     if verbosity >= 0:
-        print("""
-Generating CA public certificate RPM:
-    %s.src.rpm
-    %s.noarch.rpm""" % (clientRpmName, clientRpmName))
-        if verbosity > 1:
-            print("Commandline:", args)
-
-    _disableRpmMacros()
-    cwd = chdir(d['--dir'])
-    try:
-        ret, out_stream, err_stream = rhn_popen(args)
-    except Exception:
-        chdir(cwd)
-        _reenableRpmMacros()
-        raise
-    chdir(cwd)
-    _reenableRpmMacros()
+        print("\nGenerating CA public certificate RPM:")
+        if srpmYN:
+            print("    %s.src.rpm" % clientRpmName)
+        print("    %s.noarch.rpm" % clientRpmName)
 
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    ret, out, err = _buildRpm(d, d['--dir'], ca_cert_rpm_name, ver, rel,
+                              CA_CERT_RPM_SUMMARY, CA_CERT_RPM_SUMMARY, fileSpecs,
+                              verbosity=verbosity)
 
     if ret or not os.path.exists("%s.noarch.rpm" % clientRpmName):
         raise GenCaCertRpmException("CA public SSL certificate RPM generation "
@@ -694,13 +663,15 @@ Generating CA public certificate RPM:
         if err:
             print("STDERR:", err)
     os.chmod('%s.noarch.rpm' % clientRpmName, 0o644)
+    indexRpm('%s.noarch.rpm' % clientRpmName, ver, rel, inputs)
 
     # write-out latest.txt information
     latest_txt = os.path.join(d['--dir'], 'latest.txt')
     with open(latest_txt, 'w') as latest_fp:
         latest_fp.write('%s\n' % ca_cert_name)
         latest_fp.write('%s.noarch.rpm\n' % os.path.basename(clientRpmName))
-        latest_fp.write('%s.src.rpm\n' % os.path.basename(clientRpmName))
+        if srpmYN:
+            latest_fp.write('%s.src.rpm\n' % os.path.basename(clientRpmName))
     os.chmod(latest_txt, 0o644)
 
     if verbosity >= 0:
@@ -734,103 +705,76 @@ def genServerRpm_dependencies(d):
     dependencyCheck(server_cert_req)
 
 
+def _serverFileSpecs(d):
+    """ the file specs (see sslToolRpm.parseFileSpec) of the server's SSL key
+        set: where the RPM and the archive install the files
+    """
+
+    serverKeyPairDir = os.path.join(d['--dir'], d['--set-hostname'])
+    server_cert_dir = d['--server-cert-dir']
+    specs = []
+    for opt, subdir, mode in (('--server-key', 'private', ':0600'),
+                              ('--server-cert-req', 'certs', ''),
+                              ('--server-cert', 'certs', '')):
+        name = os.path.basename(d[opt])
+        specs.append("%s/%s/%s%s=%s" % (server_cert_dir, subdir, name, mode,
+                                        cleanupAbsPath(os.path.join(serverKeyPairDir, name))))
+    return specs
+
+
+@traced
 def genServerRpm(d, verbosity=0):
     """ generates server's SSL key set RPM """
 
     serverKeyPairDir = os.path.join(d['--dir'],
                                     d['--set-hostname'])
 
-    server_key_name = os.path.basename(d['--server-key'])
-    server_key = os.path.join(serverKeyPairDir, server_key_name)
-
-    server_cert_name = os.path.basename(d['--server-cert'])
-    server_cert = os.path.join(serverKeyPairDir, server_cert_name)
-
-    server_cert_req_name = os.path.basename(d['--server-cert-req'])
-    server_cert_req = os.path.join(serverKeyPairDir, server_cert_req_name)
-
     server_rpm_name = os.path.basename(d['--server-rpm'])
     server_rpm = os.path.join(serverKeyPairDir, server_rpm_name)
 
-    server_cert_dir = d['--server-cert-dir']
-
-    postun_scriptlet = os.path.join(d['--dir'], d['--set-hostname'], 'postun.scriptlet')
-
     genServerRpm_dependencies(d)
 
     if verbosity >= 0:
         sys.stderr.write("\n...working...\n")
 
-    hdr = get_max_rpm_version(server_rpm_name, server_rpm)
+    latest = get_max_rpm_version(server_rpm_name, server_rpm)
+
+    description = SERVER_RPM_SUMMARY + """
+Best practices suggests that this RPM should only be installed on the web
+server with this hostname: %s
+""" % d['--set-hostname']
+    fileSpecs = _serverFileSpecs(d)
+    inputs = _rpmInputs(d, server_rpm_name, SERVER_RPM_SUMMARY, description, fileSpecs,
+                        POST_UNINSTALL_SCRIPT)
 
     ver, rel = '1.0', '0'
-    if hdr is not None:
-        try:
-            ver = str(hdr['version'].decode('utf-8'))
-            rel = str(hdr['release'].decode('utf-8'))
-        except AttributeError:
-            ver = str(hdr['version'])
-            rel = str(hdr['release'])
+    if latest is not None:
+        ver, rel = latest
+        # the latest RPM holds exactly this already
+        cached = cachedRpm(server_rpm, ver, rel, inputs)
+        if cached:
+            if verbosity >= 0:
+                print("\nWeb server's SSL key pair/set RPM is up to date:\n    %s" % cached)
+            return cached
 
     # bump the release - and let's not be too smart about it
     #                    assume the release is a number.
     if rel:
         rel = str(int(rel)+1)
 
-    description = SERVER_RPM_SUMMARY + """
-Best practices suggests that this RPM should only be installed on the web
-server with this hostname: %s
-""" % d['--set-hostname']
-
     # build the server RPM
-    args = [
-        'katello-certs-gen-rpm',
-        "--name %s --version %s --release %s --packager %s --vendor %s ",
-        "--group 'Applications/System' --summary %s --description %s --postun %s ",
-        server_cert_dir + "/private/%s:0600=%s ",
-        server_cert_dir + "/certs/%s=%s ",
-        server_cert_dir + "/certs/%s=%s "
-    ]
-
-    args = " ".join(args)
-
-    args = args % (repr(server_rpm_name), ver, rel, repr(d['--rpm-packager']),
-                   repr(d['--rpm-vendor']),
-                   repr(SERVER_RPM_SUMMARY), repr(description),
-                   repr(cleanupAbsPath(postun_scriptlet)),
-                   repr(server_key_name), repr(cleanupAbsPath(server_key)),
-                   repr(server_cert_req_name), repr(cleanupAbsPath(server_cert_req)),
-                   repr(server_cert_name), repr(cleanupAbsPath(server_cert))
-                   )
+    srpmYN = d.get('--rpm-builder') != 'native'
     serverRpmName = "%s-%s-%s" % (server_rpm, ver, rel)
 
     if verbosity >= 0:
-        print("""
-Generating web server's SSL key pair/set RPM:
-    %s.src.rpm
-    %s.noarch.rpm""" % (serverRpmName, serverRpmName))
-        if verbosity > 1:
-            print("Commandline:", args)
-
-    if verbosity >= 4:
-        print('Current working directory:', os.getcwd())
-        print("Writing postun_scriptlet:", postun_scriptlet)
-    with open(postun_scriptlet, 'w') as scriptlet_fp:
-        scriptlet_fp.write(POST_UNINSTALL_SCRIPT)
-
-    _disableRpmMacros()
-    cwd = chdir(serverKeyPairDir)
-    try:
-        ret, out_stream, err_stream = rhn_popen(args)
-    finally:
-        chdir(cwd)
-        _reenableRpmMacros()
-        os.unlink(postun_scriptlet)
+        print("\nGenerating web server's SSL key pair/set RPM:")
+        if srpmYN:
+            print("    %s.src.rpm" % serverRpmName)
+        print("    %s.noarch.rpm" % serverRpmName)
 
-    out = out_stream.read().decode('utf-8')
-    out_stream.close()
-    err = err_stream.read().decode('utf-8')
-    err_stream.close()
+    ret, out, err = _buildRpm(d, serverKeyPairDir, server_rpm_name, ver, rel,
+                              SERVER_RPM_SUMMARY, description, fileSpecs,
+                              postun=POST_UNINSTALL_SCRIPT, verbosity=verbosity)
 
     if ret or not os.path.exists("%s.noarch.rpm" % serverRpmName):
         raise GenServerRpmException("web server's SSL key set RPM generation "
@@ -842,12 +786,14 @@ Generating web server's SSL key pair/set RPM:
             print("STDERR:", err)
 
     os.chmod('%s.noarch.rpm' % serverRpmName, 0o600)
+    indexRpm('%s.noarch.rpm' % serverRpmName, ver, rel, inputs)
 
     # write-out latest.txt information
     latest_txt = os.path.join(serverKeyPairDir, 'latest.txt')
     with open(latest_txt, 'w') as latest_fp:
         latest_fp.write('%s.noarch.rpm\n' % os.path.basename(serverRpmName))
-        latest_fp.write('%s.src.rpm\n' % os.path.basename(serverRpmName))
+        if srpmYN:
+            latest_fp.write('%s.src.rpm\n' % os.path.basename(serverRpmName))
     os.chmod(latest_txt, 0o600)
 
     if verbosity >= 0:
@@ -861,6 +807,69 @@ Deploy the server's SSL key pair/set RPM:
     return "%s.noarch.rpm" % serverRpmName
 
 
+def _rpmVersion(rpmFile):
+    """ (version, release) of a name-version-release.noarch.rpm filename """
+    return tuple(os.path.basename(rpmFile)[:-len('.noarch.rpm')].rsplit('-', 2)[1:])
+
+
+@traced
+def genServerTar(d, verbosity=0, version=None):
+    """ generates server's SSL key set tar archive (--tar)
+
+        version: (version, release) of the archive, those of the RPM built
+        along with it; by default the release after the newest archive
+    """
+
+    # deferred, only --tar runs need tarfile
+    from katello_certs_tools.sslToolTar import writeTar, latestTarVersion, TarException
+
+    serverKeyPairDir = os.path.join(d['--dir'],
+                                    d['--set-hostname'])
+    server_tar_name = os.path.basename(d['--server-tar'])
+
+    genServerRpm_dependencies(d)
+
+    if version is None:
+        ver, rel = latestTarVersion(serverKeyPairDir, server_tar_name) or ('1.0', '0')
+        version = ver, str(int(rel)+1)
+
+    # the key set, plus the CA certificate where its RPM puts it
+    fileSpecs = _serverFileSpecs(d)
+    ca_cert_name = os.path.basename(d['--ca-cert'])
+    ca_cert = os.path.join(d['--dir'], ca_cert_name)
+    if os.path.exists(ca_cert):
+        fileSpecs.append("%s=%s" % (os.path.join(d['--ca-cert-dir'], ca_cert_name),
+                                    cleanupAbsPath(ca_cert)))
+
+    try:
+        tarFile = writeTar(serverKeyPairDir, server_tar_name, version[0], version[1],
+                           fileSpecs, d['--tar-compression'])
+    except TarException as e:
+        raise GenServerTarException("web server's SSL key set archive generation "
+                                    "failed:\n%s" % e)
+    os.chmod(tarFile, 0o600)
+
+    if verbosity >= 0:
+        print("\nGenerating web server's SSL key set archive:\n    %s" % tarFile)
+    return tarFile
+
+
+@traced
+def reconcileServer(d, days, verbosity=0):
+    """ the stages (sslToolReconcile.STAGES) of the server's SSL key set that
+        do not match d (or expire within days) and need to run; lists every
+        stage with why it runs or is skipped
+    """
+
+    plan = checkServer(d, days)
+    if verbosity >= 0:
+        print("\nReconciling web server's SSL key set: %s"
+              % os.path.join(d['--dir'], d['--set-hostname']))
+        for stage, staleYN, why in plan:
+            print("    %-10s %s: %s" % (stage, 'regenerating' if staleYN else 'skipped', why))
+    return [stage for stage, staleYN, _why in plan if staleYN]
+
+
 def genServer_dependencies(password, d):
     """ deps for the general --gen-server command.
         I.e., generation of server.{key,csr,crt}.
@@ -875,53 +884,390 @@ def genServer_dependencies(password, d):
     dependencyCheck(ca_cert)
 
     if password is None:
-        sys.stderr.write('ERROR: a CA password must be supplied.\n')
-        sys.exit(errnoGeneralError)
+        raise MissingPasswordException('a CA password must be supplied.')
 
 
-def _main():
-    """ main routine """
+@traced
+def genServerBatch(password, d, manifest, verbosity=0, rpmYN=1, jobs=1):
+    """ generate the key set (key, request, certificate and RPM) for every
+        host in a batch manifest within this one process.
+
+        The CA password is read, the CA certificate is parsed and the serial
+        numbers are reserved once for the whole run. The private keys are generated up front by a pool of
+        jobs worker processes. A failing host does not stop the run; a
+        summary is printed at the end.
+    """
+
+    entries = readManifest(manifest)
+
+    genServer_dependencies(password, d)
+    ca_cert = os.path.join(d['--dir'], os.path.basename(d['--ca-cert']))
+    serials = allocateSerials(d, _getCaInfo(d, ca_cert)['serial'], len(entries))
+
+    results = BatchResults()
+    start = time.time()
+
+    hosts = []
+    for entry in entries:
+        hd = hostDEFS(d, entry)
+        server_key = os.path.join(d['--dir'], hd['--set-hostname'],
+                                  os.path.basename(hd['--server-key']))
+        hosts.append((entry, hd, server_key))
+
+    keyFiles = [h[2] for h in hosts]
+    if d.get('--use-key-pool'):
+        keyFiles = [k for k in keyFiles if not claimKey(d['--dir'], k, verbosity, keyProfile(d))]
+    keyErrors = genKeys(keyFiles, jobs, verbosity, d.get('--crypto-backend'), keyProfile(d))
+
+    for (entry, hd, server_key), serial in zip(hosts, serials):
+        try:
+            if server_key in keyErrors:
+                raise GenServerKeyException("web server's SSL key generation failed:\n%s"
+                                            % keyErrors[server_key])
+            genServerCertReq(hd, verbosity)
+            genServerCert(password, hd, verbosity, serial)
+            rpm = None
+            if rpmYN:
+                rpm = genServerRpm(hd, verbosity)
+            if hd.get('--tar'):
+                genServerTar(hd, verbosity, rpm and _rpmVersion(rpm))
+        except KatelloSslToolException as e:
+            results.failure(entry['hostname'], e)
+        else:
+            results.success(entry['hostname'], rpm)
+    results.report(time.time() - start, verbosity)
+
+    failures = results.failures()
+    if failures:
+        raise GenServerBatchException("%d of %d hosts failed: %s"
+                                      % (len(failures), len(entries),
+                                         ', '.join([f[0] for f in failures])))
 
-    options = processCommandline()
+
+def _renewEntry(d, entry):
+    """ batch manifest style entry re-creating the key set of an inventory
+        entry: the host's openssl.cnf has its distinguished name, the
+        certificate its cnames.
+    """
+
+    hostname = entry['host']
+    cnf = os.path.join(d['--dir'], hostname, SERVER_OPENSSL_CNF_NAME)
+    commonName = ConfigFile(cnf).parse().get('CN') or hostname
+    names = [name[len('DNS:'):] for name in entry['sans'] if name.startswith('DNS:')]
+    renew = {
+        'hostname': hostname,
+        'common_name': commonName,
+        'cnames': [name for name in names if name not in (hostname, commonName)],
+        'purpose': entry['kind'],
+        }
+    if entry['rpm']:
+        # name-version-release.noarch.rpm
+        renew['rpm'] = entry['rpm'].rsplit('-', 2)[0]
+    return renew
+
+
+@traced
+def _renewWorker(job):
+    """ renew one host's certificate (runs in a worker process).
+        Returns (hostname, rpm, error).
+    """
+
+    password, hd, serial, rpmYN, newKeyYN = job
+    try:
+        if newKeyYN:
+            genServerCertReq(hd, -1)
+        genServerCert(password, hd, -1, serial)
+        rpm = None
+        if rpmYN:
+            rpm = genServerRpm(hd, -1)
+    except KatelloSslToolException as e:
+        return hd['--set-hostname'], None, str(e)
+    return hd['--set-hostname'], rpm, None
+
+
+@traced
+def renewServers(password, d, days, verbosity=0, rpmYN=1, jobs=1, newKeyYN=0):
+    """ re-sign every server and client certificate of the build directory
+        that expires within days, and rebuild the key set RPMs of the hosts
+        that have one.
+
+        The existing private key and certificate request are reused unless
+        newKeyYN. The hosts are renewed by a pool of jobs worker processes;
+        a failing host does not stop the run, a summary is printed at the end.
+    """
+
+    genServer_dependencies(password, d)
+    server_cert_name = os.path.basename(d['--server-cert'])
+    entries = [e for e in expiringWithin(scanInventory(d['--dir'], jobs, _caCerts(d)), days)
+               if e['host'] and e.get('kind') in ('server', 'client')
+               and os.path.basename(e['path']) == server_cert_name]
+    if not entries:
+        if verbosity >= 0:
+            print("No certificates expire within %d days" % days)
+        return
+
+    ca_cert = os.path.join(d['--dir'], os.path.basename(d['--ca-cert']))
+    serials = allocateSerials(d, _getCaInfo(d, ca_cert)['serial'], len(entries))
+    # once, rather than racing in every worker
+    ConfigFile(os.path.join(d['--dir'], CA_OPENSSL_CNF_NAME)).updateDir()
+
+    results = BatchResults()
+    start = time.time()
+
+    hosts = []
+    for entry in entries:
+        # a plain dictionary, the worker jobs are pickled
+        hosts.append((entry, hostDEFS(d, _renewEntry(d, entry)).asDict()))
+
+    keyErrors = {}
+    if newKeyYN:
+        keyFiles = [os.path.join(d['--dir'], hd['--set-hostname'], os.path.basename(hd['--server-key']))
+                    for _entry, hd in hosts]
+        keyErrors = genKeys(keyFiles, jobs, verbosity, d.get('--crypto-backend'), keyProfile(d))
+        for keyFile, error in keyErrors.items():
+            results.failure(os.path.basename(os.path.dirname(keyFile)),
+                            "web server's SSL key generation failed:\n%s" % error)
+
+    work = [(password, hd, serial, rpmYN and entry['rpm'] is not None, newKeyYN)
+            for (entry, hd), serial in zip(hosts, serials)
+            if os.path.join(d['--dir'], hd['--set-hostname'],
+                            os.path.basename(hd['--server-key'])) not in keyErrors]
+    jobs = max(1, min(jobs or 1, len(work)))
+    if verbosity >= 0:
+        print("\nRenewing %d certificate(s) using %d job(s)" % (len(work), jobs))
+    if jobs == 1:
+        renewed = list(map(_renewWorker, work))
+    else:
+        # deferred, like the key generation pool
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            renewed = list(executor.map(_renewWorker, work))
+
+    for hostname, rpm, error in renewed:
+        if error is None:
+            results.success(hostname, rpm)
+        else:
+            results.failure(hostname, error)
+    results.report(time.time() - start, verbosity, 'Renewal summary', 'Renewed')
+
+    failures = results.failures()
+    if failures:
+        raise GenServerBatchException("%d of %d hosts failed: %s"
+                                      % (len(failures), len(entries),
+                                         ', '.join([f[0] for f in failures])))
+
+
+def runCommand(options, d):
+    """ run a parsed commandline (see processCommandline()) """
+
+    if getOption(options, 'inventory'):
+        entries = scanInventory(d['--dir'], getOption(options, 'jobs') or getJobCount(), _caCerts(d))
+        if getOption(options, 'expiring_within') is not None:
+            entries = expiringWithin(entries, options.expiring_within)
+        if options.format == 'json':
+            print(formatJson(entries))
+        else:
+            print(formatTable(entries))
+
+    if getOption(options, 'ledger'):
+        if getOption(options, 'import'):
+            count = sslToolLedger.importTree(d['--dir'], _caCerts(d))
+            if options.verbose >= 0:
+                print("Recorded %d certificate(s) of %s in the issuance ledger" % (count, d['--dir']))
+        else:
+            rows = sslToolLedger.findCertificates(d['--dir'], options.serial, options.hostname,
+                                                  options.subject, options.fingerprint,
+                                                  options.expiring_within)
+            if options.format == 'json':
+                print(sslToolLedger.formatJson(rows))
+            elif options.format == 'index':
+                sys.stdout.write(sslToolLedger.formatIndex(rows))
+            else:
+                print(sslToolLedger.formatTable(rows))
+
+    if getOption(options, 'renew'):
+        renewServers(getCAPassword(options, confirmYN=0), d, options.expiring_within,
+                     options.verbose, not getOption(options, 'no_rpm'),
+                     getOption(options, 'jobs') or getJobCount(),
+                     getOption(options, 'new_key'))
+
+    if getOption(options, 'fill_key_pool'):
+        failed = fillKeyPool(d['--dir'], options.size,
+                             getOption(options, 'jobs') or getJobCount(), options.verbose,
+                             d.get('--crypto-backend'), keyProfile(d))
+        if failed:
+            raise GenServerKeyException("key pool fill failed for: %s" % ', '.join(failed))
 
     if getOption(options, 'gen_ca'):
         if getOption(options, 'key_only'):
-            genPrivateCaKey(getCAPassword(options), DEFS,
+            genPrivateCaKey(getCAPassword(options), d,
                             options.verbose, options.force)
         elif getOption(options, 'cert_only'):
-            genPublicCaCert_dependencies(getCAPassword(options), DEFS, options.force)
-            genPublicCaCert(getCAPassword(options), DEFS,
+            genPublicCaCert_dependencies(getCAPassword(options), d, options.force)
+            genPublicCaCert(getCAPassword(options), d,
                             options.verbose, options.force)
         elif getOption(options, 'rpm_only'):
-            genCaRpm_dependencies(DEFS)
-            genCaRpm(DEFS, options.verbose)
+            genCaRpm_dependencies(d)
+            genCaRpm(d, options.verbose)
         else:
-            genPrivateCaKey(getCAPassword(options), DEFS,
+            genPrivateCaKey(getCAPassword(options), d,
                             options.verbose, options.force)
-            genPublicCaCert(getCAPassword(options), DEFS,
+            genPublicCaCert(getCAPassword(options), d,
                             options.verbose, options.force)
             if not getOption(options, 'no_rpm'):
-                genCaRpm(DEFS, options.verbose)
+                genCaRpm(d, options.verbose)
 
     if getOption(options, 'gen_server') or getOption(options, 'gen_client'):
         if getOption(options, 'key_only'):
-            genServerKey(DEFS, options.verbose)
+            genServerKey(d, options.verbose)
         elif getOption(options, 'cert_req_only'):
-            genServerCertReq_dependencies(DEFS)
-            genServerCertReq(DEFS, options.verbose)
+            genServerCertReq_dependencies(d)
+            genServerCertReq(d, options.verbose)
         elif getOption(options, 'cert_only'):
-            genServerCert_dependencies(getCAPassword(options, confirmYN=0), DEFS)
-            genServerCert(getCAPassword(options, confirmYN=0), DEFS, options.verbose)
+            genServerCert_dependencies(getCAPassword(options, confirmYN=0), d)
+            genServerCert(getCAPassword(options, confirmYN=0), d, options.verbose)
         elif getOption(options, 'rpm_only'):
-            genServerRpm_dependencies(DEFS)
-            genServerRpm(DEFS, options.verbose)
+            genServerRpm_dependencies(d)
+            rpm = genServerRpm(d, options.verbose)
+            if d['--tar']:
+                genServerTar(d, options.verbose, _rpmVersion(rpm))
+        elif getOption(options, 'batch'):
+            genServerBatch(getCAPassword(options, confirmYN=0), d,
+                           options.batch, options.verbose,
+                           not getOption(options, 'no_rpm'),
+                           getOption(options, 'jobs') or getJobCount())
         else:
-            genServer_dependencies(getCAPassword(options, confirmYN=0), DEFS)
-            genServerKey(DEFS, options.verbose)
-            genServerCertReq(DEFS, options.verbose)
-            genServerCert(getCAPassword(options, confirmYN=0), DEFS, options.verbose)
+            stale = STAGES
+            if getOption(options, 'reconcile'):
+                stale = reconcileServer(d, options.expiring_within, options.verbose)
+            # every stage makes the certificate stale
+            if stale:
+                genServer_dependencies(getCAPassword(options, confirmYN=0), d)
+            if 'key' in stale:
+                genServerKey(d, options.verbose)
+            if 'cert-req' in stale:
+                genServerCertReq(d, options.verbose)
+            if 'cert' in stale:
+                genServerCert(getCAPassword(options, confirmYN=0), d, options.verbose)
+            rpm = None
             if not getOption(options, 'no_rpm'):
-                genServerRpm(DEFS, options.verbose)
+                rpm = genServerRpm(d, options.verbose)
+            if d['--tar']:
+                version = rpm and _rpmVersion(rpm)
+                if not stale and tarUpToDate(d, version):
+                    if options.verbose >= 0:
+                        print("\nWeb server's SSL key set archive is up to date")
+                else:
+                    genServerTar(d, options.verbose, version)
+
+
+# commands a --serve request may run
+SERVE_COMMANDS = ('--gen-ca', '--gen-server', '--gen-client', '--renew')
+
+
+def _serveRequest(argv, password):
+    """ run one --serve request (in a worker process), see IssuanceServer """
+
+    if not argv or argv[0] not in SERVE_COMMANDS:
+        return {'code': errnoBadRequest, 'error': 'BadRequest',
+                'message': "a request's argv must start with one of: %s" % ', '.join(SERVE_COMMANDS)}
+    try:
+        options, d = processCommandline(argv)
+        options.password = password
+        runCommand(options, d)
+    except SystemExit as e:
+        # usage errors (and --help) end the way they do on the commandline
+        code = e.code or 0
+        if not isinstance(code, int):
+            code = errnoGeneralError
+        return {'code': code}
+    except Exception as e:  # noqa
+        code = errorCode(e)
+        if code is None:
+            raise
+        return {'code': code, 'error': e.__class__.__name__, 'message': errorMessage(e).strip()}
+    return {'code': 0}
+
+
+def serveRequests(options, d):
+    """ --serve: keep the CA password in memory and run the key set requests
+        of a unix socket until SIGTERM/SIGINT.
+    """
+
+    password = getCAPassword(options, confirmYN=0)
+    server = IssuanceServer(options.socket,
+                            lambda argv: _serveRequest(argv, password),
+                            jobs=getOption(options, 'jobs') or getJobCount(),
+                            timeout=options.timeout, backlog=options.backlog,
+                            verbosity=options.verbose)
+    server.serve()
+
+
+def _main():
+    """ main routine """
+
+    options, d = processCommandline()
+
+    if getOption(options, 'serve'):
+        serveRequests(options, d)
+        return
+
+    # the trace file and/or the -vv timing summary
+    if getOption(options, 'trace') or options.verbose > 1:
+        startTrace()
+    try:
+        with span(' '.join(['katello-ssl-tool'] + sys.argv[1:2]), 'command'):
+            runCommand(options, d)
+    finally:
+        finishTrace(getOption(options, 'trace'), options.verbose)
+
+
+# exception --> exit code (first match), see main()
+ERROR_CODES = (
+    # CA key set errors
+    (GenPrivateCaKeyException, 10),
+    (GenPublicCaCertException, 11),
+    (GenCaCertRpmException, 12),
+    # server key set errors
+    (GenServerKeyException, 20),
+    (GenServerCertReqException, 21),
+    (GenServerCertException, 22),
+    (GenServerRpmException, 23),
+    (GenServerTarException, 26),
+    (GenServerBatchException, 24),
+    (BatchManifestException, 25),
+    # other errors
+    (CertExpTooShortException, 30),
+    (CertExpTooLongException, 31),
+    (InvalidCountryCodeException, 32),
+    (FailedFileDependencyException, 33),
+    (LedgerException, 34),
+    (InvalidKeyProfileException, 35),
+    (FileExistsException, errnoGeneralError),
+    (MissingPasswordException, errnoGeneralError),
+    (KatelloSslToolException, 100),
+    )
+
+
+def errorCode(e):
+    """ the exit code of exception e, None if it is not one of ours """
+
+    for exceptionClass, code in ERROR_CODES:
+        if isinstance(e, exceptionClass):
+            return code
+    return None
+
+
+def errorMessage(e):
+    """ the error message for exception e """
+
+    if isinstance(e, FailedFileDependencyException):
+        return """\
+can't find a file that should have been created during an earlier step:
+       %s
+
+       %s --help""" % (e, os.path.basename(sys.argv[0]))
+    return str(e)
 
 
 def main():
@@ -937,6 +1283,9 @@ def main():
          21  public web server certificate request generation error
          22  public web server certificate generation error
          23  web server key pair/set RPM build error
+         24  batch run error (one or more hosts failed)
+         25  invalid batch manifest
+         26  web server key set tar archive error
 
          30  Certificate expiration too short exception
          31  Certificate expiration too long exception
@@ -944,64 +1293,26 @@ def main():
               range: 1 to # days til 1 year before the 32-bit overflow)
          32  country code length cannot exceed 2
          33  missing file created in previous step
+         34  issuance ledger error
+         35  invalid key profile (--key-type, --key-size, --key-primes)
 
         100  general RHN SSL tool error
-    """
 
-    def writeError(e):
-        sys.stderr.write('\nERROR: %s\n' % e)
+        (--serve replies use the same codes, plus those of sslToolServe)
+    """
 
     try:
         _main()
         ret = 0
-    # CA key set errors
-    except GenPrivateCaKeyException as e:
-        writeError(e)
-        ret = 10
-    except GenPublicCaCertException as e:
-        writeError(e)
-        ret = 11
-    except GenCaCertRpmException as e:
-        writeError(e)
-        ret = 12
-    # server key set errors
-    except GenServerKeyException as e:
-        writeError(e)
-        ret = 20
-    except GenServerCertReqException as e:
-        writeError(e)
-        ret = 21
-    except GenServerCertException as e:
-        writeError(e)
-        ret = 22
-    except GenServerRpmException as e:
-        writeError(e)
-        ret = 23
-    # other errors
-    except CertExpTooShortException as e:
-        writeError(e)
-        ret = 30
-    except CertExpTooLongException as e:
-        writeError(e)
-        ret = 31
-    except InvalidCountryCodeException as e:
-        writeError(e)
-        ret = 32
-    except FailedFileDependencyException as e:
-        # already wrote a nice error message
-        msg = """\
-can't find a file that should have been created during an earlier step:
-       %s
-
-       %s --help""" % (e, os.path.basename(sys.argv[0]))
-        writeError(msg)
-        ret = 33
-    except KatelloSslToolException as e:
-        writeError(e)
-        ret = 100
     except KeyboardInterrupt:
         sys.stderr.write("\nUser interrupted process.\n")
         ret = 0
+    except Exception as e:  # noqa
+        ret = errorCode(e)
+        if ret is None:
+            sys.stderr.write("\nERROR: unhandled exception occurred:\n")
+            raise
+        sys.stderr.write('\nERROR: %s\n' % errorMessage(e))
     except:  # noqa
         sys.stderr.write("\nERROR: unhandled exception occurred:\n")
         raise
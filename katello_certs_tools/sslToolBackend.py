@@ -0,0 +1,544 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool crypto backends
+#
+# Every key, request and certificate operation goes through a backend:
+#   openssl       - the /usr/bin/openssl commandline tool (default)
+#   cryptography  - in-process, using python3-cryptography. Produces the
+#                   same extensions as CONF_TEMPLATE_CA/CONF_TEMPLATE_SERVER
+#                   (the *-openssl.cnf files are still written, but not read)
+#
+# Keys are RSA, ECDSA or Ed25519 (the key profile, see --key-type); the
+# digest of a signature follows the signing key (signingDigest()) and only
+# RSA certificates get the keyEncipherment key usage.
+#
+# All operations return (exitcode, stdout, stderr) like rhn_run does so
+# the callers can report failures the same way for either backend.
+#
+# $Id$
+
+from __future__ import print_function
+
+import datetime
+import hashlib
+import os
+import shlex
+
+from katello_certs_tools.fileutils import rhn_run, cleanupAbsPath
+from katello_certs_tools.sslToolLib import KatelloSslToolException, TempDir, fixSerial
+from katello_certs_tools.sslToolConfig import OpensslCnf, CRYPTO, DEFAULT_KEY_PROFILE, \
+        signingDigest, keyUsage
+from katello_certs_tools.sslToolDer import readDer, pemDer, parseCertificate, certReqKey, \
+        KEY_TYPE_OPTIONS, TIME_FORMAT
+
+OPENSSL = '/usr/bin/openssl'
+
+# Netscape extensions the cryptography module has no classes for
+_NS_CERT_TYPE_OID = '2.16.840.1.113730.1.1'
+_NS_COMMENT_OID = '2.16.840.1.113730.1.13'
+# DER BIT STRINGs of the nsCertType values used in CONF_TEMPLATE_*
+_NS_CERT_TYPES = {
+    'server': b'\x03\x02\x06\x40',
+    'client': b'\x03\x02\x07\x80',
+    'server, sslCA': b'\x03\x02\x02\x44',
+}
+NS_COMMENT = "Katello SSL Tool Generated Certificate"
+
+# distinguished name order of gen_req_distinguished_name() and the subset
+# (and order) policy_optional lets "openssl ca" copy into a signed cert
+DN_KEYS = (
+    ('C', '--set-country'),
+    ('ST', '--set-state'),
+    ('L', '--set-city'),
+    ('O', '--set-org'),
+    ('OU', '--set-org-unit'),
+    ('CN', '--set-common-name'),
+    ('emailAddress', '--set-email'),
+)
+POLICY_KEYS = ('C', 'ST', 'O', 'OU', 'CN', 'emailAddress')
+
+
+def _hexColon(data):
+    return ':'.join(['%02X' % b for b in bytearray(data)])
+
+
+def derFingerprint(der):
+    """ SHA256 fingerprint (AB:CD:...) of a DER encoded certificate """
+
+    return _hexColon(hashlib.sha256(der).digest())
+
+
+def certFingerprint(certFile):
+    """ SHA256 fingerprint (AB:CD:...) of the first certificate in a PEM
+        file, without a round trip through openssl.
+    """
+
+    return derFingerprint(readDer(certFile))
+
+
+_workDirObj = None
+
+
+def _workDir():
+    """ scratch directory openssl runs in, so that whatever it leaves
+        behind (.rnd files) does not end up in the caller's directory
+    """
+
+    global _workDirObj
+    if not _workDirObj:
+        _workDirObj = TempDir()
+    return _workDirObj.getdir()
+
+
+class CryptoBackendException(KatelloSslToolException):
+    """ the requested crypto backend is not available """
+
+
+_PASSIN = 'pass:%s'
+
+
+def _commandline(args):
+    """ printable version of an argv list, without the password """
+    return " ".join([shlex.quote(_PASSIN % 'PASSWORD' if a == _PASSIN else a)
+                     for a in args])
+
+
+class OpensslBackend:
+    """ drives the openssl commandline tool """
+
+    name = 'openssl'
+
+    def __init__(self, openssl=OPENSSL):
+        self.openssl = openssl
+
+    def _run(self, args, password=None, verbosity=0):
+        """ run an openssl argv list (no shell); _PASSIN entries receive the
+            password.
+        """
+
+        if verbosity > 1:
+            print("Commandline:", _commandline(args))
+        args = [_PASSIN % password if a == _PASSIN else a for a in args]
+        ret, out, err = rhn_run(args, cwd=_workDir())
+        return ret, out.decode('utf-8'), err.decode('utf-8')
+
+    def genPrivateKey(self, keyFile, password=None, verbosity=0, profile=None):
+        keyType, keySize, primes = profile or DEFAULT_KEY_PROFILE
+        args = [self.openssl, 'genpkey']
+        if password is not None:
+            args += ['-pass', _PASSIN, CRYPTO]
+        args += ['-out', cleanupAbsPath(keyFile)]
+        if keyType == 'ecdsa':
+            args += ['-algorithm', 'EC', '-pkeyopt', 'ec_paramgen_curve:P-%d' % keySize]
+        elif keyType == 'ed25519':
+            args += ['-algorithm', 'ED25519']
+        else:
+            args += ['-algorithm', 'rsa', '-pkeyopt', 'rsa_keygen_bits:%d' % keySize]
+            if primes > 2:
+                args += ['-pkeyopt', 'rsa_keygen_primes:%d' % primes]
+        return self._run(args, password, verbosity)
+
+    @staticmethod
+    def _digest(d):
+        # the digest option of "openssl req" for the key of d's profile
+        digest = signingDigest(d['--key-type'], d['--key-size'])
+        return ['-' + digest] if digest else []
+
+    def genCaCert(self, d, caKey, caCert, cnf, password, verbosity=0):
+        args = [self.openssl, 'req', '-passin', _PASSIN, '-config', cleanupAbsPath(cnf),
+                '-new', '-x509', '-days', str(d['--cert-expiration'])] + self._digest(d) \
+            + ['-key', cleanupAbsPath(caKey), '-out', cleanupAbsPath(caCert)]
+        return self._run(args, password, verbosity)
+
+    def genCertReq(self, d, key, certReq, cnf, verbosity=0):
+        args = [self.openssl, 'req'] + self._digest(d) \
+            + ['-config', cleanupAbsPath(cnf), '-new', '-key', cleanupAbsPath(key),
+               '-out', cleanupAbsPath(certReq)]
+        return self._run(args, None, verbosity)
+
+    def signCert(self, d, caKey, caCert, caCnf, certReq, cert, serial, password, verbosity=0):
+        # "openssl ca" insists on a serial file and a database of its own;
+        # give every invocation a private copy so concurrent runs against one
+        # CA do not trample each other. The new index.txt line is appended to
+        # the CA's index.txt afterwards; the directory goes away with tmpDir.
+        tmpDir = TempDir()
+        tmpCnf = os.path.join(tmpDir.getdir(), os.path.basename(caCnf))
+        cnf = OpensslCnf.read(cleanupAbsPath(caCnf))
+        if cnf is None:
+            return 1, '', 'unable to read %s' % caCnf
+        cnf.setCaDir(tmpDir.getdir())
+        # the digest follows the CA key, the keyUsage the requested key
+        try:
+            info = parseCertificate(readDer(cleanupAbsPath(caCert)))
+            caKeyType, caKeySize = KEY_TYPE_OPTIONS.get(info['keyType']), info['keySize']
+            reqKeyType = KEY_TYPE_OPTIONS.get(certReqKey(readDer(cleanupAbsPath(certReq),
+                                                                 'CERTIFICATE REQUEST'))[0])
+        except (IOError, OSError, ValueError) as e:
+            return 1, '', 'unable to read %s or %s: %s' % (caCert, certReq, e)
+        if reqKeyType:
+            cnf.set('req_%s_x509_extensions' % d['--purpose'], 'keyUsage',
+                    keyUsage('cert', reqKeyType))
+        with open(tmpCnf, 'w') as fo:
+            fo.write(cnf.text())
+        with open(os.path.join(tmpDir.getdir(), 'serial'), 'w') as fo:
+            fo.write(fixSerial(hex(serial)) + '\n')
+        open(os.path.join(tmpDir.getdir(), 'index.txt'), 'w').close()
+
+        args = [self.openssl, 'ca', '-extensions', 'req_%s_x509_extensions' % d['--purpose'],
+                '-passin', _PASSIN, '-outdir', tmpDir.getdir(), '-config', tmpCnf,
+                '-in', cleanupAbsPath(certReq), '-batch', '-cert', cleanupAbsPath(caCert),
+                '-keyfile', cleanupAbsPath(caKey), '-startdate', d['--startdate'],
+                '-days', str(d['--cert-expiration']),
+                '-md', signingDigest(caKeyType, caKeySize) or 'default',
+                '-out', cleanupAbsPath(cert)]
+        ret, out, err = self._run(args, password, verbosity)
+        if not ret:
+            with open(os.path.join(tmpDir.getdir(), 'index.txt')) as fo:
+                entry = fo.read()
+            fd = os.open(os.path.join(os.path.dirname(cleanupAbsPath(caCnf)), 'index.txt'),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, entry.encode('utf-8'))
+            finally:
+                os.close(fd)
+        return ret, out, err
+
+    def verifyCert(self, caCert, cert, verbosity=0):
+        """ is cert signed by the key of caCert? The dates are not checked,
+            and caCert is trusted as it is, wherever it chains to.
+        """
+
+        return self._run([self.openssl, 'verify', '-partial_chain', '-no_check_time',
+                          '-CAfile', cleanupAbsPath(caCert), cleanupAbsPath(cert)],
+                         verbosity=verbosity)
+
+    def getCertSerial(self, certFile):
+        ret, out, err = self._run([self.openssl, 'x509', '-noout', '-serial',
+                                   '-in', cleanupAbsPath(certFile)])
+        if ret:
+            raise KatelloSslToolException("unable to read the serial number of %s:\n%s"
+                                          % (certFile, err))
+        serial = out.strip().split('=')
+        assert len(serial) > 1
+        return int('0x'+serial[1], 16)
+
+    def getPublicKey(self, keyFile):
+        """ the DER SubjectPublicKeyInfo of an unencrypted private key """
+
+        ret, out, err = self._run([self.openssl, 'pkey', '-pubout', '-in', cleanupAbsPath(keyFile)])
+        if ret:
+            raise KatelloSslToolException("unable to read the public key of %s:\n%s"
+                                          % (keyFile, err))
+        return pemDer(out, 'PUBLIC KEY')
+
+    def getCertInfo(self, certFile):
+        ret, out, err = self._run([self.openssl, 'x509', '-noout', '-serial',
+                                   '-subject', '-nameopt', 'RFC2253', '-enddate',
+                                   '-fingerprint', '-sha256',
+                                   '-ext', 'subjectKeyIdentifier', '-in', cleanupAbsPath(certFile)])
+        if ret:
+            raise KatelloSslToolException("unable to read %s:\n%s" % (certFile, err))
+        info = {'ski': None}
+        lines = out.splitlines()
+        for i, line in enumerate(lines):
+            key, _, value = line.partition('=')
+            if key == 'serial':
+                info['serial'] = int(value, 16)
+            elif key == 'subject':
+                info['subject'] = value.strip()
+            elif key == 'notAfter':
+                notAfter = datetime.datetime.strptime(value.strip(), '%b %d %H:%M:%S %Y GMT')
+                info['notAfter'] = notAfter.strftime(TIME_FORMAT)
+            elif key.lower() == 'sha256 fingerprint':
+                info['fingerprint'] = value.strip()
+            elif line.startswith('X509v3 Subject Key Identifier') and i + 1 < len(lines):
+                info['ski'] = lines[i + 1].strip()
+        return info
+
+
+class CryptographyBackend:
+    """ does everything in-process with python3-cryptography """
+
+    name = 'cryptography'
+
+    def __init__(self):
+        # deferred so that the openssl backend never needs the module
+        try:
+            from cryptography import x509
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import rsa, ec
+        except ImportError:
+            raise CryptoBackendException("the cryptography backend needs python3-cryptography")
+        self.x509 = x509
+        self.hashes = hashes
+        self.serialization = serialization
+        self.rsa = rsa
+        self.ec = ec
+
+    @staticmethod
+    def _write(filename, data, mode):
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, 'wb') as fo:
+            fo.write(data)
+
+    def _call(self, func, *args):
+        try:
+            func(*args)
+        except (ValueError, TypeError, IOError, OSError) as e:
+            return 1, '', str(e)
+        return 0, '', ''
+
+    def _name(self, d):
+        from cryptography.x509.oid import NameOID
+        oids = {
+            'C': NameOID.COUNTRY_NAME,
+            'ST': NameOID.STATE_OR_PROVINCE_NAME,
+            'L': NameOID.LOCALITY_NAME,
+            'O': NameOID.ORGANIZATION_NAME,
+            'OU': NameOID.ORGANIZATIONAL_UNIT_NAME,
+            'CN': NameOID.COMMON_NAME,
+            'emailAddress': NameOID.EMAIL_ADDRESS,
+        }
+        attributes = []
+        for key, opt in DN_KEYS:
+            value = (d.get(opt) or '').strip()
+            if value:
+                attributes.append(self.x509.NameAttribute(oids[key], value))
+        return self.x509.Name(attributes)
+
+    def _loadKey(self, keyFile, password=None):
+        with open(keyFile, 'rb') as fo:
+            data = fo.read()
+        if password is not None:
+            password = password.encode('utf-8')
+        return self.serialization.load_pem_private_key(data, password)
+
+    def _loadCert(self, certFile):
+        with open(certFile, 'rb') as fo:
+            return self.x509.load_pem_x509_certificate(fo.read())
+
+    def _nsExtensions(self, builder, certType):
+        from cryptography.x509 import ObjectIdentifier, UnrecognizedExtension
+        comment = NS_COMMENT.encode('ascii')
+        builder = builder.add_extension(
+            UnrecognizedExtension(ObjectIdentifier(_NS_CERT_TYPE_OID), _NS_CERT_TYPES[certType]),
+            critical=False)
+        return builder.add_extension(
+            UnrecognizedExtension(ObjectIdentifier(_NS_COMMENT_OID),
+                                  b'\x16' + bytes([len(comment)]) + comment),
+            critical=False)
+
+    def _digest(self, key):
+        """ the hash of the signatures made by private key, see signingDigest() """
+
+        if isinstance(key, self.rsa.RSAPrivateKey):
+            digest = signingDigest('rsa', key.key_size)
+        elif isinstance(key, self.ec.EllipticCurvePrivateKey):
+            digest = signingDigest('ecdsa', key.curve.key_size)
+        else:
+            digest = signingDigest('ed25519', None)
+        return digest and getattr(self.hashes, digest.upper())()
+
+    def _keyUsage(self, digital_signature=True, content_commitment=False,
+                  key_encipherment=True, key_cert_sign=False, crl_sign=False):
+        return self.x509.KeyUsage(digital_signature=digital_signature,
+                                  content_commitment=content_commitment,
+                                  key_encipherment=key_encipherment,
+                                  data_encipherment=False, key_agreement=False,
+                                  key_cert_sign=key_cert_sign, crl_sign=crl_sign,
+                                  encipher_only=False, decipher_only=False)
+
+    def _eku(self):
+        from cryptography.x509.oid import ExtendedKeyUsageOID
+        return self.x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH,
+                                           ExtendedKeyUsageOID.CLIENT_AUTH])
+
+    def _genPrivateKey(self, keyFile, password, profile):
+        keyType, keySize, primes = profile or DEFAULT_KEY_PROFILE
+        if keyType == 'ecdsa':
+            key = self.ec.generate_private_key({256: self.ec.SECP256R1,
+                                                384: self.ec.SECP384R1}[keySize]())
+        elif keyType == 'ed25519':
+            from cryptography.hazmat.primitives.asymmetric import ed25519
+            key = ed25519.Ed25519PrivateKey.generate()
+        elif primes > 2:
+            raise ValueError("multi-prime RSA keys need the openssl crypto backend")
+        else:
+            key = self.rsa.generate_private_key(public_exponent=65537, key_size=keySize)
+        if password is None:
+            encryption = self.serialization.NoEncryption()
+        else:
+            encryption = self.serialization.BestAvailableEncryption(password.encode('utf-8'))
+        self._write(keyFile, key.private_bytes(self.serialization.Encoding.PEM,
+                                               self.serialization.PrivateFormat.PKCS8,
+                                               encryption), 0o600)
+
+    def genPrivateKey(self, keyFile, password=None, verbosity=0, profile=None):
+        return self._call(self._genPrivateKey, keyFile, password, profile)
+
+    def _genCaCert(self, d, caKey, caCert, password):
+        x509 = self.x509
+        key = self._loadKey(caKey, password)
+        name = self._name(d)
+        serial = x509.random_serial_number()
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        builder = x509.CertificateBuilder() \
+            .subject_name(name).issuer_name(name) \
+            .public_key(key.public_key()).serial_number(serial) \
+            .not_valid_before(now) \
+            .not_valid_after(now + datetime.timedelta(days=int(d['--cert-expiration']))) \
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=False) \
+            .add_extension(self._keyUsage(key_encipherment=isinstance(key, self.rsa.RSAPrivateKey),
+                                          key_cert_sign=True, crl_sign=True), critical=False) \
+            .add_extension(self._eku(), critical=False)
+        builder = self._nsExtensions(builder, 'server, sslCA')
+        builder = builder \
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False) \
+            .add_extension(x509.AuthorityKeyIdentifier(None, [x509.DirectoryName(name)], serial),
+                           critical=False)
+        cert = builder.sign(key, self._digest(key))
+        self._write(caCert, cert.public_bytes(self.serialization.Encoding.PEM), 0o644)
+
+    def genCaCert(self, d, caKey, caCert, cnf, password, verbosity=0):
+        return self._call(self._genCaCert, d, caKey, caCert, password)
+
+    def _genCertReq(self, d, key, certReq):
+        x509 = self.x509
+        privateKey = self._loadKey(key)
+        cn = (d.get('--set-common-name') or '').strip()
+        names = [cn] + list(d.get('--set-cname') or [])
+        csr = x509.CertificateSigningRequestBuilder() \
+            .subject_name(self._name(d)) \
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=False) \
+            .add_extension(self._keyUsage(content_commitment=True,
+                                          key_encipherment=isinstance(privateKey, self.rsa.RSAPrivateKey)),
+                           critical=False) \
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(n) for n in names]),
+                           critical=False) \
+            .sign(privateKey, self._digest(privateKey))
+        self._write(certReq, csr.public_bytes(self.serialization.Encoding.PEM), 0o600)
+
+    def genCertReq(self, d, key, certReq, cnf, verbosity=0):
+        return self._call(self._genCertReq, d, key, certReq)
+
+    def _signCert(self, d, caKey, caCert, caCnf, certReq, cert, serial, password):
+        x509 = self.x509
+        try:
+            key = self._loadKey(caKey, password)
+        except (ValueError, TypeError) as e:
+            raise ValueError("unable to load CA private key (did you mistype your CA password?): %s" % e)
+        ca = self._loadCert(caCert)
+        with open(certReq, 'rb') as fo:
+            csr = x509.load_pem_x509_csr(fo.read())
+
+        # "openssl ca" with policy_optional: subject reordered, L dropped
+        subject = []
+        for key_name in POLICY_KEYS:
+            for attribute in csr.subject:
+                if attribute.rfc4514_attribute_name == key_name or \
+                        (key_name == 'emailAddress' and attribute.oid.dotted_string == '1.2.840.113549.1.9.1'):
+                    subject.append(attribute)
+
+        startdate = datetime.datetime.strptime(d['--startdate'][:12], '%y%m%d%H%M%S') \
+            .replace(tzinfo=datetime.timezone.utc)
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        caSki = ca.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value
+        builder = x509.CertificateBuilder() \
+            .subject_name(x509.Name(subject)).issuer_name(ca.subject) \
+            .public_key(csr.public_key()).serial_number(serial) \
+            .not_valid_before(startdate) \
+            .not_valid_after(now + datetime.timedelta(days=int(d['--cert-expiration']))) \
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=False) \
+            .add_extension(self._keyUsage(key_encipherment=isinstance(csr.public_key(), self.rsa.RSAPublicKey)),
+                           critical=False) \
+            .add_extension(self._eku(), critical=False)
+        builder = self._nsExtensions(builder, d['--purpose'])
+        builder = builder \
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(csr.public_key()), critical=False) \
+            .add_extension(x509.AuthorityKeyIdentifier(caSki.digest, [x509.DirectoryName(ca.issuer)],
+                                                       ca.serial_number), critical=False)
+        # copy_extensions = copy
+        for extension in csr.extensions:
+            if isinstance(extension.value, x509.SubjectAlternativeName):
+                builder = builder.add_extension(extension.value, extension.critical)
+        certificate = builder.sign(key, self._digest(key))
+        self._write(cert, certificate.public_bytes(self.serialization.Encoding.PEM), 0o644)
+
+    def signCert(self, d, caKey, caCert, caCnf, certReq, cert, serial, password, verbosity=0):
+        return self._call(self._signCert, d, caKey, caCert, caCnf, certReq, cert, serial, password)
+
+    def _verifyCert(self, caCert, cert):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        certificate = self._loadCert(cert)
+        key = self._loadCert(caCert).public_key()
+        args = [certificate.signature, certificate.tbs_certificate_bytes]
+        if isinstance(key, self.rsa.RSAPublicKey):
+            args += [padding.PKCS1v15(), certificate.signature_hash_algorithm]
+        elif isinstance(key, self.ec.EllipticCurvePublicKey):
+            args.append(self.ec.ECDSA(certificate.signature_hash_algorithm))
+        try:
+            key.verify(*args)
+        except InvalidSignature:
+            raise ValueError("%s is not signed by the key of %s" % (cert, caCert))
+
+    def verifyCert(self, caCert, cert, verbosity=0):
+        return self._call(self._verifyCert, caCert, cert)
+
+    def getCertSerial(self, certFile):
+        return self._loadCert(certFile).serial_number
+
+    def getPublicKey(self, keyFile):
+        return self._loadKey(keyFile).public_key().public_bytes(
+            self.serialization.Encoding.DER, self.serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    def getCertInfo(self, certFile):
+        cert = self._loadCert(certFile)
+        try:
+            ski = cert.extensions.get_extension_for_class(self.x509.SubjectKeyIdentifier)
+            ski = _hexColon(ski.value.digest)
+        except self.x509.ExtensionNotFound:
+            ski = None
+        # not_valid_after_utc only exists in cryptography >= 42
+        notAfter = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after
+        return {
+            'serial': cert.serial_number,
+            'subject': cert.subject.rfc4514_string(),
+            'notAfter': notAfter.strftime(TIME_FORMAT),
+            'fingerprint': _hexColon(cert.fingerprint(self.hashes.SHA256())),
+            'ski': ski,
+        }
+
+
+BACKENDS = {
+    'openssl': OpensslBackend,
+    'cryptography': CryptographyBackend,
+}
+
+_backends = {}
+
+
+def getBackend(name=None):
+    """ the (shared) backend instance for name, openssl by default """
+
+    name = name or 'openssl'
+    if name not in BACKENDS:
+        raise CryptoBackendException("unknown crypto backend: %s (choose from: %s)"
+                                     % (name, ', '.join(sorted(BACKENDS))))
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
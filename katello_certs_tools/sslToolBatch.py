@@ -0,0 +1,191 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool batch (manifest driven) issuance helpers
+#
+# A manifest is a YAML (or JSON) document listing the hosts to issue key
+# sets for, either as a bare list or under a "hosts" key:
+#
+#   hosts:
+#     - hostname: capsule1.example.com
+#       cnames: [capsule1.internal]
+#       org: Katello
+#       org_unit: SomeOrgUnit
+#       purpose: server
+#       rpm: capsule1.example.com-apache
+#
+# $Id$
+
+from __future__ import print_function
+
+import json
+import sys
+
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+from katello_certs_tools.sslToolConfig import BASE_SERVER_RPM_NAME, BASE_SERVER_TAR_NAME
+
+
+class BatchManifestException(KatelloSslToolException):
+    """ the batch manifest could not be read or is invalid """
+
+
+class GenServerBatchException(KatelloSslToolException):
+    """ one or more hosts of a batch run failed """
+
+
+# manifest key --> DEFS key
+_DN_MAPPING = (
+    ('country', '--set-country'),
+    ('state', '--set-state'),
+    ('city', '--set-city'),
+    ('org', '--set-org'),
+    ('org_unit', '--set-org-unit'),
+    ('email', '--set-email'),
+    )
+
+_KNOWN_KEYS = set(['hostname', 'cnames', 'common_name', 'purpose', 'rpm']) \
+    | set(k for k, _ in _DN_MAPPING)
+
+
+def _loadManifest(filename):
+    try:
+        with open(filename) as fo:
+            content = fo.read()
+    except IOError as e:
+        raise BatchManifestException("unable to read batch manifest %s: %s"
+                                     % (filename, e))
+
+    if filename.endswith('.json'):
+        try:
+            return json.loads(content)
+        except ValueError as e:
+            raise BatchManifestException("invalid JSON batch manifest %s: %s"
+                                         % (filename, e))
+
+    try:
+        import yaml
+    except ImportError:
+        # YAML is a superset of JSON, so a JSON manifest still works
+        try:
+            return json.loads(content)
+        except ValueError:
+            raise BatchManifestException("python3-pyyaml is needed to read "
+                                         "the YAML batch manifest %s" % filename)
+    try:
+        return yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise BatchManifestException("invalid YAML batch manifest %s: %s"
+                                     % (filename, e))
+
+
+def readManifest(filename):
+    """ read and validate a batch manifest, returns a list of host entries
+        (dictionaries) in manifest order.
+    """
+
+    data = _loadManifest(filename)
+    if isinstance(data, dict):
+        data = data.get('hosts')
+    if not isinstance(data, list) or not data:
+        raise BatchManifestException("batch manifest %s does not list any hosts"
+                                     % filename)
+
+    entries = []
+    seen = set()
+    for i, entry in enumerate(data):
+        if isinstance(entry, str):
+            entry = {'hostname': entry}
+        if not isinstance(entry, dict) or not entry.get('hostname'):
+            raise BatchManifestException("batch manifest entry #%d has no hostname"
+                                         % (i + 1))
+        unknown = set(entry.keys()) - _KNOWN_KEYS
+        if unknown:
+            raise BatchManifestException("batch manifest entry %s has unknown keys: %s"
+                                         % (entry['hostname'], ', '.join(sorted(unknown))))
+        if entry['hostname'] in seen:
+            raise BatchManifestException("batch manifest lists %s more than once"
+                                         % entry['hostname'])
+        if entry.get('purpose', 'server') not in ('server', 'client'):
+            raise BatchManifestException("batch manifest entry %s: purpose must be "
+                                         "'server' or 'client'" % entry['hostname'])
+        cnames = entry.get('cnames') or []
+        if isinstance(cnames, str):
+            cnames = [cnames]
+        entry['cnames'] = cnames
+        seen.add(entry['hostname'])
+        entries.append(entry)
+
+    return entries
+
+
+def hostDEFS(d, entry):
+    """ per-host settings for a manifest entry, derived from the Settings
+        d: options given on the commandline act as defaults for every host.
+    """
+
+    hostname = entry['hostname']
+    overrides = {
+        '--set-hostname': hostname,
+        '--set-common-name': entry.get('common_name') or hostname,
+        '--set-cname': list(entry['cnames']) or None,
+        '--purpose': entry.get('purpose') or d.get('--purpose') or 'server',
+        '--server-rpm': entry.get('rpm') or BASE_SERVER_RPM_NAME + '-' + hostname,
+        '--server-tar': BASE_SERVER_TAR_NAME + '-' + hostname,
+        }
+    for key, opt in _DN_MAPPING:
+        if entry.get(key) is not None:
+            overrides[opt] = str(entry[key])
+
+    return d.derive(overrides)
+
+
+class BatchResults:
+    """ per-host outcome bookkeeping for a batch run """
+
+    def __init__(self):
+        self.results = []
+
+    def success(self, hostname, rpm=None):
+        self.results.append((hostname, None, rpm))
+
+    def failure(self, hostname, error):
+        self.results.append((hostname, error, None))
+
+    def failures(self):
+        return [r for r in self.results if r[1] is not None]
+
+    def report(self, elapsed, verbosity=0, title='Batch summary', done='Issued'):
+        """ print the per-host summary and throughput numbers """
+
+        total = len(self.results)
+        failed = len(self.failures())
+        width = max([len(r[0]) for r in self.results] + [8])
+
+        if verbosity >= 0:
+            print("\n%s:" % title)
+            for hostname, error, rpm in self.results:
+                if error is None:
+                    print(("    OK      %s  %s" % (hostname.ljust(width), rpm or '')).rstrip())
+        for hostname, error, rpm in self.results:
+            if error is not None:
+                first_line = str(error).strip().split('\n')[0]
+                sys.stderr.write("    FAILED  %s  %s\n" % (hostname.ljust(width), first_line))
+
+        if verbosity >= 0:
+            rate = 0.0
+            if elapsed > 0:
+                rate = (total - failed) / elapsed
+            print("%s %d of %d host key sets in %.2f seconds (%.2f hosts/second)"
+                  % (done, total - failed, total, elapsed, rate))
@@ -0,0 +1,89 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool CA certificate metadata cache
+#
+# The CA certificate is parsed once per process: serial, subject, notAfter,
+# subject key identifier, SHA256 fingerprint and the PEM text are kept in
+# memory and in BUILD_DIR/katello-ca-metadata.json, keyed on the path, mtime
+# and size of the certificate file. A changed CA certificate is simply a
+# cache miss; genPublicCaCert also drops the entry explicitly.
+#
+# $Id$
+
+import os
+
+from katello_certs_tools.fileutils import cleanupAbsPath, statKey, readJson, writeJsonAtomic
+from katello_certs_tools.sslToolBackend import getBackend
+from katello_certs_tools.sslToolTrace import traced
+
+CA_METADATA_NAME = 'katello-ca-metadata.json'
+
+# path --> (stat key, metadata)
+_cache = {}
+
+
+def _sidecar(directory):
+    return os.path.join(directory, CA_METADATA_NAME)
+
+
+@traced
+def getCaInfo(caCert, directory=None, backend=None):
+    """ metadata of the CA certificate caCert, a dictionary with serial,
+        subject, notAfter, ski, fingerprint and pem.
+
+        directory: where the sidecar cache lives (None: memory only)
+        backend: name of the crypto backend that parses the certificate
+    """
+
+    path = cleanupAbsPath(caCert)
+    key = statKey(path)
+
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    data = {}
+    info = None
+    if directory is not None:
+        data = readJson(_sidecar(directory))
+        entry = data.get(path)
+        if isinstance(entry, dict) and entry.get('key') == key:
+            info = entry.get('info')
+
+    if info is None:
+        info = getBackend(backend).getCertInfo(path)
+        with open(path) as fo:
+            info['pem'] = fo.read()
+        # the file may have been replaced while we were reading it
+        if statKey(path) != key:
+            return info
+        if directory is not None:
+            data[path] = {'key': key, 'info': info}
+            writeJsonAtomic(_sidecar(directory), data, bestEffortYN=1)
+
+    _cache[path] = (key, info)
+    return info
+
+
+def invalidateCaInfo(caCert, directory=None):
+    """ forget everything cached about caCert (e.g. it was regenerated) """
+
+    path = cleanupAbsPath(caCert)
+    _cache.pop(path, None)
+    if directory is not None:
+        data = readJson(_sidecar(directory))
+        if data.pop(path, None) is not None:
+            writeJsonAtomic(_sidecar(directory), data, bestEffortYN=1)
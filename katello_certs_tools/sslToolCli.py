@@ -24,14 +24,31 @@ import os
 import sys
 
 # utitily imports
-from optparse import Option, OptionParser, make_option
+from optparse import Option, OptionParser, OptionValueError, make_option
 
 # local imports
 from katello_certs_tools.sslToolLib import daysTil18Jan2038, yearsTil18Jan2038, \
                        KatelloSslToolException, errnoGeneralError
-from katello_certs_tools.sslToolConfig import figureDEFS_dirs, figureDEFS_CA, figureDEFS_server
-from katello_certs_tools.sslToolConfig import figureDEFS_distinguishing
-from katello_certs_tools.sslToolConfig import DEFS, getOption, reInitDEFS
+from katello_certs_tools.sslToolConfig import defaultDEFS, SERVE_SOCKET, \
+        KEY_TYPES, KEY_SIZES, maxRsaPrimes
+from katello_certs_tools.sslToolSettings import Settings
+from katello_certs_tools.fileutils import setRotateScheme
+
+
+def _checkDays(option, opt, value):
+    """ optparse type "days": a number of days, such as 30 or 30d """
+
+    try:
+        return int(value[:-1] if value.endswith('d') else value)
+    except ValueError:
+        raise OptionValueError("option %s: invalid number of days: %r" % (opt, value))
+
+
+class DaysOption(Option):
+    """ an Option that also knows the "days" type """
+
+    TYPES = Option.TYPES + ('days',)
+    TYPE_CHECKER = dict(Option.TYPE_CHECKER, days=_checkDays)
 
 
 #
@@ -39,9 +56,9 @@ from katello_certs_tools.sslToolConfig import DEFS, getOption, reInitDEFS
 # stitched together later to give a known list of commands.
 #
 
-def _getOptionsTree(defs):
+def _getOptionsTree(defs, argv):
     """ passing in the defaults dictionary (which is not static)
-        build the options tree dependent on whats on the commandline
+        build the options tree dependent on whats on the commandline (argv)
     """
 
     _optCAKeyPassword = make_option('-p', '--password', action='store', type="string", help='CA password or password file location')  # noqa: E501
@@ -68,7 +85,9 @@ def _getOptionsTree(defs):
 
     _optCaCertRpm = make_option('--ca-cert-rpm', action='store', type="string", help='(rarely changed) RPM name that houses the CA SSL public certificate (the base filename, not filename-version-release.noarch.rpm).')  # noqa: E501
     _optServerRpm = make_option('--server-rpm',  action='store', type="string", help="(rarely changed) RPM name that houses the web server's SSL key set (the base filename, not filename-version-release.noarch.rpm).")  # noqa: E501
-    _optServerTar = make_option('--server-tar',  action='store', type="string", help="(rarely changed) name of tar archive of the web server's SSL key set and CA SSL public certificate that is used solely by the hosted RHN Proxy installation routines (the base filename, not filename-version-release.tar).")  # noqa: E501
+    _optServerTar = make_option('--server-tar',  action='store', type="string", help="(rarely changed) name of the tar archive (see --tar) of the web server's SSL key set and CA SSL public certificate (the base filename, not filename-version-release.tar).")  # noqa: E501
+    _optTar = make_option('--tar', action='store_true', help="also write the web server's SSL key set and the CA SSL public certificate as a tar archive, laid out like the RPM installs them (tar -C / -xf ...), for deployments without RPMs")  # noqa: E501
+    _optTarCompression = make_option('--tar-compression', action='store', type="choice", choices=['none', 'gzip', 'zstd'], help="compression of the --tar archive: 'none' (.tar), 'gzip' (.tar.gz) or 'zstd' (.tar.zst) (default: %s)" % defs['--tar-compression'])  # noqa: E501
 
     _optRpmPackager = make_option('--rpm-packager', action='store', type="string", help='(rarely used) packager of the generated RPM, such as "RHN Admin <rhn-admin@example.com>".')  # noqa: E501
     _optRpmVender = make_option('--rpm-vendor',     action='store', type="string", help='(rarely used) vendor of the generated RPM, such as "IS/IT Example Corp.".')  # noqa: E501
@@ -80,12 +99,48 @@ def _getOptionsTree(defs):
 
     _optSetCname = make_option('--set-cname', action='append', type="string", help='cname alias of the web server, can be specified multiple times')  # noqa: E501
 
-    _buildRpmOptions = [_optRpmPackager, _optRpmVender, _optRpmOnly]
+    _optJobs = make_option('--jobs', action='store', type="int", help='number of parallel jobs for private key generation in --batch runs (default: number of usable CPUs, capped by the cgroup CPU quota)')  # noqa: E501
+    _optRandomSerial = make_option('--random-serial', action='store_true', help='give the certificate a random 128 bit serial number instead of the next one from BUILD_DIR/serial')  # noqa: E501
+    _optKeyType = make_option('--key-type', action='store', type="choice", choices=list(KEY_TYPES), help="algorithm of the generated private key: 'rsa', 'ecdsa' or 'ed25519' (default: %s)" % defs['--key-type'])  # noqa: E501
+    _optKeySize = make_option('--key-size', action='store', type="int", help='size of the generated private key: 2048, 3072 or 4096 bits for rsa, the curve for ecdsa: 256 (P-256) or 384 (P-384) (default: 4096 for rsa, 256 for ecdsa)')  # noqa: E501
+    _optKeyPrimes = make_option('--key-primes', action='store', type="int", help='(rarely used) number of primes of an rsa key: 3 (or 4 for 4096 bits) makes a multi-prime key, faster to generate and to sign with, which not every TLS implementation can load (default: %s)' % defs['--key-primes'])  # noqa: E501
+    _optUseKeyPool = make_option('--use-key-pool', action='store_true', help='take the private key from the pre-generated key pool (see --fill-key-pool) instead of generating it inline; falls back to generating it when the pool is empty')  # noqa: E501
+    _optPoolSize = make_option('--size', action='store', type="int", default=10, help='number of keys to keep in the key pool (default: %default)')  # noqa: E501
+
+    _optSocket = make_option('--socket', action='store', type="string", default=SERVE_SOCKET, help='unix socket to accept requests on (default: %default)')  # noqa: E501
+    _optServeJobs = make_option('--jobs', action='store', type="int", help='number of requests to run in parallel (default: number of usable CPUs, capped by the cgroup CPU quota)')  # noqa: E501
+    _optServeTimeout = make_option('--timeout', action='store', type="float", default=300, help='seconds a request may run before its worker is killed; requests can ask for less (default: %default)')  # noqa: E501
+    _optFormat = make_option('--format', action='store', type="choice", choices=['table', 'json'], default='table', help="how the inventory is printed: 'table' or 'json' (default: %default)")  # noqa: E501
+    _optExpiringWithin = DaysOption('--expiring-within', action='store', type="days", help='only list certificates that expire within this many days (such as 30 or 30d)')  # noqa: E501
+    _optRenewWithin = DaysOption('--expiring-within', action='store', type="days", default=30, help='renew the certificates that expire within this many days, such as 30 or 30d (default: %default)')  # noqa: E501
+    _optReconcile = make_option('--reconcile', action='store_true', help="only regenerate what does not match already: the existing key, request and certificate are compared with the options given (key profile, distinguished name, cnames, purpose, CA, --expiring-within) and kept when they match; the stages that run and those skipped are listed with the reason")  # noqa: E501
+    _optReconcileWithin = DaysOption('--expiring-within', action='store', type="days", default=30, help='with --reconcile, regenerate a certificate that expires within this many days, such as 30 or 30d (default: %default)')  # noqa: E501
+    _optRenewJobs = make_option('--jobs', action='store', type="int", help='number of hosts renewed in parallel (default: number of usable CPUs, capped by the cgroup CPU quota)')  # noqa: E501
+    _optNewKey = make_option('--new-key', action='store_true', help='generate a new private key and certificate request for every renewed host instead of re-signing the existing request')  # noqa: E501
+    _optInventoryJobs = make_option('--jobs', action='store', type="int", help='number of processes parsing changed certificates (default: number of usable CPUs, capped by the cgroup CPU quota)')  # noqa: E501
+    _optLedgerFormat = make_option('--format', action='store', type="choice", choices=['table', 'json', 'index'], default='table', help="how the certificates are printed: 'table', 'json' or 'index' (openssl's index.txt) (default: %default)")  # noqa: E501
+    _optSerial = make_option('--serial', action='store', type="string", help='only the certificate with this serial number (hex)')  # noqa: E501
+    _optHostname = make_option('--hostname', action='store', type="string", help='only the certificates issued for this hostname')  # noqa: E501
+    _optSubject = make_option('--subject', action='store', type="string", help='only the certificates with exactly this subject, such as "CN=a.example.com,O=Katello,C=US"')  # noqa: E501
+    _optFingerprint = make_option('--fingerprint', action='store', type="string", help='only the certificate with this SHA256 fingerprint')  # noqa: E501
+    _optImport = make_option('--import', action='store_true', help='record the certificates found in the build directory (for build directories older than the ledger) instead of listing')  # noqa: E501
+    _optBacklog = make_option('--backlog', action='store', type="int", default=32, help='number of requests that may wait for a worker; beyond that clients are not read from until there is room (default: %default)')  # noqa: E501
+
+    _optBatch = make_option('--batch', action='store', type="string", help='YAML (or JSON) manifest of hosts to generate key sets for in a single run (hostname, cnames, org, org_unit, purpose, rpm). Other options act as defaults for every host.')  # noqa: E501
+
+    _optRpmBuilder = make_option('--rpm-builder', action='store', type="choice", choices=['katello-certs-gen-rpm', 'native'], help="(rarely used) how the RPM is built: 'katello-certs-gen-rpm' runs rpmbuild (and also produces a src.rpm), 'native' writes the noarch RPM directly (default: %s)" % defs['--rpm-builder'])  # noqa: E501
+
+    _buildRpmOptions = [_optRpmPackager, _optRpmVender, _optRpmOnly, _optRpmBuilder]
+
+    _keyOptions = [_optKeyType, _optKeySize, _optKeyPrimes]
 
     _genOptions = [
         make_option('-v', '--verbose', action='count', help='be verbose. Accumulative: -vvv means "be *really* verbose".'),
         make_option('-d', '--dir', action='store', help="build directory (default: %s)" % defs['--dir']),
         make_option('-q', '--quiet', action='store_true', help="be quiet. No output."),
+        make_option('--crypto-backend', action='store', type="choice", choices=['openssl', 'cryptography'], help="(rarely used) how keys, requests and certificates are generated: 'openssl' runs the openssl commandline tool, 'cryptography' works in-process using python3-cryptography (default: %s)" % defs['--crypto-backend']),  # noqa: E501
+        make_option('--trace', action='store', type="string", metavar='FILE', help="write the timing of every stage and child process to FILE as Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev); -vv prints a summary"),  # noqa: E501
+        make_option('--backup-scheme', action='store', type="choice", choices=['cascade', 'numbered'], help="(rarely used) how backups of overwritten files are kept: 'cascade' renames x.1, x.2, ... on every rotation, 'numbered' keeps x.~N~ files and points x.1 at the newest one (default: %s)" % defs['--backup-scheme']),  # noqa: E501
         ]
 
     _genConfOptions = [
@@ -151,15 +206,20 @@ def _getOptionsTree(defs):
     _optGenCa = make_option('--gen-ca', action='store_true', help='generate a Certificate Authority (CA) key pair and public RPM. Review "--gen-ca --help" for more information.')  # noqa: E501
     _optGenServer = make_option("--gen-server", action='store_true', help="""generate the web server's SSL key set, RPM and tar archive. Review "--gen-server --help" for more information.""")  # noqa: E501
     _optGenClient = make_option("--gen-client", action='store_true', help="""generate the client SSL key set, RPM and tar archive. Review "--gen-client --help" for more information.""")  # noqa: E501
+    _optFillKeyPool = make_option("--fill-key-pool", action='store_true', help="""pre-generate private keys for later use with "--gen-server --use-key-pool". Review "--fill-key-pool --help" for more information.""")  # noqa: E501
+    _optServe = make_option("--serve", action='store_true', help="""run as a service that generates key sets for JSON requests on a unix socket, keeping the CA password in memory. Review "--serve --help" for more information.""")  # noqa: E501
+    _optRenew = make_option("--renew", action='store_true', help="""re-sign the server and client certificates of the build directory that expire soon and rebuild their RPMs. Review "--renew --help" for more information.""")  # noqa: E501
+    _optLedger = make_option("--ledger", action='store_true', help="""look up the certificates recorded in the issuance ledger of the build directory. Review "--ledger --help" for more information.""")  # noqa: E501
+    _optInventory = make_option("--inventory", action='store_true', help="""list every certificate of the build directory with its subject, SANs, serial, expiry, key and RPM release. Review "--inventory --help" for more information.""")  # noqa: E501
 
     # CA build option tree set possibilities
     _caSet = [_optGenCa] + _caOptions + _caCertOptions \
         + _genOptions + [_optCaKeyOnly, _optCaCertOnly] + _buildRpmOptions \
-        + [_optCaCertRpm, _optNoRpm]
+        + [_optCaCertRpm, _optNoRpm] + _keyOptions
     _caKeyOnlySet = [_optGenCa] + _caOptions + _genOptions \
-        + [_optCaKeyOnly]
+        + [_optCaKeyOnly] + _keyOptions
     _caCertOnlySet = [_optGenCa] + _caOptions + _caCertOptions \
-        + _genOptions + [_optCaCertOnly]
+        + _genOptions + [_optCaCertOnly] + _keyOptions
     _caRpmOnlySet = [_optGenCa, _optCaKey, _optCaCert, _optCaCertDir, _optOtherCaCerts] \
         + _buildRpmOptions + [_optCaCertRpm] + _genOptions  # noqa: E501
 
@@ -167,61 +227,92 @@ def _getOptionsTree(defs):
     _serverSet = [_optGenServer, _optGenClient] + _serverKeyOptions + _serverCertReqOptions \
         + _serverCertOptions + _serverConfOptions + _genOptions \
         + [_optServerKeyOnly, _optServerCertReqOnly, _optServerCertOnly, _optServerCertDir] \
-        + _buildRpmOptions + [_optServerRpm, _optServerTar, _optNoRpm]
+        + _buildRpmOptions + [_optServerRpm, _optServerTar, _optTar, _optTarCompression, _optNoRpm, _optBatch, _optJobs, _optUseKeyPool, _optRandomSerial] \
+        + [_optReconcile, _optReconcileWithin] + _keyOptions
     _serverKeyOnlySet = [_optGenServer, _optGenClient] + _serverKeyOptions \
-        + _genOptions + [_optServerKeyOnly]
+        + _genOptions + [_optServerKeyOnly, _optSetHostname, _optUseKeyPool] + _keyOptions
     _serverCertReqOnlySet = [_optGenServer, _optGenClient] + _serverKeyOptions \
         + _serverCertReqOptions + _serverConfOptions \
-        + _genOptions + [_optServerCertReqOnly]
+        + _genOptions + [_optServerCertReqOnly] + _keyOptions
     _serverCertOnlySet = [_optGenServer, _optGenClient] + _serverCertOptions \
-        + _genOptions + [_optServerCertOnly]  # noqa: E501
+        + _genOptions + [_optServerCertOnly, _optRandomSerial]  # noqa: E501
     _serverRpmOnlySet = [_optGenServer, _optGenClient, _optServerKey, _optServerCertReq, _optServerCert, _optServerCertDir, _optSetHostname, _optSetCname] \
-        + _buildRpmOptions + [_optServerRpm, _optServerTar] + _genOptions  # noqa: E501
+        + _buildRpmOptions + [_optServerRpm, _optServerTar, _optTar, _optTarCompression] + _genOptions  # noqa: E501
+
+    # key pool option set
+    _keyPoolSet = [_optFillKeyPool, _optPoolSize, _optJobs] + _genOptions + _keyOptions
+
+    # issuance service option set (requests carry their own build options)
+    _serveSet = [_optServe, _optSocket, _optCAKeyPassword, _optServeJobs, _optServeTimeout, _optBacklog] \
+        + [option for option in _genOptions if option.dest in ('verbose', 'quiet')]
+
+    # bulk renewal option set
+    _renewSet = [_optRenew, _optRenewWithin, _optCAKeyPassword, _optCaKey, _optCaCert, _optCertExp,
+                 _optServerCertDir, _optRenewJobs, _optNewKey, _optRandomSerial, _optNoRpm,
+                 _optRpmPackager, _optRpmVender, _optRpmBuilder] + _genOptions + _keyOptions
+
+    # issuance ledger option set
+    _ledgerSet = [_optLedger, _optSerial, _optHostname, _optSubject, _optFingerprint,
+                  _optExpiringWithin, _optLedgerFormat, _optImport, _optCaCert] + _genOptions
+
+    # certificate inventory option set
+    _inventorySet = [_optInventory, _optFormat, _optExpiringWithin, _optInventoryJobs, _optCaCert] + _genOptions
 
     optionsTree = {
         '--gen-ca': _caSet,
         '--gen-server': _serverSet,
         '--gen-client': _serverSet,
+        '--fill-key-pool': _keyPoolSet,
+        '--serve': _serveSet,
+        '--renew': _renewSet,
+        '--inventory': _inventorySet,
+        '--ledger': _ledgerSet,
         }
 
     # quick check about the --*-only options
     _onlyOpts = set(['--key-only', '--cert-req-only', '--cert-only', '--rpm-only'])
-    _onlyIntersection = set(sys.argv) & _onlyOpts
+    _onlyIntersection = set(argv) & _onlyOpts
+    if len(_onlyIntersection) > 1:
+        sys.stderr.write("""\
+ERROR: cannot use these options in combination:
+       %s\n""" % repr(_onlyIntersection))
+        sys.exit(errnoGeneralError)
+    _onlyIntersection = set(argv) & set(['--rpm-only', '--no-rpm'])
     if len(_onlyIntersection) > 1:
         sys.stderr.write("""\
 ERROR: cannot use these options in combination:
        %s\n""" % repr(_onlyIntersection))
         sys.exit(errnoGeneralError)
-    _onlyIntersection = set(sys.argv) & set(['--rpm-only', '--no-rpm'])
+    _onlyIntersection = set(argv) & set(['--reconcile', '--batch'])
     if len(_onlyIntersection) > 1:
         sys.stderr.write("""\
 ERROR: cannot use these options in combination:
        %s\n""" % repr(_onlyIntersection))
         sys.exit(errnoGeneralError)
-    _onlyIntersection = set(sys.argv) & set(['--gen-client', '--gen-server'])
+    _onlyIntersection = set(argv) & set(['--gen-client', '--gen-server'])
     if len(_onlyIntersection) > 1:
         sys.stderr.write("""\
 ERROR: cannot use these options in combination:
        %s\n""" % repr(_onlyIntersection))
         sys.exit(errnoGeneralError)
 
-    if '--key-only' in sys.argv:
+    if '--key-only' in argv:
         optionsTree['--gen-ca'] = _caKeyOnlySet
         optionsTree['--gen-server'] = _serverKeyOnlySet
         optionsTree['--gen-client'] = _serverKeyOnlySet
-    elif '--cert-only' in sys.argv:
+    elif '--cert-only' in argv:
         optionsTree['--gen-ca'] = _caCertOnlySet
         optionsTree['--gen-server'] = _serverCertOnlySet
         optionsTree['--gen-client'] = _serverCertOnlySet
-    elif '--cert-req-key-only' in sys.argv:
+    elif '--cert-req-key-only' in argv:
         optionsTree['--gen-server'] = _serverCertReqOnlySet
         optionsTree['--gen-client'] = _serverCertReqOnlySet
-    elif '--rpm-only' in sys.argv:
+    elif '--rpm-only' in argv:
         optionsTree['--gen-ca'] = _caRpmOnlySet
         optionsTree['--gen-server'] = _serverRpmOnlySet
         optionsTree['--gen-client'] = _serverRpmOnlySet
 
-    baseOptions = [_optGenCa, _optGenServer, _optGenClient]
+    baseOptions = [_optGenCa, _optGenServer, _optGenClient, _optFillKeyPool, _optServe, _optRenew, _optInventory, _optLedger]
     return optionsTree, baseOptions
 
 
@@ -236,13 +327,23 @@ BASE_USAGE = """\
 
  step 3 %s --gen-client [sub-options]
 
+ optional %s --fill-key-pool [sub-options]
+
+ optional %s --serve [sub-options]
+
+ optional %s --renew [sub-options]
+
+ optional %s --inventory [sub-options]
+
+ optional %s --ledger [sub-options]
+
 The two options listed above are "base options". For more help about
 a particular option, just add --help to either one, such as:
 %s --gen-ca --help
 
 If confused, please refer to the man page or other documentation
 for sample usage.\
-""" % tuple([_progName]*5)
+""" % tuple([_progName]*10)
 OTHER_USAGE = """\
 %s [options]
 
@@ -251,16 +352,17 @@ for sample usage.\
 """ % _progName
 
 
-def _getOptionList(defs):
+def _getOptionList(defs, argv):
     """ stitch together the commandline given rules set in optionsTree
-        and the grouping logic.
+        and the grouping logic. Returns the options, the usage text and
+        argv (with a --help added if there is no base option).
     """
 
-    optionsTree, baseOptions = _getOptionsTree(defs)
+    optionsTree, baseOptions = _getOptionsTree(defs, argv)
     optionsList = []
     usage = OTHER_USAGE
 
-    argIntersection = set(sys.argv) & set(optionsTree.keys())
+    argIntersection = set(argv) & set(optionsTree.keys())
 
     if len(argIntersection) == 1:
         for option in optionsTree[next(iter(argIntersection))]:
@@ -280,67 +382,42 @@ ERROR: cannot use these options in combination:
         # and tag on a --help
         optionsList = baseOptions
         usage = BASE_USAGE
-        if '--help' not in sys.argv:
-            sys.argv.append('--help')
+        if '--help' not in argv:
+            argv = argv + ['--help']
+
+    return optionsList, usage, argv
 
-    return optionsList, usage
 
+def resolveOptions(argv):
+    """ parse a commandline (argv without the program name) in one go.
 
-def optionParse():
-    """ We parse in 3 steps:
-        (1) parse options
-        (2) set the defaults based on any options we override on the commandline
-            - this is nice for things like (what dir we are working in etc).
-        (3) reparse the options with defaults set
+        Returns (options, settings): the optparse values and a read-only
+        Settings mapping ('--option' --> value) whose defaults are only
+        figured when read. Neither sys.argv nor DEFS is touched.
 
-        Reset the default values DEFS given the options found.
+        Only --help parses twice, so that the help text shows the defaults
+        figured from the commandline and the build directory.
     """
 
+    argv = list(argv)
+
     # force certain "first options". Not beautiful but it works.
-    if len(sys.argv) > 1:
-        if sys.argv[1] not in ('-h', '--help', '--gen-ca', '--gen-server', '--gen-client'):
-            # first option was not something we understand. Force a base --help
-            del(sys.argv[1:])
-            sys.argv.append('--help')
-
-    if '--gen-ca' in sys.argv:
-        reInitDEFS(1)
-    else:
-        reInitDEFS(0)
-    ##
-    # STEP 1: preliminarily parse options
-    ##
-    # print 'XXX STEP1'
-
-    optionList, usage = _getOptionList(DEFS)
-
-    optionListNoHelp = optionList[:]
-    fake_help = Option("-h", "--help", action="count", help='')
-    optionListNoHelp.append(fake_help)
-    options, args = OptionParser(option_list=optionListNoHelp, add_help_option=0).parse_args()
-
-    ##
-    # STEP 2: repopulate DEFS dict based on commandline
-    #         and the *-openssl.cnf files
-    ##
-    # print 'XXX STEP2'
-    figureDEFS_dirs(options)            # build directory structure
-    figureDEFS_CA(options)              # CA key set stuff
-    figureDEFS_server(options)          # server key set stuff
-    figureDEFS_distinguishing(options)  # distinguishing name stuff
-
-    ##
-    # STEP 3: reparse options again only if --help is in the commandline
-    #         so that we can give a --help with correct defaults set.
-    ##
-    # print 'XXX STEP3'
-
-    if '-h' in sys.argv or '--help' in sys.argv:
-        # DEFS should be mapped with new values now... let's reparse the options.
-        # The correct help text should be presented and all defaults
-        # should be mapped as expected.
-        optionList, usage = _getOptionList(DEFS)
-        options, args = OptionParser(option_list=optionList, usage=usage).parse_args()
+    if argv and argv[0] not in ('-h', '--help', '--gen-ca', '--gen-server', '--gen-client', '--fill-key-pool', '--serve', '--renew', '--inventory', '--ledger'):
+        # first option was not something we understand. Force a base --help
+        argv = ['--help']
+
+    caYN = '--gen-ca' in argv
+    optionList, usage, argv = _getOptionList(defaultDEFS(caYN), argv)
+
+    if '-h' in argv or '--help' in argv:
+        optionListNoHelp = optionList[:]
+        fake_help = Option("-h", "--help", action="count", help='')
+        optionListNoHelp.append(fake_help)
+        options, args = OptionParser(option_list=optionListNoHelp, add_help_option=0).parse_args(argv)
+
+        optionList, usage, argv = _getOptionList(Settings(options, caYN), argv)
+
+    options, args = OptionParser(option_list=optionList, usage=usage).parse_args(argv)
 
     # we take no extra commandline arguments that are not linked to an option
     if args:
@@ -348,7 +425,7 @@ def optionParse():
                          "context (try --help): %s\n" % repr(args))
         sys.exit(errnoGeneralError)
 
-    return options
+    return options, Settings(options, caYN)
 
 
 class CertExpTooShortException(KatelloSslToolException):
@@ -363,12 +440,17 @@ class InvalidCountryCodeException(KatelloSslToolException):
     "invalid country code. Probably != 2 characters in length."
 
 
-def processCommandline():
-    options = optionParse()
+class InvalidKeyProfileException(KatelloSslToolException):
+    "invalid --key-type, --key-size, --key-primes combination"
+
+
+def checkSettings(settings):
+    """ sanity checks of resolved settings, raises the exceptions above """
 
     _maxDays = daysTil18Jan2038()
 
-    cert_expiration = getOption(options, 'cert_expiration')
+    # the resolved (already clamped) value, like the options remap used to
+    cert_expiration = settings.get('--cert-expiration')
     if cert_expiration:
         if cert_expiration < 1:
             raise CertExpTooShortException(
@@ -379,14 +461,44 @@ def processCommandline():
                     "(~%.2f years)\n"
                     % (int(_maxDays), yearsTil18Jan2038()))
 
-    country = getOption(options, 'set_country')
+    # as given: resolving it would read the existing openssl.cnf
+    country = settings.option('set_country')
     if country is not None and (country == '' or len(country) != 2):
         raise InvalidCountryCodeException(
                 "country code must be exactly two characters, such as 'US'")
 
+    keyType = settings['--key-type']
+    keySize = settings['--key-size']
+    primes = settings['--key-primes']
+    if keyType not in KEY_SIZES:
+        raise InvalidKeyProfileException(
+                "key type must be one of: %s" % ', '.join(KEY_TYPES))
+    if keySize not in KEY_SIZES[keyType]:
+        raise InvalidKeyProfileException(
+                "%s keys are %s bits" % (keyType, ' or '.join(str(b) for b in KEY_SIZES[keyType])))
+    if primes != 2 and keyType != 'rsa':
+        raise InvalidKeyProfileException("only rsa keys have primes")
+    if primes != 2 and not 2 < primes <= maxRsaPrimes(keySize):
+        raise InvalidKeyProfileException(
+                "a %d bit rsa key has 2 to %d primes" % (keySize, maxRsaPrimes(keySize)))
+
+
+def processCommandline(argv=None):
+    """ parse and check the commandline (default: sys.argv).
+
+        Returns (options, settings), see resolveOptions().
+    """
+
+    if argv is None:
+        argv = sys.argv[1:]
+    options, settings = resolveOptions(argv)
+    checkSettings(settings)
+
     if options.quiet:
         options.verbose = -1
     if not options.verbose:
         options.verbose = 0
 
-    return options
+    setRotateScheme(settings['--backup-scheme'])
+
+    return options, settings
@@ -20,21 +20,20 @@ from __future__ import print_function
 
 # language imports
 import os
-import sys
 import copy
 import time
 import socket
 
 # local imports
-from katello_certs_tools.fileutils import cleanupNormPath, rotateFile, rhn_popen, cleanupAbsPath
-from katello_certs_tools.sslToolLib import daysTil18Jan2038, fixSerial
+from katello_certs_tools.fileutils import cleanupNormPath, rotateFile, cleanupAbsPath, \
+        contentChanged
+from katello_certs_tools.sslToolLib import daysTil18Jan2038
 
 
 # defaults where we can see them (NOTE: directory is figured at write time)
 CERT_PATH = '/etc/pki/katello-certs-tools'
 BUILD_DIR = cleanupNormPath('./ssl-build', dotYN=1)
-HOSTNAME = socket.gethostname()
-MACHINENAME = HOSTNAME
+SERVE_SOCKET = '/run/katello-ssl.sock'
 
 CA_KEY_NAME = 'KATELLO-PRIVATE-SSL-KEY'
 CA_CRT_NAME = 'KATELLO-TRUSTED-SSL-CERT'
@@ -49,6 +48,72 @@ SERVER_OPENSSL_CNF_NAME = 'katello-server-openssl.cnf'
 MD = 'sha256'
 CRYPTO = '-aes256'
 
+# --key-type --> the --key-size values it takes, the default first
+KEY_SIZES = {
+    'rsa': (4096, 3072, 2048),
+    'ecdsa': (256, 384),
+    'ed25519': (256,),
+}
+KEY_TYPES = ('rsa', 'ecdsa', 'ed25519')
+# (key type, key size, number of RSA primes)
+DEFAULT_KEY_PROFILE = ('rsa', 4096, 2)
+
+
+def maxRsaPrimes(keySize):
+    """ the most primes openssl puts in an RSA key of keySize bits """
+    return 3 if keySize < 4096 else 4
+
+
+def keyProfile(d):
+    """ the key profile of the --key-type, --key-size and --key-primes
+        settings: (key type, key size, number of RSA primes)
+    """
+    return d['--key-type'], d['--key-size'], d['--key-primes']
+
+
+def keyProfileName(profile):
+    """ rsa-4096, rsa-4096-3p, ecdsa-384, ed25519 """
+
+    keyType, keySize, primes = profile
+    if keyType == 'ed25519':
+        return keyType
+    if keyType == 'rsa' and primes > 2:
+        return '%s-%d-%dp' % (keyType, keySize, primes)
+    return '%s-%d' % (keyType, keySize)
+
+
+def signingDigest(keyType, keySize):
+    """ the digest of the signatures made by a key: MD, SHA-384 for P-384
+        keys (matching the strength of the curve), None for Ed25519 (which
+        hashes internally)
+    """
+
+    if keyType == 'ed25519':
+        return None
+    if keyType == 'ecdsa' and keySize >= 384:
+        return 'sha384'
+    return MD
+
+
+# keyUsage of the CONF_TEMPLATE_* sections: of a CA, of a signed server or
+# client certificate, of a certificate request
+_KEY_USAGE = {
+    'ca': 'digitalSignature, keyEncipherment, keyCertSign, cRLSign',
+    'cert': 'digitalSignature, keyEncipherment',
+    'req': 'nonRepudiation, digitalSignature, keyEncipherment',
+}
+
+
+def keyUsage(usage, keyType):
+    """ keyUsage ('ca', 'cert' or 'req') of a certificate for a key of
+        keyType. Only RSA keys encipher (key transport), ECDSA and Ed25519
+        keys just sign.
+    """
+
+    if keyType == 'rsa':
+        return _KEY_USAGE[usage]
+    return _KEY_USAGE[usage].replace(', keyEncipherment', '')
+
 
 def getOption(options, opt):
     """ fetch the value of an options object item
@@ -84,6 +149,32 @@ def getStartDate_aWeekAgo():
     return time.strftime("%y%m%d%H%M%S", time.gmtime(time.time()-aweek)) + 'Z'
 
 
+_hostname = None
+
+
+def getHostname():
+    """ this machine's hostname (looked up once) """
+
+    global _hostname
+    if _hostname is None:
+        _hostname = socket.gethostname()
+    return _hostname
+
+
+def _computedDefs():
+    """ the defaults that depend on the clock or the machine; figured when
+        DEFS is (re)initialized rather than at import time.
+    """
+
+    return {
+        '--cert-expiration': int(daysTil18Jan2038()),
+        '--startdate': getStartDate_aWeekAgo(),
+        '--set-hostname': getHostname(),
+        '--server-rpm': BASE_SERVER_RPM_NAME+'-'+getHostname(),
+        '--server-tar': BASE_SERVER_TAR_NAME+'-'+getHostname(),
+    }
+
+
 _defs = \
     {
         '--dir': BUILD_DIR,
@@ -91,8 +182,6 @@ _defs = \
         '--ca-cert': 'KATELLO-TRUSTED-SSL-CERT',
         '--ca-cert-dir': CERT_PATH,
         '--other-ca-certs': None,
-        '--cert-expiration': int(daysTil18Jan2038()),
-        '--startdate': getStartDate_aWeekAgo(),
 
         '--server-key': 'server.key',
         '--server-cert-req': 'server.csr',
@@ -100,14 +189,19 @@ _defs = \
         '--server-cert-dir': CERT_PATH,
 
         '--set-country': 'US',
-        '--set-common-name': "",     # these two will never appear
-        '--set-hostname': HOSTNAME,  # at the same time on the CLI
+        '--set-common-name': "",     # this and --set-hostname will never
+                                     # appear at the same time on the CLI
 
         '--ca-cert-rpm': CA_CRT_RPM_NAME,
-        '--server-rpm': BASE_SERVER_RPM_NAME+'-'+MACHINENAME,
-        '--server-tar': BASE_SERVER_TAR_NAME+'-'+MACHINENAME,
         '--rpm-packager': None,
         '--rpm-vendor': None,
+        '--rpm-builder': 'katello-certs-gen-rpm',
+        '--crypto-backend': 'openssl',
+        '--backup-scheme': 'cascade',
+        '--tar-compression': 'none',
+        '--key-type': DEFAULT_KEY_PROFILE[0],
+        '--key-size': DEFAULT_KEY_PROFILE[1],
+        '--key-primes': DEFAULT_KEY_PROFILE[2],
     }
 
 _defsCa = copy.copy(_defs)
@@ -134,196 +228,16 @@ _defsServer.update(
 DEFS = _defsServer
 
 
-def reInitDEFS(caYN=0):
-    if caYN:
-        DEFS.update(_defsCa)
-    else:
-        DEFS.update(_defsServer)
-
-
-def figureDEFS_dirs(options):
-    """ figure out the directory defaults (after options being at least parsed
-        once).
-    """
-
-    # fix up the --dir setting
-    DEFS['--dir'] = getOption(options, 'dir') or DEFS['--dir'] or '.'
-    DEFS['--dir'] = cleanupNormPath(DEFS['--dir'], dotYN=1)
-
-    # fix up the --set-hostname and MACHINENAME settings
-    DEFS['--set-hostname'] = getOption(options, 'set_hostname') \
-        or DEFS['--set-hostname'] \
-        or socket.gethostname()
-
-    global MACHINENAME
-    MACHINENAME = DEFS['--set-hostname']
-
-    # remap to options object
-    setOption(options, 'dir', DEFS['--dir'])
-    setOption(options, 'set_hostname', DEFS['--set-hostname'])
-
+def defaultDEFS(caYN=0):
+    """ a fresh dictionary of the built-in CA or server defaults """
 
-def figureDEFS_CA(options):
-    """ figure out the defaults (after options being at least parsed once) for
-        the CA key-pair(set) variables.
-    """
-
-    if not getOption(options, 'ca_key'):
-        # the various default names for CA keys (a hierarchy)
-        for possibility in (CA_KEY_NAME, 'ca.key', 'cakey.pem'):
-            if os.path.exists(os.path.join(DEFS['--dir'], possibility)):
-                DEFS['--ca-key'] = possibility
-                break
-
-    DEFS['--ca-key'] = os.path.basename(getOption(options, 'ca_key') or DEFS['--ca-key'])
-    DEFS['--ca-cert'] = os.path.basename(getOption(options, 'ca_cert') or DEFS['--ca-cert'])
-    DEFS['--ca-cert-dir'] = getOption(options, 'ca_cert_dir') or DEFS['--ca-cert-dir']
-    DEFS['--other-ca-certs'] = getOption(options, 'other_ca_certs') or DEFS['--other-ca-certs']
-
-    # the various default names for CA keys and certs
-    if not getOption(options, 'ca_cert'):
-        if DEFS['--ca-key'] == CA_KEY_NAME:
-            DEFS['--ca-cert'] = CA_CRT_NAME
-        elif DEFS['--ca-key'] == 'ca.key':
-            DEFS['--ca-cert'] = 'ca.crt'
-        elif DEFS['--ca-key'] == 'cakey.pem':
-            DEFS['--ca-cert'] = 'cacert.pem'
-        else:
-            DEFS['--ca-cert'] = 'ca.crt'
-
-    DEFS['--cert-expiration'] = getOption(options, 'cert_expiration') \
-        or int(daysTil18Jan2038())
-    DEFS['--ca-cert-rpm'] = getOption(options, 'ca_cert_rpm') \
-        or CA_CRT_RPM_NAME
-
-    DEFS['--rpm-packager'] = getOption(options, 'rpm_packager')
-    DEFS['--rpm-vendor'] = getOption(options, 'rpm_vendor')
-
-    if '--cert-expiration' in DEFS:
-        # nothing under 1 day or over # days til 18Jan2038
-        if DEFS['--cert-expiration'] < 1:
-            DEFS['--cert-expiration'] = 1
-        _maxdays = int(daysTil18Jan2038())  # already rounded
-        if DEFS['--cert-expiration'] > _maxdays:
-            DEFS['--cert-expiration'] = _maxdays
-
-    # remap to options object
-    setOption(options, 'ca_key', DEFS['--ca-key'])
-    setOption(options, 'ca_cert', DEFS['--ca-cert'])
-    setOption(options, 'ca_cert_dir', DEFS['--ca-cert-dir'])
-    setOption(options, 'cert_expiration', DEFS['--cert-expiration'])
-    setOption(options, 'ca_cert_rpm', DEFS['--ca-cert-rpm'])
-    setOption(options, 'other_ca_certs', DEFS['--other-ca-certs'])
-
-
-def figureDEFS_server(options):
-    """ figure out the defaults (after options being at least parsed once) for
-        the server key-pair(set) variables.
-    """
-
-    DEFS['--server-key'] = os.path.basename(getOption(options, 'server_key')
-                                            or DEFS['--server-key'] or 'server.key')
-    DEFS['--server-cert-req'] = os.path.basename(getOption(options, 'server_cert_req')
-                                                 or DEFS['--server-cert-req'] or 'server.csr')
-    DEFS['--server-cert'] = os.path.basename(getOption(options, 'server_cert')
-                                             or DEFS['--server-cert'] or 'server.crt')
-    DEFS['--cert-expiration'] = getOption(options, 'cert_expiration') \
-        or int(daysTil18Jan2038())  # already rounded
-    DEFS['--server-rpm'] = getOption(options, 'server_rpm') \
-        or BASE_SERVER_RPM_NAME+'-'+MACHINENAME
-    DEFS['--server-tar'] = getOption(options, 'server_tar') \
-        or BASE_SERVER_TAR_NAME+'-'+MACHINENAME
-    DEFS['--server-cert-dir'] = getOption(options, 'server_cert_dir') or DEFS['--server-cert-dir']
-
-    DEFS['--rpm-packager'] = getOption(options, 'rpm_packager')
-    DEFS['--rpm-vendor'] = getOption(options, 'rpm_vendor')
-
-    if '--cert-expiration' in DEFS:
-        # nothing under 1 day or over # days til 18Jan2038
-        if DEFS['--cert-expiration'] < 1:
-            DEFS['--cert-expiration'] = 1
-        _maxdays = int(daysTil18Jan2038())  # already rounded
-        if DEFS['--cert-expiration'] > _maxdays:
-            DEFS['--cert-expiration'] = _maxdays
-
-    # remap to options object
-    setOption(options, 'server_key', DEFS['--server-key'])
-    setOption(options, 'server_cert_req', DEFS['--server-cert-req'])
-    setOption(options, 'server_cert', DEFS['--server-cert'])
-    setOption(options, 'cert_expiration', DEFS['--cert-expiration'])
-    setOption(options, 'server_rpm', DEFS['--server-rpm'])
-    setOption(options, 'server_tar', DEFS['--server-tar'])
-    setOption(options, 'server_cert_dir', DEFS['--server-cert-dir'])
-
-
-def figureDEFS_distinguishing(options):
-    """ figure out the defaults (after options being at least parsed once) for
-        the distinguishing variables (C, ST, L, O, OU, CN, emailAddress)
-        First from config file, then from commanline.
-    """
-
-    # map the config file settings to the DEFS object
-    conf = {}
-    caYN = '--gen-ca-cert' in sys.argv or '--gen-ca' in sys.argv
-    if caYN:
-        conf = ConfigFile(os.path.join(DEFS['--dir'], CA_OPENSSL_CNF_NAME)).parse()
-    else:
-        conf = ConfigFile(os.path.join(DEFS['--dir'], MACHINENAME, SERVER_OPENSSL_CNF_NAME)).parse()
-
-    mapping = {
-            'C': ('--set-country',),
-            'ST': ('--set-state',),
-            'L': ('--set-city',),
-            'O': ('--set-org',),
-            'OU': ('--set-org-unit',),
-            'CN': ('--set-common-name',),
-            'emailAddress': ('--set-email',),
-              }
-
-    # map config file settings to DEFS (see mapping dict above)
-    for key in conf.keys():
-        for v in mapping[key]:
-            DEFS[v] = conf[key]
-
-    # map commanline options to the DEFS object
-    if getOption(options, 'gen_server'):
-        DEFS['--purpose'] = 'server'
-    if getOption(options, 'gen_client'):
-        DEFS['--purpose'] = 'client'
-
-    if getOption(options, 'set_country') is not None:
-        DEFS['--set-country'] = getOption(options, 'set_country')
-    if getOption(options, 'set_state') is not None:
-        DEFS['--set-state'] = getOption(options, 'set_state')
-    if getOption(options, 'set_city') is not None:
-        DEFS['--set-city'] = getOption(options, 'set_city')
-    if getOption(options, 'set_org') is not None:
-        DEFS['--set-org'] = getOption(options, 'set_org')
-    if getOption(options, 'set_org_unit') is not None:
-        DEFS['--set-org-unit'] = getOption(options, 'set_org_unit')
-    if getOption(options, 'set_common_name') is not None:
-        DEFS['--set-common-name'] = getOption(options, 'set_common_name')
-    if getOption(options, 'set_hostname') is not None:
-        DEFS['--set-hostname'] = getOption(options, 'set_hostname')
-
-    if getOption(options, 'set_common_name') is not None:
-        DEFS['--set-common-name'] = getOption(options, 'set_common_name')
-    else:
-        DEFS['--set-common-name'] = DEFS['--set-hostname']
+    defs = copy.copy(_defsCa if caYN else _defsServer)
+    defs.update(_computedDefs())
+    return defs
 
-    if getOption(options, 'set_email') is not None:
-        DEFS['--set-email'] = getOption(options, 'set_email')
-    DEFS['--set-cname'] = getOption(options, 'set_cname')  # this is list
 
-    # remap to options object
-    setOption(options, 'set_country', DEFS['--set-country'])
-    setOption(options, 'set_state', DEFS['--set-state'])
-    setOption(options, 'set_city', DEFS['--set-city'])
-    setOption(options, 'set_org', DEFS['--set-org'])
-    setOption(options, 'set_org_unit', DEFS['--set-org-unit'])
-    setOption(options, 'set_common_name', DEFS['--set-common-name'])
-    setOption(options, 'set_email', DEFS['--set-email'])
-    setOption(options, 'set_cname', DEFS['--set-cname'])
+def reInitDEFS(caYN=0):
+    DEFS.update(defaultDEFS(caYN))
 
 
 CONF_TEMPLATE_CA = """\
@@ -357,8 +271,7 @@ emailAddress            = optional
 #---------------------------------------------------------------------------
 
 [ req ]
-default_bits            = 4096
-distinguished_name      = req_distinguished_name
+%sdistinguished_name      = req_distinguished_name
 prompt                  = no
 x509_extensions         = req_ca_x509_extensions
 
@@ -367,7 +280,7 @@ x509_extensions         = req_ca_x509_extensions
 
 [ req_ca_x509_extensions ]
 basicConstraints = CA:true
-keyUsage = digitalSignature, keyEncipherment, keyCertSign, cRLSign
+keyUsage = %s
 extendedKeyUsage = serverAuth, clientAuth
 nsCertType = server, sslCA
 # PKIX recommendations harmless if included in all certificates.
@@ -404,8 +317,7 @@ CONF_TEMPLATE_SERVER = """\
 # Katello Management autogenerated openSSL configuration file.
 #---------------------------------------------------------------------------
 [ req ]
-default_bits            = 4096
-distinguished_name      = req_distinguished_name
+%sdistinguished_name      = req_distinguished_name
 prompt                  = no
 x509_extensions         = req_server_x509_extensions
 req_extensions          = v3_req
@@ -415,7 +327,7 @@ req_extensions          = v3_req
 
 [ req_server_x509_extensions ]
 basicConstraints = CA:false
-keyUsage = digitalSignature, keyEncipherment
+keyUsage = %s
 extendedKeyUsage = serverAuth, clientAuth
 nsCertType = %s
 # PKIX recommendations harmless if included in all certificates.
@@ -426,7 +338,7 @@ authorityKeyIdentifier  = keyid, issuer:always
 [ v3_req ]
 # Extensions to add to a certificate request
 basicConstraints = CA:FALSE
-keyUsage = nonRepudiation, digitalSignature, keyEncipherment
+keyUsage = %s
 
 # Some CAs do not yet support subjectAltName in CSRs.
 # Instead the additional names are form entries on web
@@ -452,6 +364,16 @@ def gen_req_alt_names(d, hostname):
     return result
 
 
+def gen_req_key(profile):
+    """ generates the key line of the [ req ] section of the *-openssl.cnf
+        file: default_bits of RSA keys, a note for the others
+    """
+
+    if profile[0] == 'rsa':
+        return "default_bits            = %d\n" % profile[1]
+    return "# %s key (--key-type)\n" % keyProfileName(profile)
+
+
 def gen_req_distinguished_name(d):
     """ generates the req_distinguished section of the *-openssl.cnf file """
 
@@ -466,108 +388,150 @@ def gen_req_distinguished_name(d):
     return s
 
 
-def figureSerial(caCertFilename, serialFilename, indexFilename):
-    """ for our purposes we allow the same serial number for server certs
-        BUT WE DO NOT ALLOW server certs and CA certs to share the same
-        serial number.
+class OpensslCnf:
+    """ an openssl.cnf document, parsed once.
 
-        We blow away the index.txt file each time because we are less
-        concerned with matching serials/signatures between server.crt's.
+        The lines are kept as they are (comments, order, formatting) and
+        indexed by [ section ] and key, so lookups do not rescan the file and
+        text() gives back the original unless something was set.
     """
 
-    # what serial # is the ca cert using (we need to increment from that)
-    ret, outstream, errstream = rhn_popen(['/usr/bin/openssl', 'x509', '-noout',
-                                           '-serial', '-in', caCertFilename])
-    out = outstream.read().decode('utf-8')
-    outstream.close()
-    errstream.read().decode('utf-8')
-    errstream.close()
-    assert not ret
-    caSerial = out.strip().split('=')
-    assert len(caSerial) > 1
-    caSerial = caSerial[1]
-    caSerial = int('0x'+caSerial, 16)
-
-    # initialize the serial value (starting at whatever is in
-    # serialFilename or 1)
-    serial = 1
-    if os.path.exists(serialFilename):
-        serial = open(serialFilename, 'r').read().strip()
-        if serial:
-            serial = int('0x'+serial, 16)
-        else:
-            serial = 1
+    def __init__(self, text=''):
+        self.lines = text.splitlines(True)
+        self.changedYN = 0
+        self._reindex()
+
+    @classmethod
+    def read(cls, filename):
+        """ the parsed file, None if it cannot be read """
 
-    # make sure it is at least 1 more than the CA's serial code always
-    # REMEMBER: openssl will incremented the serial number each time
-    # as well.
-    if serial <= caSerial:
-        serial = caSerial + 1
-    serial = fixSerial(hex(serial))
+        try:
+            with open(filename) as fo:
+                return cls(fo.read())
+        except IOError:
+            return None
+
+    def _reindex(self):
+        # section --> {key: line number}; keys before any label are in ''
+        self._index = {'': {}}
+        # section --> number of its last line
+        self._ends = {'': -1}
+        section = ''
+        for i, line in enumerate(self.lines):
+            cleanLine = line.strip()
+            if cleanLine[:1] == '[' and cleanLine[-1:] == ']':
+                section = cleanLine[1:-1].strip()
+                self._index.setdefault(section, {})
+            elif cleanLine and cleanLine[0] != '#' and '=' in cleanLine:
+                self._index[section][cleanLine.split('=', 1)[0].strip()] = i
+            self._ends[section] = i
+
+    def text(self):
+        return ''.join(self.lines)
+
+    def get(self, section, key, default=None):
+        i = self._index.get(section, {}).get(key)
+        if i is None:
+            return default
+        return self.lines[i].split('=', 1)[1].strip()
+
+    def section(self, section):
+        """ {key: value} of one section """
+
+        return dict((key, self.get(section, key))
+                    for key in self._index.get(section, {}))
+
+    def set(self, section, key, value, before=None):
+        """ set key in section (appended to it, or inserted before the key
+            before, if it is new). Keeps the key's formatting.
+        """
 
-    # create the serial file if it doesn't exist
-    # write the digits to this file
-    open(serialFilename, 'w').write(serial+'\n')
-    os.chmod(serialFilename, 0o600)
+        i = self._index.get(section, {}).get(key)
+        if i is not None:
+            if self.get(section, key) == value:
+                return
+            self.lines[i] = '%s= %s\n' % (self.lines[i].split('=', 1)[0], value)
+        else:
+            if section not in self._index:
+                self.lines.append('\n[ %s ]\n' % section)
+                self._reindex()
+            i = self._index[section].get(before)
+            if i is None:
+                i = self._ends[section] + 1
+            self.lines.insert(i, '%s= %s\n' % (key.ljust(24), value))
+            self._reindex()
+        self.changedYN = 1
+
+    def setCaDir(self, newdir):
+        """ point [ CA_default ] dir at newdir. Older files had no dir setting
+            seperate from the database and serial settings; they get one.
+        """
 
-    # truncate the index.txt file. Less likely to have unneccessary clashes.
-    open(indexFilename, 'w')
-    os.chmod(indexFilename, 0o600)
-    return serial
+        if self.get('CA_default', 'dir') is None:
+            keys = self._index.get('CA_default', {})
+            if 'database' not in keys and 'serial' not in keys:
+                return
+            first = min([k for k in ('database', 'serial') if k in keys], key=keys.get)
+            self.set('CA_default', 'dir', newdir, before=first)
+            self.set('CA_default', 'database', '$dir/index.txt')
+            self.set('CA_default', 'serial', '$dir/serial')
+        elif self.get('CA_default', 'dir').rstrip('/') != newdir.rstrip('/'):
+            self.set('CA_default', 'dir', newdir)
 
 
 class ConfigFile:
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, buildDir=BUILD_DIR):
         self.filename = filename
         if self.filename is None:
             self.filename = SERVER_OPENSSL_CNF_NAME
-            if os.path.exists(os.path.join(DEFS['--dir'], 'katello_openssl.cnf')):
-                self.filename = os.path.join(DEFS['--dir'], "katello_openssl.cnf")
-            elif os.path.exists(os.path.join(DEFS['--dir'], 'openssl.cnf')):
-                self.filename = os.path.join(DEFS['--dir'], "openssl.cnf")
+            if os.path.exists(os.path.join(buildDir, 'katello_openssl.cnf')):
+                self.filename = os.path.join(buildDir, "katello_openssl.cnf")
+            elif os.path.exists(os.path.join(buildDir, 'openssl.cnf')):
+                self.filename = os.path.join(buildDir, "openssl.cnf")
         self.filename = cleanupAbsPath(self.filename)
+        self._doc = None
 
-    def parse(self):
-        """ yank all the pertinent ssl data from a previously
-            generated openssl.cnf.
+    def document(self):
+        """ the parsed file (an OpensslCnf), None if it cannot be read """
 
-            NOTE: we get a limited sampling of info here. We have no concept
-            of the [ some heading ] divisions in the katello_openssl.cnf file.
-        """
+        if self._doc is None:
+            self._doc = OpensslCnf.read(self.filename)
+        return self._doc
 
-        d = {}
+    def _write(self, text, verbosity=0):
+        """ rotate and (re)write the file, unless it already holds text """
+
+        self._doc = None
+        if not contentChanged(self.filename, text):
+            os.chmod(self.filename, 0o600)
+            return 0
 
         try:
-            fo = open(self.filename, 'r')
-        except IOError:
-            return d
+            rotated = rotateFile(filepath=self.filename, verbosity=verbosity)
+            if verbosity >= 0 and rotated:
+                print("Rotated: %s --> %s" % (os.path.basename(self.filename),
+                                              os.path.basename(rotated)))
+        except ValueError:
+            pass
+        fo = open(self.filename, 'w')
+        fo.write(text)
+        fo.close()
+        os.chmod(self.filename, 0o600)
+        return 1
+
+    def parse(self):
+        """ yank all the pertinent ssl data from a previously
+            generated openssl.cnf: its [ req_distinguished_name ].
+        """
 
-        line = fo.readline()
-        while line:
-            if line.strip() == '[ req_distinguished_name ]':
-                break
-            line = fo.readline()
+        doc = self.document()
+        if doc is None:
+            return {}
 
         keys = ['C', 'ST', 'L', 'O', 'OU', 'CN',
                 'emailAddress']
-
-        for s in fo.readlines():
-            s = s.strip()
-            if len(s) > 2 and s[0] == '[' and s[-1] == ']':
-                break
-            split = s.split()
-            if not split or len(split) < 3:
-                continue
-            if split[0] not in keys:
-                continue
-            split = s.split('=')
-            if len(split) != 2:
-                continue
-            for i in range(len(split)):
-                split[i] = split[i].strip()
-            d[split[0]] = split[1]
-
-        return d
+        rdn = doc.section('req_distinguished_name')
+        return dict((k, v) for k, v in rdn.items() if k in keys)
 
     def updateLegacy(self, newdir=None, verbosity=1):
         """ in slightly older formatted ca_openssl.cnf files, there
@@ -577,119 +541,31 @@ class ConfigFile:
             Most of the time this function short-circuits early.
         """
 
-        try:
-            fo = open(self.filename, 'r')
-        except IOError:
-            return
+        doc = self.document()
+        if doc is None or doc.get('CA_default', 'dir') is not None:
+            return 0
 
         if newdir is None:
             newdir = os.path.dirname(self.filename)
-
-        newfile = ""
-        in_CA_defaultYN = 0
-        dirSetYN = 0
-
-        line = fo.readline()
-        while line:
-            cleanLine = line.strip()
-
-            # is this a label?
-            isLabelYN = 0
-            if cleanLine and (cleanLine[0], cleanLine[-1]) == ('[', ']'):
-                isLabelYN = 1
-
-            if cleanLine == '[ CA_default ]':
-                # we don't care much until we hit this label
-                in_CA_defaultYN = 1
-            elif isLabelYN:
-                in_CA_defaultYN = 0  # hit another label
-
-            if in_CA_defaultYN:
-                vector = line.split('=')
-                if len(vector) == 2:
-                    key = vector[0].strip()
-                    if key == 'dir':
-                        # we should be OK - short-circuit
-                        return
-                    if key in ('database', 'serial'):
-                        # we never hit a "dir" key
-                        if not dirSetYN:
-                            newfile = newfile + """\
-dir                     = %s
-database                = $dir/index.txt
-serial                  = $dir/serial
-""" % newdir
-                            dirSetYN = 1
-                        line = fo.readline()
-                        continue
-
-            newfile = newfile + line
-            line = fo.readline()
-
-        try:
-            rotated = rotateFile(filepath=self.filename, verbosity=verbosity)
-            if verbosity >= 0 and rotated:
-                print("Rotated: %s --> %s" % (os.path.basename(self.filename),
-                                              os.path.basename(rotated)))
-        except ValueError:
-            pass
-        fo = open(self.filename, 'w')
-        fo.write(newfile)
-        fo.close()
-        os.chmod(self.filename, 0o600)
-
-        return dirSetYN
+        doc.setCaDir(newdir)
+        if doc.changedYN:
+            self._write(doc.text(), verbosity)
+        return doc.changedYN
 
     def updateDir(self, newdir=None, verbosity=0):
         """ changes the CA configuration file's directory setting (if need be)
             in place. Touches nothing else.
         """
 
-        if self.updateLegacy(newdir):
+        doc = self.document()
+        if doc is None:
             return
 
-        try:
-            fo = open(self.filename, 'r')
-        except IOError:
-            return
-
-        olddir = ''
         if newdir is None:
             newdir = os.path.dirname(self.filename)
-
-        newfile = ""
-        hit_CA_defaultYN = 0
-
-        line = fo.readline()
-        while line:
-            if line.strip() == '[ CA_default ]':
-                # we don't care much until we hit this label
-                hit_CA_defaultYN = 1
-            if hit_CA_defaultYN:
-                vector = line.split('=')
-                if len(vector) == 2:
-                    key, value = vector
-                    if key.strip() == 'dir':
-                        olddir = value.strip()
-                        line = '%s= %s\n' % (key, newdir)
-                        hit_CA_defaultYN = 0
-                        if newdir == olddir:
-                            # nothing to do
-                            return
-            newfile = newfile + line
-            line = fo.readline()
-
-        try:
-            rotated = rotateFile(filepath=self.filename, verbosity=verbosity)
-            if verbosity >= 0 and rotated:
-                print("Rotated: %s --> %s" % (os.path.basename(self.filename),
-                                              os.path.basename(rotated)))
-        except ValueError:
-            pass
-        fo = open(self.filename, 'w')
-        fo.write(newfile)
-        fo.close()
-        os.chmod(self.filename, 0o600)
+        doc.setCaDir(newdir)
+        if doc.changedYN:
+            self._write(doc.text(), verbosity)
 
     def save(self, d, caYN=0, verbosity=0):
         """ d == commandline dictionary """
@@ -709,27 +585,22 @@ serial                  = $dir/serial
             if k in mapping:
                 rdn[mapping[k]] = d[k].strip()
 
+        profile = keyProfile(d)
         openssl_cnf = ''
         if caYN:
             openssl_cnf = CONF_TEMPLATE_CA % (
               os.path.dirname(self.filename)+'/',
+              gen_req_key(profile),
               gen_req_distinguished_name(rdn),
+              keyUsage('ca', profile[0]),
               )
         else:
             openssl_cnf = CONF_TEMPLATE_SERVER \
-              % (gen_req_distinguished_name(rdn), d['--purpose'],  gen_req_alt_names(d, rdn['CN']))
+              % (gen_req_key(profile), gen_req_distinguished_name(rdn),
+                 keyUsage('cert', profile[0]), d['--purpose'], keyUsage('req', profile[0]),
+                 gen_req_alt_names(d, rdn['CN']))
 
-        try:
-            rotated = rotateFile(filepath=self.filename, verbosity=verbosity)
-            if verbosity >= 0 and rotated:
-                print("Rotated: %s --> %s" % (os.path.basename(self.filename),
-                                              os.path.basename(rotated)))
-        except ValueError:
-            pass
-        fo = open(self.filename, 'w')
-        fo.write(openssl_cnf)
-        fo.close()
-        os.chmod(self.filename, 0o600)
+        self._write(openssl_cnf, verbosity)
         return openssl_cnf
 
 
@@ -0,0 +1,423 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool DER reader
+#
+# Reads the few fields of certificates, certificate requests and private
+# keys katello-ssl-tool looks at (names, key type and size, validity,
+# subjectAltNames, key identifiers and purpose) in-process, for the
+# backends, --inventory, --ledger and --reconcile. cryptography.x509 would
+# do, but it is optional (only --crypto-backend cryptography needs it) and
+# importing it costs some 80ms, paid again by every --inventory worker
+# process and by every --gen-server run that looks at an existing CA key or
+# certificate (see tests/startup-time.sh). Anything malformed is a
+# ValueError, whatever part of the DER it breaks (see tests/der-reader.sh).
+#
+# $Id$
+
+import base64
+import datetime
+import functools
+import socket
+
+# notAfter format of parseCertificate() (and sslToolBackend getCertInfo())
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# key types read here --> --key-type
+KEY_TYPE_OPTIONS = {'RSA': 'rsa', 'EC': 'ecdsa', 'Ed25519': 'ed25519'}
+
+_NAMES = {
+    '2.5.4.3': 'CN',
+    '2.5.4.6': 'C',
+    '2.5.4.7': 'L',
+    '2.5.4.8': 'ST',
+    '2.5.4.10': 'O',
+    '2.5.4.11': 'OU',
+    '1.2.840.113549.1.9.1': 'emailAddress',
+}
+
+_RSA = '1.2.840.113549.1.1.1'
+_EC = '1.2.840.10045.2.1'
+_KEY_TYPES = {
+    '1.3.101.112': ('Ed25519', 256),
+    '1.3.101.113': ('Ed448', 456),
+}
+_CURVES = {
+    '1.2.840.10045.3.1.7': 256,     # prime256v1
+    '1.3.132.0.34': 384,            # secp384r1
+    '1.3.132.0.35': 521,            # secp521r1
+}
+
+_BASIC_CONSTRAINTS = '2.5.29.19'
+_SUBJECT_ALT_NAME = '2.5.29.17'
+_SUBJECT_KEY_ID = '2.5.29.14'
+_AUTHORITY_KEY_ID = '2.5.29.35'
+_EXTENSION_REQUEST = '1.2.840.113549.1.9.14'
+_NS_CERT_TYPE = '2.16.840.1.113730.1.1'
+
+
+def _tlv(data, pos):
+    """ the (tag, start of content, end of content) of the DER element at pos """
+
+    if pos + 2 > len(data):
+        raise ValueError('truncated DER at byte %d' % pos)
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        n = length & 0x7f
+        length = int.from_bytes(data[pos:pos + n], 'big')
+        pos += n
+    if pos + length > len(data):
+        raise ValueError('truncated DER at byte %d' % pos)
+    return tag, pos, pos + length
+
+
+def _der(parse):
+    """ decorator: a DER parser that fails with ValueError only, also where
+        the structure is not what it expects
+    """
+
+    @functools.wraps(parse)
+    def wrapper(der):
+        try:
+            return parse(der)
+        except (IndexError, KeyError, TypeError) as e:
+            raise ValueError('malformed DER: %s' % (e or e.__class__.__name__))
+    return wrapper
+
+
+def _children(data, start, end):
+    """ the (tag, start, end) of the elements within start:end """
+
+    children = []
+    while start < end:
+        tag, cstart, cend = _tlv(data, start)
+        children.append((tag, cstart, cend))
+        start = cend
+    return children
+
+
+def _encode(tag, content):
+    """ the DER element of tag with content """
+
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([tag, 0x80 | len(raw)]) + raw + content
+
+
+def _oid(raw):
+    values = []
+    value = 0
+    for b in bytearray(raw):
+        value = (value << 7) | (b & 0x7f)
+        if not b & 0x80:
+            values.append(value)
+            value = 0
+    first = min(values[0] // 40, 2)
+    return '.'.join(str(v) for v in [first, values[0] - first * 40] + values[1:])
+
+
+def _string(tag, raw):
+    if tag == 0x1e:     # BMPString
+        return raw.decode('utf-16-be')
+    return raw.decode('utf-8', 'replace')
+
+
+def _time(tag, raw):
+    raw = raw.decode('ascii')
+    if tag == 0x17:     # UTCTime, YYMMDDHHMMSSZ
+        when = datetime.datetime.strptime(raw, '%y%m%d%H%M%SZ')
+    else:               # GeneralizedTime, YYYYMMDDHHMMSSZ
+        when = datetime.datetime.strptime(raw, '%Y%m%d%H%M%SZ')
+    return when.strftime(TIME_FORMAT)
+
+
+def _escape(value):
+    for c in '\\,+"<>;=':
+        value = value.replace(c, '\\' + c)
+    return value
+
+
+def formatName(rdns):
+    """ an RFC 2253 string of [[(key, value), ...], ...], the relative
+        distinguished names of a Name in DER (most significant first) order
+    """
+
+    return ','.join('+'.join('%s=%s' % (key, _escape(value)) for key, value in rdn)
+                    for rdn in reversed(rdns))
+
+
+def _name(data, start, end):
+    """ a Name as an RFC 2253 string (like openssl -nameopt RFC2253) """
+
+    rdns = []
+    for _tag, sstart, send in _children(data, start, end):
+        attrs = []
+        for _tag, astart, aend in _children(data, sstart, send):
+            (otag, ostart, oend), (vtag, vstart, vend) = _children(data, astart, aend)
+            oid = _oid(data[ostart:oend])
+            attrs.append((_NAMES.get(oid, oid), _string(vtag, data[vstart:vend])))
+        rdns.append(attrs)
+    return formatName(rdns)
+
+
+def _publicKey(data, start, end):
+    """ (key type, key size in bits) of a SubjectPublicKeyInfo """
+
+    (_tag, astart, aend), (_tag2, kstart, kend) = _children(data, start, end)
+    algorithm = _children(data, astart, aend)
+    oid = _oid(data[algorithm[0][1]:algorithm[0][2]])
+    if oid == _RSA:
+        # BIT STRING (unused bits byte) of SEQUENCE { modulus, exponent }
+        _tag, sstart, send = _tlv(data, kstart + 1)
+        _tag, mstart, mend = _children(data, sstart, send)[0]
+        return 'RSA', int.from_bytes(data[mstart:mend], 'big').bit_length()
+    if oid == _EC:
+        curve = _oid(data[algorithm[1][1]:algorithm[1][2]])
+        return 'EC', _CURVES.get(curve)
+    return _KEY_TYPES.get(oid, (oid, None))
+
+
+def _altNames(data, start, end):
+    names = []
+    for tag, nstart, nend in _children(data, start, end):
+        if tag == 0x82:     # dNSName
+            names.append('DNS:' + data[nstart:nend].decode('ascii', 'replace'))
+        elif tag == 0x87:   # iPAddress
+            family = socket.AF_INET if nend - nstart == 4 else socket.AF_INET6
+            names.append('IP:' + socket.inet_ntop(family, bytes(data[nstart:nend])))
+        elif tag == 0x81:   # rfc822Name
+            names.append('email:' + data[nstart:nend].decode('ascii', 'replace'))
+    return names
+
+
+def _extensions(data, start, end):
+    """ the (oid, start, end) of the values of the Extensions within
+        start:end
+    """
+
+    extensions = []
+    for _tag, xstart, xend in _children(data, start, end):
+        parts = _children(data, xstart, xend)
+        oid = _oid(data[parts[0][1]:parts[0][2]])
+        _tag, vstart, vend = parts[-1]                  # OCTET STRING
+        _tag, vstart, vend = _tlv(data, vstart)
+        extensions.append((oid, vstart, vend))
+    return extensions
+
+
+def _tbsFields(data):
+    """ the fields of the tbsCertificate of a certificate, from serial """
+
+    _tag, start, end = _tlv(data, 0)
+    _tag, start, end = _children(data, start, end)[0]    # tbsCertificate
+    fields = _children(data, start, end)
+    if fields[0][0] == 0xa0:                            # [0] version
+        fields = fields[1:]
+    return fields
+
+
+def _certExtensions(data, fields):
+    for tag, estart, eend in fields[6:]:
+        if tag == 0xa3:                                 # [3] extensions
+            _tag, lstart, lend = _tlv(data, estart)
+            return _extensions(data, lstart, lend)
+    return []
+
+
+@_der
+def parseCertificate(der):
+    """ the inventory fields of a DER encoded X.509 certificate """
+
+    data = bytearray(der)
+    fields = _tbsFields(data)
+    serial, _signature, issuer, validity, subject, spki = fields[:6]
+
+    notBefore, notAfter = _children(data, validity[1], validity[2])
+    keyType, keySize = _publicKey(data, spki[1], spki[2])
+    info = {
+        'serial': '%X' % int.from_bytes(data[serial[1]:serial[2]], 'big'),
+        'issuer': _name(data, issuer[1], issuer[2]),
+        'subject': _name(data, subject[1], subject[2]),
+        'notBefore': _time(notBefore[0], data[notBefore[1]:notBefore[2]]),
+        'notAfter': _time(notAfter[0], data[notAfter[1]:notAfter[2]]),
+        'keyType': keyType,
+        'keySize': keySize,
+        'sans': [],
+        'kind': 'server',
+    }
+
+    for oid, vstart, vend in _certExtensions(data, fields):
+        if oid == _SUBJECT_ALT_NAME:
+            info['sans'] = _altNames(data, vstart, vend)
+        elif oid == _BASIC_CONSTRAINTS:
+            constraints = _children(data, vstart, vend)
+            if constraints and constraints[0][0] == 0x01 and data[constraints[0][1]]:
+                info['kind'] = 'ca'
+        elif oid == _NS_CERT_TYPE and info['kind'] != 'ca' and vend - vstart > 1:
+            bits = data[vstart + 1]
+            if bits & 0x80 and not bits & 0x40:         # client, not server
+                info['kind'] = 'client'
+    return info
+
+
+@_der
+def certKeyIds(der):
+    """ (subject, authority) key identifiers of a DER encoded certificate,
+        as hex strings, None where the extension is missing
+    """
+
+    data = bytearray(der)
+    subjectKeyId = authorityKeyId = None
+    for oid, vstart, vend in _certExtensions(data, _tbsFields(data)):
+        if oid == _SUBJECT_KEY_ID:
+            subjectKeyId = bytes(data[vstart:vend]).hex()
+        elif oid == _AUTHORITY_KEY_ID:
+            for tag, kstart, kend in _children(data, vstart, vend):
+                if tag == 0x80:                         # [0] keyIdentifier
+                    authorityKeyId = bytes(data[kstart:kend]).hex()
+    return subjectKeyId, authorityKeyId
+
+
+@_der
+def certPublicKey(der):
+    """ the DER SubjectPublicKeyInfo of a DER encoded certificate """
+
+    data = bytearray(der)
+    subject, spki = _tbsFields(data)[4:6]
+    # the element starts where the one before it (subject) ends
+    return bytes(data[subject[2]:spki[2]])
+
+
+@_der
+def parseCertReq(der):
+    """ subject, key type, key size, subjectAltNames and the DER
+        SubjectPublicKeyInfo (publicKey) of a DER encoded PKCS#10
+        certificate request
+    """
+
+    data = bytearray(der)
+    _tag, start, end = _tlv(data, 0)
+    _tag, start, end = _children(data, start, end)[0]    # certificationRequestInfo
+    elements = _children(data, start, end)
+    _version, subject, spki = elements[:3]
+    keyType, keySize = _publicKey(data, spki[1], spki[2])
+    info = {
+        'subject': _name(data, subject[1], subject[2]),
+        'keyType': keyType,
+        'keySize': keySize,
+        'sans': [],
+        'publicKey': bytes(data[subject[2]:spki[2]]),
+    }
+    for tag, astart, aend in elements[3:]:
+        if tag != 0xa0:                                 # [0] attributes
+            continue
+        for _tag, xstart, xend in _children(data, astart, aend):
+            (_otag, ostart, oend), (_stag, sstart, send) = _children(data, xstart, xend)
+            if _oid(data[ostart:oend]) != _EXTENSION_REQUEST:
+                continue
+            _tag, lstart, lend = _tlv(data, sstart)     # SET { Extensions }
+            for oid, vstart, vend in _extensions(data, lstart, lend):
+                if oid == _SUBJECT_ALT_NAME:
+                    info['sans'] = _altNames(data, vstart, vend)
+    return info
+
+
+def certReqKey(der):
+    """ (key type, key size in bits) of a DER encoded PKCS#10 certificate
+        request
+    """
+
+    info = parseCertReq(der)
+    return info['keyType'], info['keySize']
+
+
+@_der
+def privateKeyInfo(der):
+    """ (key type, key size in bits, RSA primes) of a DER encoded,
+        unencrypted PKCS#8 private key
+    """
+
+    data = bytearray(der)
+    _tag, start, end = _tlv(data, 0)
+    _version, algorithm, key = _children(data, start, end)[:3]
+    parameters = _children(data, algorithm[1], algorithm[2])
+    oid = _oid(data[parameters[0][1]:parameters[0][2]])
+    if oid == _RSA:
+        # RSAPrivateKey: version, modulus, ..., otherPrimeInfos
+        _tag, rstart, rend = _tlv(data, key[1])
+        elements = _children(data, rstart, rend)
+        modulus = elements[1]
+        primes = 2
+        if len(elements) > 9:
+            primes += len(_children(data, elements[9][1], elements[9][2]))
+        return 'RSA', int.from_bytes(data[modulus[1]:modulus[2]], 'big').bit_length(), primes
+    if oid == _EC:
+        curve = _oid(data[parameters[1][1]:parameters[1][2]])
+        return 'EC', _CURVES.get(curve), None
+    keyType, keySize = _KEY_TYPES.get(oid, (oid, None))
+    return keyType, keySize, None
+
+
+@_der
+def privateKeyPublicKey(der):
+    """ the DER SubjectPublicKeyInfo of a DER encoded, unencrypted PKCS#8
+        private key; None where the key does not hold it (Ed25519 keys, EC
+        keys without their public point)
+    """
+
+    data = bytearray(der)
+    _tag, start, end = _tlv(data, 0)
+    version, algorithm, key = _children(data, start, end)[:3]
+    # the AlgorithmIdentifier is the same in both, it starts where version ends
+    algorithmDer = bytes(data[version[2]:algorithm[2]])
+    parameters = _children(data, algorithm[1], algorithm[2])
+    oid = _oid(data[parameters[0][1]:parameters[0][2]])
+    if oid not in (_RSA, _EC):
+        return None
+    _tag, kstart, kend = _tlv(data, key[1])
+    elements = _children(data, kstart, kend)
+    if oid == _RSA:
+        # RSAPrivateKey: version, modulus, publicExponent, ...
+        publicKey = _encode(0x30, bytes(data[elements[0][2]:elements[2][2]]))
+        return _encode(0x30, algorithmDer + _encode(0x03, b'\x00' + publicKey))
+    # ECPrivateKey: version, privateKey, [0] parameters, [1] publicKey
+    for tag, pstart, pend in elements[2:]:
+        if tag == 0xa1:
+            return _encode(0x30, algorithmDer + bytes(data[pstart:pend]))
+    return None
+
+
+def pemDer(pem, label='CERTIFICATE'):
+    """ the DER bytes of the (first) PEM block label in the text pem """
+
+    begin = pem.find('-----BEGIN %s-----' % label)
+    end = pem.find('-----END %s-----' % label, begin)
+    if begin < 0 or end < 0:
+        raise ValueError('not a PEM %s' % label.lower())
+    begin += len('-----BEGIN %s-----' % label)
+    return base64.b64decode(pem[begin:end])
+
+
+def readDer(path, label='CERTIFICATE'):
+    """ the DER bytes of the (first) certificate, or other PEM block label
+        (CERTIFICATE REQUEST), in a PEM file
+    """
+
+    with open(path) as fo:
+        return pemDer(fo.read(), label)
@@ -0,0 +1,194 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool certificate inventory (--inventory)
+#
+# Every certificate of a build directory (the CA certificates at the top,
+# BUILD_DIR/MACHINE_NAME/*.crt below) is parsed in-process by the DER reader
+# of sslToolDer, so neither openssl nor python3-cryptography is needed. What
+# was parsed is kept in BUILD_DIR/katello-inventory.json, keyed on the mtime
+# and size of each file, so a re-scan only parses the certificates that
+# changed; a larger number of those is spread over a pool of worker
+# processes.
+#
+# $Id$
+
+import datetime
+import json
+import os
+
+from katello_certs_tools.fileutils import cleanupAbsPath, statKey, readJson, writeJsonAtomic
+from katello_certs_tools.sslToolDer import readDer, parseCertificate, TIME_FORMAT
+from katello_certs_tools.sslToolTrace import traced
+
+INVENTORY_CACHE_NAME = 'katello-inventory.json'
+
+# parsing is cheap; below this many files the pool costs more than it saves
+POOL_THRESHOLD = 64
+
+# directories of a build directory that hold no host certificates
+_SKIP_DIRS = ('key-pool',)
+
+
+def readCertificate(path):
+    """ the inventory fields of the (first) certificate in a PEM file """
+
+    return parseCertificate(readDer(path))
+
+
+def _readWorker(path):
+    """ readCertificate() for a worker process: (path, info, error) """
+
+    try:
+        return path, readCertificate(path), None
+    except (IOError, OSError, ValueError) as e:
+        return path, None, str(e) or e.__class__.__name__
+
+
+#
+# the build directory
+#
+
+def _rpmRelease(directory):
+    """ (rpm, release) of the newest RPM named in directory/latest.txt """
+
+    try:
+        with open(os.path.join(directory, 'latest.txt')) as fo:
+            lines = [line.strip() for line in fo]
+    except (IOError, OSError):
+        return None, None
+    for line in lines:
+        if line.endswith('.noarch.rpm'):
+            release = line[:-len('.noarch.rpm')].rsplit('-', 1)[-1]
+            return line, release
+    return None, None
+
+
+def findCertificates(directory, caCerts=()):
+    """ [(path, hostname or None), ...] of the certificates in directory:
+        *.crt and the CA certificates named caCerts (--ca-cert, such as
+        KATELLO-TRUSTED-SSL-CERT) at the top, */*.crt below
+    """
+
+    found = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if (name.endswith('.crt') or name in caCerts) and os.path.isfile(path):
+            found.append((path, None))
+        elif os.path.isdir(path) and name not in _SKIP_DIRS and not name.startswith('.'):
+            for hostFile in sorted(os.listdir(path)):
+                if hostFile.endswith('.crt'):
+                    found.append((os.path.join(path, hostFile), name))
+    return found
+
+
+def _cacheFile(directory):
+    return os.path.join(directory, INVENTORY_CACHE_NAME)
+
+
+def _parseAll(paths, jobs):
+    """ {path: (info, error)} of paths, in a pool of jobs workers if worth it """
+
+    if jobs > 1 and len(paths) >= POOL_THRESHOLD:
+        # deferred, the pool machinery is not cheap to import
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_readWorker, paths, chunksize=32))
+    else:
+        results = [_readWorker(path) for path in paths]
+    return dict((path, (info, error)) for path, info, error in results)
+
+
+@traced
+def scanInventory(directory, jobs=1, caCerts=()):
+    """ a list of dictionaries, one per certificate of the build directory
+        (see findCertificates): path, host, kind, subject, sans, serial,
+        notAfter, keyType, keySize, rpm and release (or path, host and error
+        for a file that could not be parsed).
+    """
+
+    directory = cleanupAbsPath(directory)
+    cache = readJson(_cacheFile(directory))
+    changedYN = 0
+
+    found = findCertificates(directory, caCerts)
+    keys = dict((path, statKey(path)) for path, _host in found)
+    stale = [path for path, _host in found
+             if not isinstance(cache.get(path), dict) or cache[path].get('key') != keys[path]]
+    for path, (info, error) in _parseAll(stale, jobs).items():
+        changedYN = 1
+        if error is None:
+            cache[path] = {'key': keys[path], 'info': info}
+        else:
+            cache[path] = {'key': keys[path], 'error': error}
+
+    # forget certificates that were removed
+    for path in list(cache.keys()):
+        if path not in keys:
+            del cache[path]
+            changedYN = 1
+    if changedYN:
+        writeJsonAtomic(_cacheFile(directory), cache, bestEffortYN=1)
+
+    releases = {}
+    entries = []
+    for path, host in found:
+        entry = {'path': path, 'host': host}
+        if 'error' in cache[path]:
+            entry['error'] = cache[path]['error']
+        else:
+            entry.update(cache[path]['info'])
+        hostDir = os.path.dirname(path)
+        if hostDir not in releases:
+            releases[hostDir] = _rpmRelease(hostDir)
+        entry['rpm'], entry['release'] = releases[hostDir]
+        entries.append(entry)
+    return entries
+
+
+def expiringWithin(entries, days, now=None):
+    """ the entries expiring within days (from now) """
+
+    now = now or datetime.datetime.utcnow()
+    limit = (now + datetime.timedelta(days=days)).strftime(TIME_FORMAT)
+    # ISO timestamps of the same format sort chronologically
+    return [e for e in entries if e.get('notAfter') and e['notAfter'] <= limit]
+
+
+def formatTable(entries):
+    """ the entries as a text table, soonest expiry first """
+
+    header = ('NOT AFTER', 'KIND', 'HOST', 'SERIAL', 'KEY', 'RELEASE', 'SUBJECT / SANS')
+    rows = []
+    for e in sorted(entries, key=lambda e: (e.get('notAfter') or '', e['path'])):
+        host = e['host'] or os.path.basename(e['path'])
+        if 'error' in e:
+            rows.append(('-', 'error', host, '-', '-', '-', e['error']))
+            continue
+        names = e['subject']
+        if e['sans']:
+            names += ' / ' + ', '.join(e['sans'])
+        rows.append((e['notAfter'], e['kind'], host, e['serial'],
+                     '%s %s' % (e['keyType'], e['keySize'] or '?'), e['release'] or '-', names))
+
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header) - 1)]
+    lines = []
+    for row in [header] + rows:
+        lines.append('  '.join([str(v).ljust(w) for v, w in zip(row, widths)] + [str(row[-1])]))
+    return '\n'.join(lines)
+
+
+def formatJson(entries):
+    return json.dumps(entries, indent=2, sort_keys=True)
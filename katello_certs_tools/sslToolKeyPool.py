@@ -0,0 +1,153 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool pre-generated private key pool
+#
+# BUILD_DIR/key-pool holds private keys generated ahead of time by
+# "katello-ssl-tool --fill-key-pool" (from cron, a timer, or by hand).
+# "--gen-server --use-key-pool" then claims one of them instead of running
+# the key generation inline. A claim is a rename within the pool directory,
+# so two concurrent invocations can never end up with the same key.
+#
+# Keys of the default profile (RSA 4096) are kept in BUILD_DIR/key-pool,
+# those of other key profiles (--key-type ...) in a directory of their own
+# within it, such as BUILD_DIR/key-pool/ecdsa-256.
+#
+# $Id$
+
+from __future__ import print_function
+
+import errno
+import fcntl
+import os
+import time
+
+from katello_certs_tools.fileutils import rotateFile, readJson, writeJsonAtomic
+from katello_certs_tools.sslToolKeygen import genKeys
+from katello_certs_tools.sslToolLib import gendir
+from katello_certs_tools.sslToolConfig import DEFAULT_KEY_PROFILE, keyProfileName
+from katello_certs_tools.sslToolTrace import traced
+
+KEY_POOL_DIR_NAME = 'key-pool'
+_STATS_NAME = 'stats.json'
+_LOCK_NAME = '.lock'
+
+
+def keyPoolDir(directory, profile=None):
+    """ the pool of the keys of profile (the default one if None) """
+
+    poolDir = os.path.join(directory, KEY_POOL_DIR_NAME)
+    if profile is None or tuple(profile) == DEFAULT_KEY_PROFILE:
+        return poolDir
+    return os.path.join(poolDir, keyProfileName(profile))
+
+
+def _availableKeys(poolDir):
+    try:
+        names = os.listdir(poolDir)
+    except OSError:
+        return []
+    return sorted(n for n in names if n.endswith('.key') and not n.startswith('.'))
+
+
+def _updateStats(poolDir, hits=0, misses=0):
+    """ add to the persistent hit/miss counters, returns the new counters """
+
+    gendir(poolDir)
+    with open(os.path.join(poolDir, _LOCK_NAME), 'a') as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+        stats = readStats(poolDir)
+        stats['hits'] += hits
+        stats['misses'] += misses
+        writeJsonAtomic(os.path.join(poolDir, _STATS_NAME), stats)
+    return stats
+
+
+def readStats(poolDir):
+    stats = {'hits': 0, 'misses': 0}
+    stats.update(readJson(os.path.join(poolDir, _STATS_NAME)))
+    return stats
+
+
+@traced
+def claimKey(directory, keyFile, verbosity=0, profile=None):
+    """ move a pre-generated key of profile from the pool to keyFile
+        (rotating the existing keyFile first). Returns True on a pool hit,
+        False if the pool is empty and the caller has to generate the key
+        itself.
+    """
+
+    poolDir = keyPoolDir(directory, profile)
+    claimed = None
+    for name in _availableKeys(poolDir):
+        candidate = os.path.join(poolDir, '.claimed-%d-%s' % (os.getpid(), name))
+        try:
+            os.rename(os.path.join(poolDir, name), candidate)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # somebody else claimed this one first
+                continue
+            raise
+        claimed = candidate
+        break
+
+    if claimed is None:
+        stats = _updateStats(poolDir, misses=1)
+        if verbosity >= 0:
+            print("Key pool: miss, generating the key inline (hits: %d, misses: %d)"
+                  % (stats['hits'], stats['misses']))
+        return False
+
+    gendir(os.path.dirname(keyFile))
+    try:
+        rotated = rotateFile(filepath=keyFile, verbosity=verbosity)
+        if verbosity >= 0 and rotated:
+            print("Rotated: %s --> %s" % (os.path.basename(keyFile),
+                                          os.path.basename(rotated)))
+    except ValueError:
+        pass
+    os.chmod(claimed, 0o600)
+    os.rename(claimed, keyFile)
+
+    stats = _updateStats(poolDir, hits=1)
+    if verbosity >= 0:
+        print("Key pool: hit, %d key(s) left (hits: %d, misses: %d)"
+              % (len(_availableKeys(poolDir)), stats['hits'], stats['misses']))
+    return True
+
+
+@traced
+def fillKeyPool(directory, size, jobs=1, verbosity=0, backend=None, profile=None):
+    """ top the pool of profile up to size keys. Returns the list of keys
+        that failed to generate (empty on success).
+    """
+
+    poolDir = keyPoolDir(directory, profile)
+    gendir(poolDir)
+    os.chmod(poolDir, 0o700)
+
+    missing = size - len(_availableKeys(poolDir))
+    keyFiles = []
+    stamp = time.strftime('%Y%m%d%H%M%S')
+    for i in range(max(0, missing)):
+        keyFiles.append(os.path.join(poolDir, '%s-%d-%04d.key' % (stamp, os.getpid(), i)))
+
+    errors = genKeys(keyFiles, jobs, verbosity, backend, profile)
+
+    if verbosity >= 0:
+        stats = readStats(poolDir)
+        print("Key pool %s: %d key(s) available (hits: %d, misses: %d)"
+              % (poolDir, len(_availableKeys(poolDir)), stats['hits'], stats['misses']))
+    return sorted(errors.keys())
@@ -0,0 +1,114 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool parallel private key generation
+#
+# Keys are generated into a temporary file next to their final location by
+# a pool of worker processes. The parent process then rotates the old key
+# and renames the new one into place, so a failed or interrupted run never
+# leaves a half written key behind.
+#
+# $Id$
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+
+from katello_certs_tools.fileutils import rotateFile
+from katello_certs_tools.sslToolBackend import getBackend
+from katello_certs_tools.sslToolLib import gendir
+from katello_certs_tools.sslToolTrace import traced
+
+
+@traced
+def _genKeyWorker(job):
+    """ generate one private key into a temporary file (runs in a worker
+        process). Returns (keyFile, tmpFile, error).
+    """
+
+    keyFile, backend, profile = job
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(keyFile),
+                                   prefix='.%s-' % os.path.basename(keyFile))
+    os.close(fd)
+
+    ret, out, err = getBackend(backend).genPrivateKey(tmpFile, profile=profile)
+
+    if ret:
+        os.unlink(tmpFile)
+        return keyFile, None, "%s\n%s" % (out, err)
+    return keyFile, tmpFile, None
+
+
+def _installKey(keyFile, tmpFile, verbosity=0):
+    """ rotate the existing key (if any) and move the new one into place """
+
+    try:
+        rotated = rotateFile(filepath=keyFile, verbosity=verbosity)
+        if verbosity >= 0 and rotated:
+            print("Rotated: %s --> %s" % (os.path.basename(keyFile),
+                                          os.path.basename(rotated)))
+    except ValueError:
+        pass
+
+    os.chmod(tmpFile, 0o600)
+    os.rename(tmpFile, keyFile)
+
+
+@traced
+def genKeys(keyFiles, jobs=1, verbosity=0, backend=None, profile=None):
+    """ generate a private key for each of keyFiles, fanned out across a pool
+        of jobs worker processes using the named crypto backend. profile is
+        the key profile (see keyProfile()), RSA 4096 by default.
+
+        Returns a dictionary of keyFile --> error message for the keys that
+        could not be generated.
+    """
+
+    errors = {}
+    if not keyFiles:
+        return errors
+
+    for keyFile in keyFiles:
+        gendir(os.path.dirname(keyFile))
+
+    jobs = max(1, min(jobs or 1, len(keyFiles)))
+    if verbosity >= 0:
+        print("\nGenerating %d SSL private key(s) using %d job(s)" % (len(keyFiles), jobs))
+
+    work = [(keyFile, backend, profile) for keyFile in keyFiles]
+    if jobs == 1:
+        results = map(_genKeyWorker, work)
+        executor = None
+    else:
+        # deferred: single key runs never need multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(_genKeyWorker, work)
+
+    try:
+        for keyFile, tmpFile, error in results:
+            if error is not None:
+                errors[keyFile] = error
+                continue
+            _installKey(keyFile, tmpFile, verbosity)
+            if verbosity > 0:
+                sys.stderr.write("Generated: %s\n" % keyFile)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return errors
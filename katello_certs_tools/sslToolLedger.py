@@ -0,0 +1,249 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool issuance ledger (--ledger)
+#
+# Every certificate katello-ssl-tool signs (CA and server/client) is
+# recorded in the sqlite database BUILD_DIR/katello-ledger.db, indexed by
+# serial, subject, hostname, notAfter and fingerprint, so that questions
+# about what was issued do not need a crawl of the build directory (and of
+# the backups that the next certificate rotates away). openssl's index.txt
+# format is generated from it on demand (--ledger --format index).
+#
+# sqlite serializes the writers of concurrent runs (--jobs, --serve).
+#
+# $Id$
+
+import datetime
+import json
+import os
+import re
+
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+from katello_certs_tools.sslToolBackend import derFingerprint
+from katello_certs_tools.sslToolDer import readDer, parseCertificate, TIME_FORMAT
+from katello_certs_tools.sslToolInventory import scanInventory
+from katello_certs_tools.sslToolTrace import traced
+
+LEDGER_NAME = 'katello-ledger.db'
+
+# seconds a writer waits for another one
+_LOCK_TIMEOUT = 60
+
+_COLUMNS = ('serial', 'issuer', 'subject', 'hostname', 'kind', 'notBefore', 'notAfter',
+            'fingerprint', 'path', 'recorded')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    serial TEXT NOT NULL,
+    issuer TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    hostname TEXT,
+    kind TEXT NOT NULL,
+    notBefore TEXT NOT NULL,
+    notAfter TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    path TEXT,
+    recorded TEXT NOT NULL,
+    UNIQUE (issuer, serial)
+);
+CREATE INDEX IF NOT EXISTS certificates_serial ON certificates (serial);
+CREATE INDEX IF NOT EXISTS certificates_subject ON certificates (subject);
+CREATE INDEX IF NOT EXISTS certificates_hostname ON certificates (hostname);
+CREATE INDEX IF NOT EXISTS certificates_notAfter ON certificates (notAfter);
+CREATE INDEX IF NOT EXISTS certificates_fingerprint ON certificates (fingerprint);
+"""
+
+
+class LedgerException(KatelloSslToolException):
+    """ the issuance ledger could not be read or written """
+
+
+def _connect(directory):
+    # deferred, most runs never open the ledger
+    import sqlite3
+
+    filename = os.path.join(directory, LEDGER_NAME)
+    try:
+        db = sqlite3.connect(filename, timeout=_LOCK_TIMEOUT)
+        os.chmod(filename, 0o600)
+        db.executescript(_SCHEMA)
+    except (sqlite3.Error, OSError) as e:
+        raise LedgerException("unable to open the issuance ledger %s: %s" % (filename, e))
+    return db
+
+
+def normalizeSerial(serial):
+    """ a serial number (hex, maybe 0x, colons or leading zeros) as the
+        ledger stores it: upper case hex without leading zeros
+    """
+
+    serial = serial.strip().upper().replace(':', '')
+    if serial.startswith('0X'):
+        serial = serial[2:]
+    return serial.lstrip('0') or '0'
+
+
+def normalizeFingerprint(fingerprint):
+    digits = fingerprint.strip().upper().replace(':', '')
+    return ':'.join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+def _row(info, der, path, hostname):
+    now = datetime.datetime.utcnow().strftime(TIME_FORMAT)
+    return (info['serial'], info['issuer'], info['subject'], hostname, info['kind'],
+            info['notBefore'], info['notAfter'], derFingerprint(der), path, now)
+
+
+def _insert(db, rows, conflict='REPLACE'):
+    import sqlite3
+    try:
+        with db:
+            db.executemany("INSERT OR %s INTO certificates (%s) VALUES (%s)"
+                           % (conflict, ', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS))), rows)
+    except sqlite3.Error as e:
+        raise LedgerException("unable to write the issuance ledger: %s" % e)
+
+
+@traced
+def recordCertificate(directory, certFile, hostname=None):
+    """ record the certificate just written to certFile in the ledger of
+        build directory directory
+    """
+
+    try:
+        der = readDer(certFile)
+        info = parseCertificate(der)
+    except (IOError, OSError, ValueError) as e:
+        raise LedgerException("unable to read %s for the issuance ledger: %s" % (certFile, e))
+    db = _connect(directory)
+    try:
+        _insert(db, [_row(info, der, os.path.abspath(certFile), hostname)])
+    finally:
+        db.close()
+
+
+def importTree(directory, caCerts=()):
+    """ record every certificate found in the build directory (see
+        --inventory and sslToolInventory.findCertificates), for build
+        directories older than the ledger. Returns the number of
+        certificates recorded.
+    """
+
+    rows = []
+    for entry in scanInventory(directory, caCerts=caCerts):
+        if 'error' in entry:
+            continue
+        try:
+            der = readDer(entry['path'])
+        except (IOError, OSError, ValueError):
+            continue
+        rows.append(_row(entry, der, entry['path'], entry['host']))
+
+    db = _connect(directory)
+    try:
+        # what the ledger already knows is kept as it is
+        _insert(db, rows, 'IGNORE')
+    finally:
+        db.close()
+    return len(rows)
+
+
+def findCertificates(directory, serial=None, hostname=None, subject=None, fingerprint=None,
+                     expiringWithinDays=None, now=None):
+    """ the recorded certificates (dictionaries) matching every given
+        criterion, soonest expiry first
+    """
+
+    where = []
+    args = []
+    if serial is not None:
+        where.append('serial = ?')
+        args.append(normalizeSerial(serial))
+    if hostname is not None:
+        where.append('hostname = ?')
+        args.append(hostname)
+    if subject is not None:
+        where.append('subject = ?')
+        args.append(subject)
+    if fingerprint is not None:
+        where.append('fingerprint = ?')
+        args.append(normalizeFingerprint(fingerprint))
+    if expiringWithinDays is not None:
+        now = now or datetime.datetime.utcnow()
+        where.append('notAfter <= ?')
+        args.append((now + datetime.timedelta(days=expiringWithinDays)).strftime(TIME_FORMAT))
+
+    query = "SELECT %s FROM certificates" % ', '.join(_COLUMNS)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY notAfter, serial"
+
+    import sqlite3
+    db = _connect(directory)
+    try:
+        return [dict(zip(_COLUMNS, row)) for row in db.execute(query, args)]
+    except sqlite3.Error as e:
+        raise LedgerException("unable to read the issuance ledger: %s" % e)
+    finally:
+        db.close()
+
+
+def _onelineName(rfc2253):
+    """ /C=US/ST=.../CN=... (openssl's index.txt) of an RFC 2253 name """
+
+    rdns = re.split(r'(?<!\\),', rfc2253)
+    return ''.join('/' + re.sub(r'\\(.)', r'\1', rdn) for rdn in reversed(rdns))
+
+
+def _indexTime(when):
+    # UTCTime until 2049, as openssl writes it
+    if when.year < 2050:
+        return when.strftime('%y%m%d%H%M%SZ')
+    return when.strftime('%Y%m%d%H%M%SZ')
+
+
+def formatIndex(rows, now=None):
+    """ the rows as an openssl index.txt; self-signed (CA) certificates are
+        left out, like "openssl ca" does
+    """
+
+    now = now or datetime.datetime.utcnow()
+    lines = []
+    for row in rows:
+        if row['issuer'] == row['subject']:
+            continue
+        notAfter = datetime.datetime.strptime(row['notAfter'], TIME_FORMAT)
+        serial = row['serial']
+        if len(serial) % 2:
+            serial = '0' + serial
+        lines.append('\t'.join(['V' if notAfter > now else 'E', _indexTime(notAfter), '',
+                                serial, 'unknown', _onelineName(row['subject'])]))
+    return ''.join(line + '\n' for line in lines)
+
+
+def formatTable(rows):
+    """ the rows as a text table """
+
+    header = ('NOT AFTER', 'KIND', 'HOST', 'SERIAL', 'SUBJECT')
+    lines = [(r['notAfter'], r['kind'], r['hostname'] or '-', r['serial'], r['subject'])
+             for r in rows]
+    widths = [max(len(line[i]) for line in [header] + lines) for i in range(len(header) - 1)]
+    return '\n'.join('  '.join([v.ljust(w) for v, w in zip(line, widths)] + [line[-1]])
+                     for line in [header] + lines)
+
+
+def formatJson(rows):
+    return json.dumps(rows, indent=2, sort_keys=True)
@@ -18,6 +18,7 @@
 # $Id$
 
 from __future__ import print_function
+import math
 import os
 import sys
 import shutil
@@ -79,6 +80,49 @@ def yearsTil18Jan2038():
     return secs2years(secsTil18Jan2038())
 
 
+def _cgroupCpuQuota():
+    """ CPU quota (in CPUs, possibly fractional) imposed by the cgroup we run
+        in, None if unlimited or unknown.
+    """
+
+    # cgroup v2
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as fo:
+            quota, period = fo.read().split()[:2]
+        if quota != 'max' and int(period) > 0:
+            return float(quota) / int(period)
+        return None
+    except (IOError, OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as fo:
+            quota = int(fo.read().strip())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as fo:
+            period = int(fo.read().strip())
+        if quota > 0 and period > 0:
+            return float(quota) / period
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def getJobCount():
+    """ number of parallel jobs worth running: the CPUs we may be scheduled
+        on, capped by the cgroup CPU quota (containers).
+    """
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroupCpuQuota()
+    if quota:
+        cpus = min(cpus, max(1, int(math.ceil(quota))))
+    return max(1, cpus)
+
+
 def gendir(directory):
     "makedirs, but only if it doesn't exist first"
     if not os.path.exists(directory):
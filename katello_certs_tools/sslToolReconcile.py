@@ -0,0 +1,222 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool desired state check (--gen-server --reconcile)
+#
+# Compares what a --gen-server run would generate for a host (the settings)
+# with the key set already in BUILD_DIR/MACHINE_NAME, in-process with the
+# DER reader of sslToolDer, stage by stage:
+#
+#   key       an unencrypted key of the --key-type/--key-size/--key-primes
+#             profile
+#   cert-req  of the key's public key, with the distinguished name and
+#             cnames asked for
+#   cert      of the request's public key, with the subject, cnames and
+#             --purpose asked for, not expiring within --expiring-within days
+#             and signed by the current CA
+#
+# Two things are left to the --crypto-backend: the public key of an Ed25519
+# private key, which only holds its seed, and the signature of the
+# certificate. Once the issuer name and key identifier match, the backend
+# verifies it with the CA's key (openssl verify, for the openssl backend), so
+# a CA re-created with the same name is noticed even where a key identifier
+# is missing.
+#
+# A stage is stale when its file does not match or the stage it is made from
+# is stale.
+#
+# $Id$
+
+import datetime
+import os
+
+from katello_certs_tools.sslToolBackend import DN_KEYS, POLICY_KEYS, getBackend
+from katello_certs_tools.sslToolConfig import keyProfile, keyProfileName
+from katello_certs_tools.sslToolDer import readDer, parseCertificate, parseCertReq, \
+        privateKeyInfo, privateKeyPublicKey, certKeyIds, certPublicKey, formatName, \
+        KEY_TYPE_OPTIONS, TIME_FORMAT
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+from katello_certs_tools.sslToolTrace import traced
+
+# in the order they are generated
+STAGES = ('key', 'cert-req', 'cert')
+
+
+def _keyName(keyType, keySize, primes=None):
+    return keyProfileName((KEY_TYPE_OPTIONS.get(keyType, keyType), keySize or 0, primes or 2))
+
+
+def desiredNames(d):
+    """ (request subject, certificate subject, subjectAltNames) of the key
+        set --gen-server generates for d; the subjects as RFC 2253 strings
+        (see sslToolDer.formatName)
+    """
+
+    attrs = [(key, (d.get(opt) or '').strip()) for key, opt in DN_KEYS]
+    attrs = [(key, value) for key, value in attrs if value]
+    reqSubject = formatName([[attr] for attr in attrs])
+    certSubject = formatName([[attr] for key in POLICY_KEYS for attr in attrs if attr[0] == key])
+
+    # as gen_req_alt_names() writes them
+    names = [d['--set-common-name'].strip()] + list(d.get('--set-cname') or [])
+    return reqSubject, certSubject, ['DNS:' + name for name in names]
+
+
+def _read(path, parse, label='CERTIFICATE'):
+    """ (parsed, None) of a PEM file, (None, why not) """
+
+    if not os.path.exists(path):
+        return None, '%s is missing' % os.path.basename(path)
+    try:
+        return parse(readDer(path, label)), None
+    except (IOError, OSError, ValueError) as e:
+        return None, '%s is unreadable: %s' % (os.path.basename(path), e)
+
+
+def _sansDiffer(have, want):
+    return sorted(set(have)) != sorted(set(want))
+
+
+def _checkKey(key, profile):
+    info, why = _read(key, privateKeyInfo, 'PRIVATE KEY')
+    if info is None:
+        return False, why
+    have, want = _keyName(*info), keyProfileName(profile)
+    if have != want:
+        return False, 'the key is %s, not %s' % (have, want)
+    return True, '%s key as asked' % want
+
+
+def _keyPublicKey(key, backend):
+    """ (the DER SubjectPublicKeyInfo of the private key file key, None),
+        (None, why not)
+    """
+
+    publicKey, why = _read(key, privateKeyPublicKey, 'PRIVATE KEY')
+    if publicKey is None and why is None:
+        # not in the key, the backend derives it
+        try:
+            publicKey = backend.getPublicKey(key)
+        except (KatelloSslToolException, IOError, OSError, TypeError, ValueError) as e:
+            why = '%s is unreadable: %s' % (os.path.basename(key), e)
+    return publicKey, why
+
+
+def _checkCertReq(key, req, desired, backend):
+    reqSubject, _certSubject, sans = desired
+    info, why = _read(req, parseCertReq, 'CERTIFICATE REQUEST')
+    if info is None:
+        return None, why
+    publicKey, why = _keyPublicKey(key, backend)
+    if publicKey is None:
+        return info, why
+    if info['publicKey'] != publicKey:
+        return info, 'the request is not of the key'
+    if info['subject'] != reqSubject:
+        return info, 'the request subject is %s, not %s' % (info['subject'], reqSubject)
+    if _sansDiffer(info['sans'], sans):
+        return info, 'the request names are %s, not %s' % (', '.join(info['sans']), ', '.join(sans))
+    return info, None
+
+
+def _checkCert(cert, caCert, reqInfo, desired, purpose, days, now, backend):
+    _reqSubject, certSubject, sans = desired
+    der, why = _read(cert, lambda der: der)
+    if der is None:
+        return False, why
+    try:
+        info = parseCertificate(der)
+        publicKey = certPublicKey(der)
+        authorityKeyId = certKeyIds(der)[1]
+    except ValueError as e:
+        return False, '%s is unreadable: %s' % (os.path.basename(cert), e)
+
+    if publicKey != reqInfo['publicKey']:
+        return False, 'the certificate is not of the request\'s key'
+    if info['subject'] != certSubject:
+        return False, 'the certificate subject is %s, not %s' % (info['subject'], certSubject)
+    if _sansDiffer(info['sans'], sans):
+        return False, 'the certificate names are %s, not %s' % (', '.join(info['sans']), ', '.join(sans))
+    if info['kind'] != purpose:
+        return False, 'a %s certificate, not a %s one' % (info['kind'], purpose)
+
+    caDer, why = _read(caCert, lambda der: der)
+    if caDer is None:
+        return False, why
+    try:
+        ca = parseCertificate(caDer)
+        caKeyId = certKeyIds(caDer)[0]
+    except ValueError as e:
+        return False, '%s is unreadable: %s' % (os.path.basename(caCert), e)
+    if info['issuer'] != ca['subject'] or \
+            (authorityKeyId and caKeyId and authorityKeyId != caKeyId):
+        return False, 'the certificate is not signed by the current CA'
+
+    limit = (now + datetime.timedelta(days=days)).strftime(TIME_FORMAT)
+    if info['notAfter'] <= limit:
+        return False, 'the certificate expires %s, within %s days' % (info['notAfter'], days)
+    if backend.verifyCert(caCert, cert)[0]:
+        return False, 'the certificate is not signed by the current CA'
+    return True, 'subject, names and purpose as asked, signed by the current CA, expires %s' \
+        % info['notAfter']
+
+
+@traced
+def checkServer(d, days, now=None):
+    """ [(stage, staleYN, why), ...] of the server's SSL key set, in STAGES
+        order: does it already hold what d asks for, with more than days
+        of validity left?
+    """
+
+    now = now or datetime.datetime.utcnow()
+    hostDir = os.path.join(d['--dir'], d['--set-hostname'])
+    key, req, cert = [os.path.join(hostDir, os.path.basename(d[opt]))
+                      for opt in ('--server-key', '--server-cert-req', '--server-cert')]
+    caCert = os.path.join(d['--dir'], os.path.basename(d['--ca-cert']))
+    desired = desiredNames(d)
+
+    keyOk, why = _checkKey(key, keyProfile(d))
+    plan = [('key', not keyOk, why)]
+
+    backend = getBackend(d.get('--crypto-backend'))
+    reqInfo = None
+    if not keyOk:
+        plan.append(('cert-req', True, 'the key is regenerated'))
+    else:
+        reqInfo, why = _checkCertReq(key, req, desired, backend)
+        plan.append(('cert-req', why is not None, why or 'of the key, subject and names as asked'))
+
+    if plan[-1][1]:
+        plan.append(('cert', True, 'the request is regenerated'))
+    else:
+        certOk, why = _checkCert(cert, caCert, reqInfo, desired, d['--purpose'], days, now,
+                                 backend)
+        plan.append(('cert', not certOk, why))
+    return plan
+
+
+def tarUpToDate(d, version):
+    """ is the --tar archive of version (or else the newest one) there? """
+
+    # deferred, only --tar runs need tarfile
+    from katello_certs_tools.sslToolTar import tarName, latestTarVersion
+
+    hostDir = os.path.join(d['--dir'], d['--set-hostname'])
+    name = os.path.basename(d['--server-tar'])
+    version = version or latestTarVersion(hostDir, name)
+    if version is None:
+        return False
+    return os.path.exists(os.path.join(hostDir, tarName(name, version[0], version[1],
+                                                        d['--tar-compression'])))
@@ -0,0 +1,327 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool native noarch RPM writer
+#
+# Writes the same kind of package katello-certs-gen-rpm builds (a handful of
+# files plus an optional %postun scriptlet) directly: lead, signature header,
+# immutable main header and a gzip compressed cpio (newc) payload. Neither
+# rpmbuild nor a temporary build tree is needed, and no src.rpm is produced.
+#
+# $Id$
+
+import gzip
+import hashlib
+import io
+import os
+import socket
+import stat
+import struct
+import tempfile
+import time
+
+from katello_certs_tools.sslToolTrace import traced
+
+# header data types
+_INT16 = 3
+_INT32 = 4
+_STRING = 6
+_BIN = 7
+_STRING_ARRAY = 8
+_I18NSTRING = 9
+
+_ALIGNMENT = {_INT16: 2, _INT32: 4}
+
+# region tags
+RPMTAG_HEADERSIGNATURES = 62
+RPMTAG_HEADERIMMUTABLE = 63
+
+# signature header tags
+RPMSIGTAG_SHA1 = 269
+RPMSIGTAG_SHA256 = 273
+RPMSIGTAG_SIZE = 1000
+RPMSIGTAG_MD5 = 1004
+RPMSIGTAG_PAYLOADSIZE = 1007
+
+# main header tags
+RPMTAG_HEADERI18NTABLE = 100
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_SUMMARY = 1004
+RPMTAG_DESCRIPTION = 1005
+RPMTAG_BUILDTIME = 1006
+RPMTAG_BUILDHOST = 1007
+RPMTAG_SIZE = 1009
+RPMTAG_VENDOR = 1011
+RPMTAG_LICENSE = 1014
+RPMTAG_PACKAGER = 1015
+RPMTAG_GROUP = 1016
+RPMTAG_OS = 1021
+RPMTAG_ARCH = 1022
+RPMTAG_POSTUN = 1026
+RPMTAG_FILESIZES = 1028
+RPMTAG_FILEMODES = 1030
+RPMTAG_FILERDEVS = 1033
+RPMTAG_FILEMTIMES = 1034
+RPMTAG_FILEDIGESTS = 1035
+RPMTAG_FILELINKTOS = 1036
+RPMTAG_FILEFLAGS = 1037
+RPMTAG_FILEUSERNAME = 1039
+RPMTAG_FILEGROUPNAME = 1040
+RPMTAG_SOURCERPM = 1044
+RPMTAG_FILEVERIFYFLAGS = 1045
+RPMTAG_PROVIDENAME = 1047
+RPMTAG_REQUIREFLAGS = 1048
+RPMTAG_REQUIRENAME = 1049
+RPMTAG_REQUIREVERSION = 1050
+RPMTAG_POSTUNPROG = 1088
+RPMTAG_FILEDEVICES = 1095
+RPMTAG_FILEINODES = 1096
+RPMTAG_FILELANGS = 1097
+RPMTAG_PROVIDEFLAGS = 1112
+RPMTAG_PROVIDEVERSION = 1113
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_BASENAMES = 1117
+RPMTAG_DIRNAMES = 1118
+RPMTAG_PAYLOADFORMAT = 1124
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+RPMTAG_PAYLOADFLAGS = 1126
+RPMTAG_FILEDIGESTALGO = 5011
+RPMTAG_PAYLOADDIGEST = 5092
+RPMTAG_PAYLOADDIGESTALGO = 5093
+
+# dependency flags
+RPMSENSE_LESS = 1 << 1
+RPMSENSE_EQUAL = 1 << 3
+RPMSENSE_INTERP = 1 << 8
+RPMSENSE_SCRIPT_POSTUN = 1 << 12
+RPMSENSE_RPMLIB = 1 << 24
+
+PGPHASHALGO_SHA256 = 8
+RPMVERIFY_ALL = 0xffffffff
+
+_LEAD_MAGIC = b'\xed\xab\xee\xdb'
+_HEADER_MAGIC = b'\x8e\xad\xe8\x01\x00\x00\x00\x00'
+_RPMSIGTYPE_HEADERSIG = 5
+
+_RPMLIB_REQUIRES = [
+    ('rpmlib(CompressedFileNames)', '3.0.4-1'),
+    ('rpmlib(FileDigests)', '4.6.0-1'),
+    ('rpmlib(PayloadFilesHavePrefix)', '4.0-1'),
+    ]
+
+
+def parseFileSpec(spec):
+    """ split a katello-certs-gen-rpm style file spec,
+        <dest-path>[:mode[,user[,group]]]=<source-path>, into
+        (dest, mode, user, group, source).
+    """
+
+    dstmod, src = spec.split('=', 1)
+    dst, _, mod = dstmod.partition(':')
+    m, u, g = (mod.split(',') + ['', '', ''])[:3]
+    return dst, int(m or '0644', 8), u or 'root', g or 'root', src
+
+
+class _Header:
+    """ an rpm header structure: index entries plus a data store, exported as
+        a single immutable region.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, tag, tagType, value):
+        if tagType == _STRING:
+            data, count = value.encode('utf-8') + b'\0', 1
+        elif tagType in (_STRING_ARRAY, _I18NSTRING):
+            data = b''.join(v.encode('utf-8') + b'\0' for v in value)
+            count = len(value)
+        elif tagType == _BIN:
+            data, count = value, len(value)
+        elif tagType == _INT32:
+            data, count = struct.pack('>%dI' % len(value), *value), len(value)
+        elif tagType == _INT16:
+            data, count = struct.pack('>%dH' % len(value), *value), len(value)
+        else:
+            raise ValueError("unsupported header data type %d" % tagType)
+        self.entries[tag] = (tagType, data, count)
+
+    def export(self, regionTag):
+        index = []
+        store = b''
+        for tag in sorted(self.entries):
+            tagType, data, count = self.entries[tag]
+            align = _ALIGNMENT.get(tagType, 1)
+            store += b'\0' * ((align - len(store) % align) % align)
+            index.append(struct.pack('>iiii', tag, tagType, len(store), count))
+            store += data
+
+        # the region trailer closes the data store; its negative offset is
+        # the size of the index covered by the region (all of it)
+        nindex = len(index) + 1
+        region = struct.pack('>iiii', regionTag, _BIN, len(store), 16)
+        store += struct.pack('>iiii', regionTag, _BIN, -nindex * 16, 16)
+        return _HEADER_MAGIC + struct.pack('>ii', nindex, len(store)) \
+            + region + b''.join(index) + store
+
+
+def _cpioEntry(name, mode, mtime, data, ino):
+    """ one cpio "newc" archive member (header, name and data, all padded) """
+
+    name = name.encode('utf-8') + b'\0'
+    header = b'070701' + b''.join(b'%08X' % v for v in (
+        ino, mode, 0, 0, 1, mtime, len(data), 0, 0, 0, 0, len(name), 0))
+    entry = header + name
+    entry += b'\0' * ((4 - len(entry) % 4) % 4)
+    entry += data
+    entry += b'\0' * ((4 - len(entry) % 4) % 4)
+    return entry
+
+
+def _integrityDigest(name, data):
+    """ hashlib.new(name, data) for the MD5 and SHA1 integrity tags of the
+        signature header. These are checksums rpm verifies, not a security
+        check: on a FIPS enabled host MD5 (and SHA1 with some policies)
+        raises ValueError unless asked for with usedforsecurity=False, a
+        keyword python only knows from 3.9 (or as backported by RHEL).
+    """
+
+    try:
+        return hashlib.new(name, data, usedforsecurity=False)
+    except TypeError:
+        return hashlib.new(name, data)
+
+
+def _lead(nevr):
+    return struct.pack('>4sBBhh66shh16s', _LEAD_MAGIC, 3, 0, 0, 0,
+                       nevr.encode('utf-8')[:65], 1, _RPMSIGTYPE_HEADERSIG, b'')
+
+
+@traced
+def writeRpm(directory, name, version, release, fileSpecs, summary,
+             description='', group='Applications/System', packager=None,
+             vendor=None, postun=None):
+    """ write name-version-release.noarch.rpm into directory holding the files
+        described by fileSpecs (see parseFileSpec) and an optional %postun
+        scriptlet. Returns the filename of the package.
+    """
+
+    files = []
+    for spec in fileSpecs:
+        dst, mode, user, group_, src = parseFileSpec(spec)
+        with open(src, 'rb') as fo:
+            data = fo.read()
+        files.append((dst, stat.S_IFREG | mode, user, group_, data,
+                      int(os.stat(src).st_mtime)))
+    # rpm looks files up with a binary search over the sorted paths
+    files.sort()
+
+    dirnames = []
+    archive = b''
+    for i, (dst, mode, _, _, data, mtime) in enumerate(files):
+        dirname = os.path.dirname(dst).rstrip('/') + '/'
+        if dirname not in dirnames:
+            dirnames.append(dirname)
+        archive += _cpioEntry('.' + dst, mode, mtime, data, i + 1)
+    archive += _cpioEntry('TRAILER!!!', 0, 0, b'', 0)
+    payload = io.BytesIO()
+    with gzip.GzipFile(fileobj=payload, mode='wb', compresslevel=9, mtime=0) as fo:
+        fo.write(archive)
+    payload = payload.getvalue()
+
+    nevr = '%s-%s-%s' % (name, version, release)
+    h = _Header()
+    h.add(RPMTAG_HEADERI18NTABLE, _STRING_ARRAY, ['C'])
+    h.add(RPMTAG_NAME, _STRING, name)
+    h.add(RPMTAG_VERSION, _STRING, version)
+    h.add(RPMTAG_RELEASE, _STRING, release)
+    h.add(RPMTAG_SUMMARY, _I18NSTRING, [summary])
+    h.add(RPMTAG_DESCRIPTION, _I18NSTRING, [description.strip() or summary])
+    h.add(RPMTAG_BUILDTIME, _INT32, [int(time.time())])
+    h.add(RPMTAG_BUILDHOST, _STRING, socket.gethostname())
+    h.add(RPMTAG_SIZE, _INT32, [sum(len(f[4]) for f in files)])
+    if vendor:
+        h.add(RPMTAG_VENDOR, _STRING, vendor)
+    h.add(RPMTAG_LICENSE, _STRING, 'GPL')
+    if packager:
+        h.add(RPMTAG_PACKAGER, _STRING, packager)
+    h.add(RPMTAG_GROUP, _I18NSTRING, [group])
+    h.add(RPMTAG_OS, _STRING, 'linux')
+    h.add(RPMTAG_ARCH, _STRING, 'noarch')
+    h.add(RPMTAG_SOURCERPM, _STRING, nevr + '.src.rpm')
+
+    h.add(RPMTAG_FILESIZES, _INT32, [len(f[4]) for f in files])
+    h.add(RPMTAG_FILEMODES, _INT16, [f[1] for f in files])
+    h.add(RPMTAG_FILERDEVS, _INT16, [0] * len(files))
+    h.add(RPMTAG_FILEMTIMES, _INT32, [f[5] for f in files])
+    h.add(RPMTAG_FILEDIGESTS, _STRING_ARRAY, [hashlib.sha256(f[4]).hexdigest() for f in files])
+    h.add(RPMTAG_FILELINKTOS, _STRING_ARRAY, [''] * len(files))
+    h.add(RPMTAG_FILEFLAGS, _INT32, [0] * len(files))
+    h.add(RPMTAG_FILEUSERNAME, _STRING_ARRAY, [f[2] for f in files])
+    h.add(RPMTAG_FILEGROUPNAME, _STRING_ARRAY, [f[3] for f in files])
+    h.add(RPMTAG_FILEVERIFYFLAGS, _INT32, [RPMVERIFY_ALL] * len(files))
+    h.add(RPMTAG_FILEDEVICES, _INT32, [1] * len(files))
+    h.add(RPMTAG_FILEINODES, _INT32, list(range(1, len(files) + 1)))
+    h.add(RPMTAG_FILELANGS, _STRING_ARRAY, [''] * len(files))
+    h.add(RPMTAG_DIRINDEXES, _INT32,
+          [dirnames.index(os.path.dirname(f[0]).rstrip('/') + '/') for f in files])
+    h.add(RPMTAG_BASENAMES, _STRING_ARRAY, [os.path.basename(f[0]) for f in files])
+    h.add(RPMTAG_DIRNAMES, _STRING_ARRAY, dirnames)
+    h.add(RPMTAG_FILEDIGESTALGO, _INT32, [PGPHASHALGO_SHA256])
+
+    h.add(RPMTAG_PROVIDENAME, _STRING_ARRAY, [name])
+    h.add(RPMTAG_PROVIDEFLAGS, _INT32, [RPMSENSE_EQUAL])
+    h.add(RPMTAG_PROVIDEVERSION, _STRING_ARRAY, ['%s-%s' % (version, release)])
+    requires = [(n, RPMSENSE_RPMLIB | RPMSENSE_LESS | RPMSENSE_EQUAL, v)
+                for n, v in _RPMLIB_REQUIRES]
+    if postun:
+        h.add(RPMTAG_POSTUN, _STRING, postun)
+        h.add(RPMTAG_POSTUNPROG, _STRING, '/bin/sh')
+        requires.insert(0, ('/bin/sh', RPMSENSE_INTERP | RPMSENSE_SCRIPT_POSTUN, ''))
+    h.add(RPMTAG_REQUIRENAME, _STRING_ARRAY, [r[0] for r in requires])
+    h.add(RPMTAG_REQUIREFLAGS, _INT32, [r[1] for r in requires])
+    h.add(RPMTAG_REQUIREVERSION, _STRING_ARRAY, [r[2] for r in requires])
+
+    h.add(RPMTAG_PAYLOADFORMAT, _STRING, 'cpio')
+    h.add(RPMTAG_PAYLOADCOMPRESSOR, _STRING, 'gzip')
+    h.add(RPMTAG_PAYLOADFLAGS, _STRING, '9')
+    h.add(RPMTAG_PAYLOADDIGEST, _STRING_ARRAY, [hashlib.sha256(payload).hexdigest()])
+    h.add(RPMTAG_PAYLOADDIGESTALGO, _INT32, [PGPHASHALGO_SHA256])
+    header = h.export(RPMTAG_HEADERIMMUTABLE)
+
+    sig = _Header()
+    sig.add(RPMSIGTAG_SHA1, _STRING, _integrityDigest('sha1', header).hexdigest())
+    sig.add(RPMSIGTAG_SHA256, _STRING, hashlib.sha256(header).hexdigest())
+    sig.add(RPMSIGTAG_SIZE, _INT32, [len(header) + len(payload)])
+    sig.add(RPMSIGTAG_MD5, _BIN, _integrityDigest('md5', header + payload).digest())
+    sig.add(RPMSIGTAG_PAYLOADSIZE, _INT32, [len(archive)])
+    signature = sig.export(RPMTAG_HEADERSIGNATURES)
+    signature += b'\0' * ((8 - len(signature) % 8) % 8)
+
+    rpmFile = os.path.join(directory, nevr + '.noarch.rpm')
+    fd, tmpFile = tempfile.mkstemp(dir=directory, prefix='.%s-' % nevr)
+    try:
+        with os.fdopen(fd, 'wb') as fo:
+            fo.write(_lead(nevr))
+            fo.write(signature)
+            fo.write(header)
+            fo.write(payload)
+        os.rename(tmpFile, rpmFile)
+    except Exception:
+        os.unlink(tmpFile)
+        raise
+    return rpmFile
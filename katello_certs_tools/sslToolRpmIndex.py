@@ -0,0 +1,169 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool RPM version index
+#
+# Every build directory keeps katello-rpm-index.json: the version and release
+# of each *.noarch.rpm in it, keyed on the file's mtime and size. Only RPMs
+# that are new or changed since the last run have their header read; the
+# rpmdb is queried once per package name and process. The rpm module is only
+# imported when it is needed (it is slow to load).
+#
+# An entry also records the digest of what the RPM was built from (see
+# inputDigest): when the latest RPM of a package was built from the same
+# inputs, cachedRpm() hands it back instead of a rebuild bumping the release.
+#
+# $Id$
+
+import functools
+import glob
+import hashlib
+import json
+import os
+
+from katello_certs_tools.fileutils import fileDigest, statKey, readJson, writeJsonAtomic
+from katello_certs_tools.sslToolRpm import parseFileSpec
+from katello_certs_tools.sslToolTrace import traced
+
+RPM_INDEX_NAME = 'katello-rpm-index.json'
+
+# package name --> [(version, release), ...] of the installed packages
+_installed = {}
+
+
+def _hdrVersion(hdr):
+    """ (version, release) of an rpm header, as strings """
+
+    ver, rel = hdr['version'], hdr['release']
+    try:
+        return ver.decode('utf-8'), rel.decode('utf-8')
+    except AttributeError:
+        return str(ver), str(rel)
+
+
+def _indexFile(directory):
+    return os.path.join(directory, RPM_INDEX_NAME)
+
+
+@traced
+def installedVersions(package_name):
+    """ (version, release) of every installed package_name, from the rpmdb """
+
+    if package_name not in _installed:
+        import rpm
+        ts = rpm.TransactionSet()
+        _installed[package_name] = [_hdrVersion(hdr) for hdr in ts.dbMatch("name", package_name)]
+    return _installed[package_name]
+
+
+def indexRpm(filename, version, release, inputs=None):
+    """ record a just built filename in its directory's index; inputs is
+        the inputDigest() it was built from
+    """
+
+    directory = os.path.dirname(filename) or '.'
+    data = readJson(_indexFile(directory))
+    entry = {'key': statKey(filename), 'version': version, 'release': release}
+    if inputs is not None:
+        entry['inputs'] = inputs
+    data[os.path.basename(filename)] = entry
+    writeJsonAtomic(_indexFile(directory), data, bestEffortYN=1)
+
+
+def inputDigest(fileSpecs, *fields):
+    """ sha256 hexdigest of what an RPM is built from: the destination path,
+        mode, owner and content of every file spec (see parseFileSpec; not
+        the source path) and the header fields (name, description,
+        scriptlet, ...) in order. None fields count as well.
+    """
+
+    digest = hashlib.sha256()
+
+    def add(value):
+        value = json.dumps(value).encode('utf-8')
+        digest.update(b'%d:%s' % (len(value), value))
+
+    for field in fields:
+        add(field)
+    for spec in fileSpecs:
+        dst, mode, user, group, src = parseFileSpec(spec)
+        add([dst, mode, user, group, fileDigest(src)])
+    return digest.hexdigest()
+
+
+def cachedRpm(glob_prefix, version, release, inputs):
+    """ glob_prefix-version-release.noarch.rpm when the index records it as
+        built from inputs (and it was not touched since), None otherwise
+    """
+
+    filename = "%s-%s-%s.noarch.rpm" % (glob_prefix, version, release)
+    entry = readJson(_indexFile(os.path.dirname(filename) or '.')).get(os.path.basename(filename))
+    if not isinstance(entry, dict) or entry.get('inputs') != inputs:
+        return None
+    try:
+        if entry.get('key') != statKey(filename):
+            return None
+    except OSError:
+        return None
+    return filename
+
+
+@traced
+def rpmVersions(glob_prefix):
+    """ (version, release) of every glob_prefix-[0-9]*.noarch.rpm """
+
+    directory = os.path.dirname(glob_prefix) or '.'
+    data = readJson(_indexFile(directory))
+    changedYN = 0
+
+    versions = []
+    for filename in glob.glob("%s-[0-9]*.noarch.rpm" % glob_prefix):
+        name = os.path.basename(filename)
+        key = statKey(filename)
+        entry = data.get(name)
+        if not isinstance(entry, dict) or entry.get('key') != key:
+            import rpm
+            ts = rpm.TransactionSet()
+            with open(filename) as fo:
+                version, release = _hdrVersion(ts.hdrFromFdno(fo))
+            entry = data[name] = {'key': key, 'version': version, 'release': release}
+            changedYN = 1
+        versions.append((entry['version'], entry['release']))
+
+    # forget RPMs that were removed
+    for name in list(data.keys()):
+        if not os.path.exists(os.path.join(directory, name)):
+            del data[name]
+            changedYN = 1
+
+    if changedYN:
+        writeJsonAtomic(_indexFile(directory), data, bestEffortYN=1)
+    return versions
+
+
+def _versionCompare(a, b):
+    import rpm
+    return rpm.labelCompare((None, a[0], a[1]), (None, b[0], b[1]))
+
+
+def maxRpmVersion(package_name, glob_prefix):
+    """ the highest (version, release) of package_name, installed or built
+        in the directory of glob_prefix. None if there is none.
+    """
+
+    versions = installedVersions(package_name) + rpmVersions(glob_prefix)
+    if not versions:
+        return None
+    return max(versions, key=functools.cmp_to_key(_versionCompare))
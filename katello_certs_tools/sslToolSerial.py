@@ -0,0 +1,83 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool serial number allocation
+#
+# BUILD_DIR/serial holds the next free serial number (hex, as "openssl ca"
+# writes it). Reserving serials locks BUILD_DIR/serial.lock only for the
+# read-bump-write of that file, so concurrent invocations on one CA never
+# hand out the same serial. With --random-serial no shared state is used at
+# all: every certificate gets a random 128 bit serial.
+#
+# For our purposes server certs may not share a serial number with the CA
+# certificate, so the sequence always continues past the CA's serial.
+#
+# $Id$
+
+import fcntl
+import os
+
+from katello_certs_tools.sslToolLib import fixSerial
+from katello_certs_tools.sslToolTrace import traced
+
+SERIAL_NAME = 'serial'
+SERIAL_LOCK_NAME = 'serial.lock'
+
+
+def _readSerial(serialFilename):
+    try:
+        with open(serialFilename) as fo:
+            serial = fo.read().strip()
+    except IOError:
+        return 1
+    if not serial:
+        return 1
+    return int('0x'+serial, 16)
+
+
+def reserveSerials(directory, caSerial, count=1):
+    """ reserve count consecutive serial numbers from directory's serial file
+        (all above caSerial). Returns them as a list of ints.
+    """
+
+    serialFilename = os.path.join(directory, SERIAL_NAME)
+    with open(os.path.join(directory, SERIAL_LOCK_NAME), 'a') as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+
+        serial = max(_readSerial(serialFilename), caSerial + 1)
+
+        with open(serialFilename + '.tmp', 'w') as fo:
+            fo.write(fixSerial(hex(serial + count)) + '\n')
+        os.chmod(serialFilename + '.tmp', 0o600)
+        os.rename(serialFilename + '.tmp', serialFilename)
+
+    return list(range(serial, serial + count))
+
+
+def randomSerial():
+    """ a random, positive, non-zero 128 bit serial number """
+
+    return int.from_bytes(os.urandom(16), 'big') or 1
+
+
+@traced
+def allocateSerials(d, caSerial, count=1):
+    """ count serial numbers for certificates signed with the CA in d['--dir'],
+        random ones with --random-serial.
+    """
+
+    if d.get('--random-serial'):
+        return [randomSerial() for _ in range(count)]
+    return reserveSerials(d['--dir'], caSerial, count)
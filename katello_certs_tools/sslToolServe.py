@@ -0,0 +1,476 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool issuance service (--serve)
+#
+# A long running process listening on a unix socket. Clients send one JSON
+# object per line and get one JSON object per line back, in the order their
+# requests finish:
+#
+#   --> {"id": 1, "argv": ["--gen-server", "--set-hostname", "a.example.com"],
+#        "timeout": 60}
+#   <-- {"id": 1, "code": 0, "output": "...", "seconds": 1.2}
+#   <-- {"id": 2, "code": 22, "error": "GenServerCertException",
+#        "message": "...", "output": "...", "seconds": 0.4}
+#
+# "code" is the exit code katello-ssl-tool would have exited with for the
+# same commandline (see main()), or one of the errno* codes below.
+#
+# Every request runs in its own forked worker process (the key set code
+# changes directories and prints), at most --jobs at a time. Up to --backlog
+# requests wait for a worker; while the queue is full the service stops
+# reading from its clients, so they block in their writes instead of piling
+# up requests in memory. A worker running past its timeout is killed along
+# with anything it started.
+#
+# $Id$
+
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from collections import deque
+
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+
+errnoRequestTimeout = 40
+errnoBadRequest = 41
+errnoWorkerFailed = 42
+errnoShuttingDown = 43
+
+# largest request line accepted, in bytes
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class ServeException(KatelloSslToolException):
+    "the issuance service failed to start or a request could not be sent"
+
+
+def _encode(obj):
+    return (json.dumps(obj, sort_keys=True) + '\n').encode('utf-8')
+
+
+def _badRequest(message):
+    return {'code': errnoBadRequest, 'error': 'BadRequest', 'message': message}
+
+
+class _Connection:
+    """ a client connection and its unparsed input / unsent output """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b''
+        self.outbuf = b''
+        self.jobs = 0       # requests of this client queued or running
+        self.eof = 0        # client is done sending
+        self.closed = 0
+        self.events = 0     # currently registered selector events
+
+
+class _Job:
+    """ one request, queued or running in a worker """
+
+    def __init__(self, conn, requestId, argv, timeout):
+        self.conn = conn
+        self.id = requestId
+        self.argv = argv
+        self.timeout = timeout
+        self.pid = None
+        self.fd = None          # read end of the worker's result pipe
+        self.output = None      # the worker's stdout/stderr
+        self.result = b''
+        self.started = None
+
+
+class IssuanceServer:
+    """ run handler(argv) for the requests of a unix socket
+
+        handler is called in a forked worker process and returns the reply
+        fields: {'code': exit code[, 'error': name, 'message': text]}.
+    """
+
+    def __init__(self, socketPath, handler, jobs=1, timeout=300, backlog=32, verbosity=0):
+        self.socketPath = socketPath
+        self.handler = handler
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.backlog = max(1, backlog)
+        self.verbosity = verbosity
+
+        self._selector = None
+        self._listener = None
+        self._connections = []
+        self._queue = deque()
+        self._running = {}      # pid --> _Job
+        self._stopping = 0
+
+    def log(self, msg):
+        if self.verbosity >= 0:
+            print(msg)
+            sys.stdout.flush()
+
+    #
+    # socket and connections
+    #
+
+    def _listen(self):
+        if os.path.exists(self.socketPath):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socketPath)
+            except (IOError, OSError):
+                # stale socket of a service that is gone
+                os.unlink(self.socketPath)
+            else:
+                raise ServeException("%s is already being served" % self.socketPath)
+            finally:
+                probe.close()
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # whoever can connect can have certificates signed by the CA
+        umask = os.umask(0o177)
+        try:
+            self._listener.bind(self.socketPath)
+        except (IOError, OSError) as e:
+            raise ServeException("unable to listen on %s: %s" % (self.socketPath, e))
+        finally:
+            os.umask(umask)
+        self._listener.listen(socket.SOMAXCONN)
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ, self._accept)
+
+    def _accept(self, sock, mask):
+        try:
+            client, _addr = sock.accept()
+        except (IOError, OSError):
+            return
+        client.setblocking(False)
+        conn = _Connection(client)
+        self._connections.append(conn)
+        self._watch(conn)
+
+    def _watch(self, conn):
+        """ (re)register conn for the events it currently needs """
+
+        events = 0
+        if not (conn.eof or self._stopping) and len(self._queue) < self.backlog:
+            events |= selectors.EVENT_READ
+        if conn.outbuf:
+            events |= selectors.EVENT_WRITE
+        if events == conn.events:
+            return
+        if not conn.events:
+            self._selector.register(conn.sock, events, self._io(conn))
+        elif not events:
+            self._selector.unregister(conn.sock)
+        else:
+            self._selector.modify(conn.sock, events, self._io(conn))
+        conn.events = events
+
+    def _io(self, conn):
+        def callback(sock, mask):
+            if mask & selectors.EVENT_READ:
+                self._read(conn)
+            if mask & selectors.EVENT_WRITE and not conn.closed:
+                self._write(conn)
+        return callback
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (IOError, OSError):
+            data = b''
+        if not data:
+            conn.eof = 1
+        conn.inbuf += data
+        self._parse(conn)
+
+    def _parse(self, conn):
+        """ queue the complete request lines of conn, as far as there is room """
+
+        # (a client may leave the newline off its last request)
+        while len(self._queue) < self.backlog and (b'\n' in conn.inbuf or conn.eof and conn.inbuf):
+            line, _nl, conn.inbuf = conn.inbuf.partition(b'\n')
+            if line.strip():
+                self._request(conn, line)
+        if b'\n' not in conn.inbuf and len(conn.inbuf) > MAX_REQUEST_SIZE:
+            conn.inbuf = b''
+            conn.eof = 1
+            self._reply(conn, None, _badRequest("request exceeds %d bytes" % MAX_REQUEST_SIZE))
+        self._closeIfDone(conn)
+
+    def _write(self, conn):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except (IOError, OSError):
+            # client went away, nobody left to read the replies
+            conn.outbuf = b''
+            conn.eof = 1
+            self._close(conn)
+            return
+        conn.outbuf = conn.outbuf[sent:]
+        self._closeIfDone(conn)
+
+    def _reply(self, conn, requestId, fields):
+        if conn.closed:
+            return
+        fields['id'] = requestId
+        conn.outbuf += _encode(fields)
+        self._write(conn)
+
+    def _closeIfDone(self, conn):
+        if conn.eof and not conn.jobs and not conn.outbuf and not conn.closed:
+            self._close(conn)
+
+    def _close(self, conn):
+        if conn.events:
+            self._selector.unregister(conn.sock)
+            conn.events = 0
+        conn.sock.close()
+        conn.closed = 1
+        self._connections.remove(conn)
+
+    #
+    # requests and workers
+    #
+
+    def _request(self, conn, line):
+        try:
+            request = json.loads(line.decode('utf-8'))
+            requestId = request.get('id')
+            argv = request['argv']
+            timeout = float(request.get('timeout') or self.timeout)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._reply(conn, None, _badRequest("a request is a JSON object with an 'argv' list"))
+            return
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            self._reply(conn, requestId, _badRequest("'argv' must be a list of strings"))
+            return
+
+        conn.jobs += 1
+        self._queue.append(_Job(conn, requestId, argv, min(timeout, self.timeout)))
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.jobs:
+            self._start(self._queue.popleft())
+
+    def _start(self, job):
+        job.output = tempfile.TemporaryFile()
+        rfd, wfd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            self._work(job, rfd, wfd)
+
+        # the worker leads its own process group (see _expire)
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        os.close(wfd)
+        os.set_blocking(rfd, False)
+        job.pid, job.fd, job.started = pid, rfd, time.time()
+        self._running[pid] = job
+        self._selector.register(rfd, selectors.EVENT_READ, self._result(job))
+
+    def _work(self, job, rfd, wfd):
+        """ the worker process: run the handler, write its reply to wfd """
+
+        status = 1
+        try:
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.close(rfd)
+            self._listener.close()
+            for conn in self._connections:
+                conn.sock.close()
+
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(job.output.fileno(), 1)
+            os.dup2(job.output.fileno(), 2)
+
+            try:
+                fields = self.handler(job.argv)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            data = json.dumps(fields).encode('utf-8')
+            while data:
+                data = data[os.write(wfd, data):]
+            status = 0
+        except BaseException:  # noqa
+            traceback.print_exc()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+    def _result(self, job):
+        def callback(fd, mask):
+            data = os.read(fd, 65536)
+            if data:
+                job.result += data
+                return
+            self._reap(job)
+            try:
+                fields = json.loads(job.result.decode('utf-8'))
+            except ValueError:
+                fields = {'code': errnoWorkerFailed, 'error': 'WorkerFailed',
+                          'message': 'the worker process died, see the output'}
+            self._finish(job, fields)
+        return callback
+
+    def _reap(self, job, sig=None):
+        if sig is not None:
+            try:
+                os.killpg(job.pid, sig)
+            except OSError:
+                pass
+        os.waitpid(job.pid, 0)
+        self._selector.unregister(job.fd)
+        os.close(job.fd)
+        del self._running[job.pid]
+
+    def _finish(self, job, fields):
+        job.output.seek(0)
+        fields['output'] = job.output.read().decode('utf-8', 'replace')
+        job.output.close()
+        fields['seconds'] = round(time.time() - job.started, 3)
+
+        self.log("request %s: %s --> %s (%.2f seconds)"
+                 % (job.id, ' '.join(job.argv), fields['code'], fields['seconds']))
+        job.conn.jobs -= 1
+        self._reply(job.conn, job.id, fields)
+        self._closeIfDone(job.conn)
+
+    def _expire(self):
+        now = time.time()
+        for job in list(self._running.values()):
+            if now - job.started > job.timeout:
+                self._reap(job, signal.SIGKILL)
+                self._finish(job, {'code': errnoRequestTimeout, 'error': 'RequestTimeout',
+                                   'message': 'request timed out after %s seconds' % job.timeout})
+
+    def _wait(self):
+        """ seconds until the next worker times out (at most 1) """
+
+        wait = 1.0
+        for job in self._running.values():
+            wait = min(wait, job.started + job.timeout - time.time())
+        return max(wait, 0)
+
+    #
+    # main loop
+    #
+
+    def stop(self, *args):
+        """ stop accepting requests; the running ones are finished first """
+        self._stopping = 1
+
+    def serve(self):
+        """ serve requests until SIGTERM/SIGINT """
+
+        self._selector = selectors.DefaultSelector()
+        self._listen()
+        handlers = [(sig, signal.signal(sig, self.stop)) for sig in (signal.SIGTERM, signal.SIGINT)]
+        self.log("Serving %s with %d worker(s)" % (self.socketPath, self.jobs))
+        try:
+            while not (self._stopping and not self._running):
+                if self._stopping and self._listener is not None:
+                    self._shutdown()
+                for conn in list(self._connections):
+                    self._parse(conn)
+                self._dispatch()
+                for conn in list(self._connections):
+                    self._watch(conn)
+                for key, mask in self._selector.select(self._wait()):
+                    key.data(key.fileobj, mask)
+                self._expire()
+        finally:
+            for sig, handler in handlers:
+                signal.signal(sig, handler)
+            for job in list(self._running.values()):
+                self._reap(job, signal.SIGKILL)
+            if self._listener is not None:
+                self._shutdown()
+            self._selector.close()
+        self.log("Stopped serving %s" % self.socketPath)
+
+    def _shutdown(self):
+        """ stop listening, turn down whatever is still queued """
+
+        self._selector.unregister(self._listener)
+        self._listener.close()
+        self._listener = None
+        os.unlink(self.socketPath)
+        while self._queue:
+            job = self._queue.popleft()
+            job.conn.jobs -= 1
+            self._reply(job.conn, job.id, {'code': errnoShuttingDown, 'error': 'ShuttingDown',
+                                           'message': 'the service is shutting down'})
+
+
+def request(socketPath, argv, timeout=None, requestId=None):
+    """ send one request to the service at socketPath and wait for its reply
+        (the reply fields, see the top of this module).
+    """
+
+    msg = {'id': requestId, 'argv': list(argv)}
+    if timeout:
+        msg['timeout'] = timeout
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+        sock.sendall(_encode(msg))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as fo:
+            line = fo.readline()
+    except (IOError, OSError) as e:
+        raise ServeException("unable to talk to %s: %s" % (socketPath, e))
+    finally:
+        sock.close()
+
+    if not line:
+        raise ServeException("%s closed the connection without a reply" % socketPath)
+    return json.loads(line.decode('utf-8'))
+
+
+def _client(args):
+    """ python3 -m katello_certs_tools.sslToolServe SOCKET KATELLO-SSL-TOOL-ARGS...
+
+        a minimal client: prints the request's output and exits with its code.
+    """
+
+    if len(args) < 2:
+        sys.stderr.write(_client.__doc__.strip().split('\n')[0] + '\n')
+        return errnoBadRequest
+    reply = request(args[0], args[1:])
+    sys.stdout.write(reply.get('output', ''))
+    if reply.get('message'):
+        sys.stderr.write('\nERROR: %s\n' % reply['message'])
+    return reply['code']
+
+
+if __name__ == '__main__':
+    sys.exit(_client(sys.argv[1:]))
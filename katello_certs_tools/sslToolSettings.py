@@ -0,0 +1,226 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool settings of one commandline
+#
+# Settings is a read-only mapping of '--option' --> value, the same keys the
+# DEFS dictionary uses. Whatever was given on the commandline wins; every
+# other value is figured the first time it is read (and then kept): the
+# build directory is only looked at for the CA key name when --ca-key is
+# read, the openssl.cnf only parsed when a distinguished name field is.
+# derive() gives a copy with some values replaced, e.g. one per batch host.
+#
+# $Id$
+
+import os
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from katello_certs_tools.fileutils import cleanupNormPath
+from katello_certs_tools.sslToolLib import daysTil18Jan2038
+from katello_certs_tools.sslToolConfig import ConfigFile, getOption, getHostname, \
+        getStartDate_aWeekAgo, BUILD_DIR, CERT_PATH, CA_KEY_NAME, CA_CRT_NAME, \
+        CA_CRT_RPM_NAME, BASE_SERVER_RPM_NAME, BASE_SERVER_TAR_NAME, \
+        CA_OPENSSL_CNF_NAME, SERVER_OPENSSL_CNF_NAME, KEY_SIZES, DEFAULT_KEY_PROFILE, \
+        defaultDEFS
+
+
+def _optionName(key):
+    """ '--set-org-unit' --> 'set_org_unit' """
+    return key[2:].replace('-', '_')
+
+
+def _fromOption(default):
+    """ resolver: the commandline value, else default(settings) """
+
+    def resolve(s, key):
+        value = s.option(_optionName(key))
+        if value is None:
+            return default(s)
+        return value
+    return resolve
+
+
+def _basename(default):
+    """ resolver: basename of the commandline value or of default """
+
+    def resolve(s, key):
+        return os.path.basename(s.option(_optionName(key)) or default)
+    return resolve
+
+
+def _dir(s, key):
+    return cleanupNormPath(s.option('dir') or BUILD_DIR, dotYN=1)
+
+
+def _caKey(s, key):
+    if s.option('ca_key'):
+        return os.path.basename(s.option('ca_key'))
+    # the various default names for CA keys (a hierarchy)
+    for possibility in (CA_KEY_NAME, 'ca.key', 'cakey.pem'):
+        if os.path.exists(os.path.join(s['--dir'], possibility)):
+            return possibility
+    return CA_KEY_NAME
+
+
+def _caCert(s, key):
+    if s.option('ca_cert'):
+        return os.path.basename(s.option('ca_cert'))
+    # the various default names for CA keys and certs
+    return {CA_KEY_NAME: CA_CRT_NAME,
+            'ca.key': 'ca.crt',
+            'cakey.pem': 'cacert.pem'}.get(s['--ca-key'], 'ca.crt')
+
+
+def _certExpiration(s, key):
+    # nothing under 1 day or over # days til 18Jan2038
+    _maxdays = int(daysTil18Jan2038())  # already rounded
+    days = s.option('cert_expiration') or _maxdays
+    return max(1, min(days, _maxdays))
+
+
+def _keySize(s, key):
+    # the default size of the key type
+    return s.option('key_size') or KEY_SIZES.get(s['--key-type'], (None,))[0]
+
+
+def _purpose(s, key):
+    if s.option('gen_client'):
+        return 'client'
+    return 'server'
+
+
+def _distinguishing(s, key):
+    """ commandline, else the existing openssl.cnf, else the default """
+
+    value = s.option(_optionName(key))
+    if value is not None:
+        return value
+    return s.conf().get(_CONF_MAPPING[key], s.default(key))
+
+
+def _commonName(s, key):
+    value = s.option('set_common_name')
+    if value is not None:
+        return value
+    return s['--set-hostname']
+
+
+_CONF_MAPPING = {
+    '--set-country': 'C',
+    '--set-state': 'ST',
+    '--set-city': 'L',
+    '--set-org': 'O',
+    '--set-org-unit': 'OU',
+    '--set-email': 'emailAddress',
+    }
+
+_RESOLVERS = {
+    '--dir': _dir,
+    '--backup-scheme': _fromOption(lambda s: 'cascade'),
+    '--crypto-backend': _fromOption(lambda s: 'openssl'),
+    '--set-hostname': _fromOption(lambda s: getHostname()),
+
+    '--ca-key': _caKey,
+    '--ca-cert': _caCert,
+    '--ca-cert-dir': _fromOption(lambda s: CERT_PATH),
+    '--other-ca-certs': _fromOption(lambda s: None),
+    '--ca-cert-rpm': _fromOption(lambda s: CA_CRT_RPM_NAME),
+    '--cert-expiration': _certExpiration,
+    '--startdate': _fromOption(lambda s: getStartDate_aWeekAgo()),
+
+    '--server-key': _basename('server.key'),
+    '--server-cert-req': _basename('server.csr'),
+    '--server-cert': _basename('server.crt'),
+    '--server-cert-dir': _fromOption(lambda s: CERT_PATH),
+    '--server-rpm': _fromOption(lambda s: BASE_SERVER_RPM_NAME+'-'+s['--set-hostname']),
+    '--server-tar': _fromOption(lambda s: BASE_SERVER_TAR_NAME+'-'+s['--set-hostname']),
+    '--tar': _fromOption(lambda s: None),
+    '--tar-compression': _fromOption(lambda s: 'none'),
+    '--use-key-pool': _fromOption(lambda s: None),
+    '--random-serial': _fromOption(lambda s: None),
+    '--key-type': _fromOption(lambda s: DEFAULT_KEY_PROFILE[0]),
+    '--key-size': _keySize,
+    '--key-primes': _fromOption(lambda s: DEFAULT_KEY_PROFILE[2]),
+
+    '--rpm-packager': _fromOption(lambda s: None),
+    '--rpm-vendor': _fromOption(lambda s: None),
+    '--rpm-builder': _fromOption(lambda s: 'katello-certs-gen-rpm'),
+
+    '--purpose': _purpose,
+    '--set-common-name': _commonName,
+    '--set-cname': _fromOption(lambda s: None),  # this is list
+    }
+_RESOLVERS.update((key, _distinguishing) for key in _CONF_MAPPING)
+
+
+class Settings(Mapping):
+    """ the read-only, lazily figured '--option' settings of a commandline """
+
+    def __init__(self, options, caYN=0, overrides=None):
+        self._options = options
+        self.caYN = caYN
+        self._overrides = dict(overrides or {})
+        self._values = {}
+        self._conf = None
+
+    def option(self, name):
+        """ the raw commandline value of option name (e.g. 'set_org') """
+        return getOption(self._options, name)
+
+    def default(self, key):
+        """ the built-in default of key """
+        return defaultDEFS(self.caYN).get(key)
+
+    def conf(self):
+        """ the distinguished name of the existing CA/server openssl.cnf """
+
+        if self._conf is None:
+            if self.caYN:
+                filename = os.path.join(self['--dir'], CA_OPENSSL_CNF_NAME)
+            else:
+                filename = os.path.join(self['--dir'], self['--set-hostname'],
+                                        SERVER_OPENSSL_CNF_NAME)
+            self._conf = ConfigFile(filename).parse()
+        return self._conf
+
+    def __getitem__(self, key):
+        if key in self._overrides:
+            return self._overrides[key]
+        if key not in self._values:
+            if key not in _RESOLVERS:
+                raise KeyError(key)
+            self._values[key] = _RESOLVERS[key](self, key)
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(sorted(set(_RESOLVERS) | set(self._overrides)))
+
+    def __len__(self):
+        return len(set(_RESOLVERS) | set(self._overrides))
+
+    def derive(self, overrides):
+        """ a new Settings with the '--option' values of overrides replaced """
+
+        merged = dict(self._overrides)
+        merged.update(overrides)
+        return Settings(self._options, self.caYN, merged)
+
+    def asDict(self):
+        """ everything, figured, as a plain (DEFS style) dictionary """
+        return dict((key, self[key]) for key in self)
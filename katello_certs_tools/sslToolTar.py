@@ -0,0 +1,154 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool key set tar archive writer (--tar)
+#
+# Writes the files of a key set, described by the file specs the RPMs use
+# (see sslToolRpm.parseFileSpec), as name-version-release.tar, .tar.gz or
+# .tar.zst: the install paths (relative, so "tar -C / -xf" deploys them),
+# modes and owners of the RPM. The archive is streamed in a single pass,
+# each file read once and compressed on the way; gzip in-process, zstd
+# in-process where python has it (3.14) and through the zstd command
+# otherwise.
+#
+# $Id$
+
+import os
+import subprocess
+import tarfile
+import tempfile
+
+from katello_certs_tools.sslToolLib import KatelloSslToolException
+from katello_certs_tools.sslToolRpm import parseFileSpec
+from katello_certs_tools.sslToolTrace import traced, span
+
+ZSTD = 'zstd'
+
+# --tar-compression --> file name suffix
+COMPRESSIONS = {
+    'none': '.tar',
+    'gzip': '.tar.gz',
+    'zstd': '.tar.zst',
+}
+
+
+class TarException(KatelloSslToolException):
+    """ the key set archive could not be written """
+
+
+def tarName(name, version, release, compression='none'):
+    return '%s-%s-%s%s' % (name, version, release, COMPRESSIONS[compression])
+
+
+def _addFiles(tar, fileSpecs):
+    for spec in fileSpecs:
+        dst, mode, user, group, src = parseFileSpec(spec)
+        with open(src, 'rb') as fo:
+            st = os.fstat(fo.fileno())
+            info = tarfile.TarInfo(dst.lstrip('/'))
+            info.size = st.st_size
+            info.mtime = int(st.st_mtime)
+            info.mode = mode
+            info.uid = info.gid = 0
+            info.uname, info.gname = user, group
+            tar.addfile(info, fo)
+
+
+def _writeZstd(fo, fileSpecs):
+    try:
+        from compression import zstd
+    except ImportError:
+        zstd = None
+    if zstd is not None:
+        with zstd.ZstdFile(fo, 'wb') as zfo:
+            with tarfile.open(fileobj=zfo, mode='w|') as tar:
+                _addFiles(tar, fileSpecs)
+        return
+
+    with span('zstd', 'process') as s:
+        try:
+            child = subprocess.Popen([ZSTD, '-q', '-c'], stdin=subprocess.PIPE, stdout=fo,
+                                     stderr=subprocess.PIPE)
+        except OSError as e:
+            raise TarException("zstd compression needs the %s command: %s" % (ZSTD, e))
+        try:
+            with tarfile.open(fileobj=child.stdin, mode='w|') as tar:
+                _addFiles(tar, fileSpecs)
+        finally:
+            child.stdin.close()
+            err = child.stderr.read()
+            child.wait()
+        s.set(exitcode=child.returncode, stderr_bytes=len(err))
+    if child.returncode:
+        raise TarException("%s failed:\n%s" % (ZSTD, err.decode('utf-8', 'replace')))
+
+
+@traced
+def writeTar(directory, name, version, release, fileSpecs, compression='none'):
+    """ write name-version-release.tar[.gz|.zst] into directory holding the
+        files described by fileSpecs (see parseFileSpec). Returns the
+        filename of the archive, mode 0600 (it holds private keys).
+    """
+
+    if compression not in COMPRESSIONS:
+        raise TarException("unknown tar compression: %s (choose from: %s)"
+                           % (compression, ', '.join(sorted(COMPRESSIONS))))
+    tarFile = os.path.join(directory, tarName(name, version, release, compression))
+    fd, tmpFile = tempfile.mkstemp(dir=directory, prefix='.%s-' % os.path.basename(tarFile))
+    try:
+        with os.fdopen(fd, 'wb') as fo:
+            if compression == 'zstd':
+                _writeZstd(fo, fileSpecs)
+            else:
+                mode = 'w|gz' if compression == 'gzip' else 'w|'
+                with tarfile.open(fileobj=fo, mode=mode) as tar:
+                    _addFiles(tar, fileSpecs)
+        os.rename(tmpFile, tarFile)
+    except (IOError, OSError, tarfile.TarError) as e:
+        os.unlink(tmpFile)
+        raise TarException("unable to write %s: %s" % (tarFile, e))
+    except Exception:
+        os.unlink(tmpFile)
+        raise
+    return tarFile
+
+
+def latestTarVersion(directory, name):
+    """ (version, release) of the newest name-version-release.tar* in
+        directory, None if there is none
+    """
+
+    latest = None
+    prefix = name + '-'
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return None
+    for filename in filenames:
+        if not filename.startswith(prefix):
+            continue
+        for suffix in COMPRESSIONS.values():
+            if filename.endswith(suffix):
+                break
+        else:
+            continue
+        try:
+            version, release = filename[len(prefix):-len(suffix)].rsplit('-', 1)
+            key = (int(release), version)
+        except ValueError:
+            continue
+        if latest is None or key > latest[0]:
+            latest = (key, (version, release))
+    return latest and latest[1]
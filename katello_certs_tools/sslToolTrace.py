@@ -0,0 +1,186 @@
+#
+# Copyright 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+#
+# katello-ssl-tool stage timing (--trace FILE, -vv)
+#
+# Stage functions (@traced) and every child process run by fileutils record
+# a span: name, start, wall time and, for child processes, the exit code and
+# the number of bytes read from it. While tracing, spans are appended as
+# JSON lines to a spool file named by $KATELLO_SSL_TOOL_TRACE, which worker
+# processes inherit, so the spans of parallel runs end up in the same trace
+# (one track per process and thread). finishTrace() turns the spool into
+# Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev) and prints a
+# per-stage summary.
+#
+# Not tracing costs a global lookup per stage call.
+#
+# $Id$
+
+from __future__ import print_function
+
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+TRACE_ENV = 'KATELLO_SSL_TOOL_TRACE'
+
+# the spool file, None when not tracing
+_spool = os.environ.get(TRACE_ENV) or None
+_mainPid = None
+
+
+def tracing():
+    return _spool is not None
+
+
+def startTrace():
+    """ start recording spans, in this process and its children """
+
+    global _spool, _mainPid
+    fd, _spool = tempfile.mkstemp(prefix='katello-ssl-trace-', suffix='.jsonl')
+    os.close(fd)
+    _mainPid = os.getpid()
+    os.environ[TRACE_ENV] = _spool
+
+
+def _emit(event):
+    # one write() per line with O_APPEND: concurrent writers do not interleave
+    fd = os.open(_spool, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, (json.dumps(event, sort_keys=True) + '\n').encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+class span:
+    """ a span around a with block; set() adds arguments on the way """
+
+    def __init__(self, name, category='stage', **args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if _spool is None:
+            return False
+        if excType is not None:
+            self.args['error'] = excType.__name__
+        _emit({
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': int(self.ts * 1000000),
+            'dur': int((time.perf_counter() - self.start) * 1000000),
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'args': self.args,
+        })
+        return False
+
+
+def traced(func):
+    """ decorator: a span named after the function around every call """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _spool is None:
+            return func(*args, **kwargs)
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def commandName(cmd):
+    """ span name of a child process: the program and its subcommand """
+
+    if isinstance(cmd, (list, tuple)):
+        words = [str(arg) for arg in cmd[:2]]
+    else:
+        words = cmd.split()[:2]
+    if not words:
+        return 'exec'
+    words[0] = os.path.basename(words[0])
+    if len(words) > 1 and words[1].startswith('-'):
+        words = words[:1]
+    return ' '.join(words)
+
+
+def _readSpool():
+    events = []
+    try:
+        with open(_spool) as fo:
+            for line in fo:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    pass    # a worker killed mid-write
+    except (IOError, OSError):
+        pass
+    return sorted(events, key=lambda e: (e['ts'], -e['dur']))
+
+
+def summary(events):
+    """ the per-stage summary: [(name, calls, total seconds, max seconds)],
+        most expensive first
+    """
+
+    stages = {}
+    for e in events:
+        calls, total, longest = stages.get(e['name'], (0, 0, 0))
+        stages[e['name']] = (calls + 1, total + e['dur'], max(longest, e['dur']))
+    return sorted([(name, calls, total / 1000000.0, longest / 1000000.0)
+                   for name, (calls, total, longest) in stages.items()],
+                  key=lambda s: (-s[2], s[0]))
+
+
+def finishTrace(filename=None, verbosity=0):
+    """ stop tracing: write the Chrome trace-event JSON to filename (if
+        given) and print the summary at verbosity > 1
+    """
+
+    global _spool
+    if _spool is None or os.getpid() != _mainPid:
+        return
+    events = _readSpool()
+    try:
+        os.unlink(_spool)
+    except OSError:
+        pass
+    _spool = None
+    os.environ.pop(TRACE_ENV, None)
+
+    if filename:
+        names = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                  'args': {'name': 'katello-ssl-tool' if pid == _mainPid else 'worker %d' % pid}}
+                 for pid in sorted(set(e['pid'] for e in events))]
+        with open(filename, 'w') as fo:
+            json.dump({'traceEvents': names + events, 'displayTimeUnit': 'ms'}, fo)
+
+    if verbosity > 1:
+        print("\nTiming summary (seconds):")
+        print("    %-36s %6s %10s %10s" % ('STAGE', 'CALLS', 'TOTAL', 'MAX'))
+        for name, calls, total, longest in summary(events):
+            print("    %-36s %6d %10.3f %10.3f" % (name, calls, total, longest))
@@ -14,7 +14,7 @@ if [[ -f /etc/redhat-release ]]; then
     REPOS=""
   fi
 
-  dnf install ${REPOS} -y openssl rpm-build tree python3 python3-setuptools docbook-utils glibc-langpack-en
+  dnf install ${REPOS} -y openssl rpm-build tree python3 python3-setuptools python3-cryptography cpio docbook-utils glibc-langpack-en
 fi
 
 if [[ -x /usr/bin/docbook2man ]] ; then
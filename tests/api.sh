@@ -0,0 +1,58 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+mkdir elsewhere
+
+# the API neither prints nor changes directories
+python3 > output.txt <<EOF
+import os
+import subprocess
+from katello_certs_tools import api
+
+with open('/etc/pki/katello/private/katello-default-ca.pwd') as fo:
+    password = fo.read()
+steps = []
+progress = lambda step, path, seconds: steps.append(step)
+
+ca = api.genCa(password, force=True, rpm=False, progress=progress, dir='$DIRECTORY/ssl-build',
+               ca_key='katello-default-ca.key', ca_cert='katello-default-ca.crt',
+               set_common_name='example.com', set_org='Katello')
+assert sorted(ca.paths) == ['ca-cert', 'ca-key'], ca
+assert ca.serial and ca.fingerprint, ca
+
+os.chdir('$DIRECTORY/elsewhere')
+server = api.genServer('a.example.com', password, rpm=False, progress=progress,
+                       dir='$DIRECTORY/ssl-build', ca_key='katello-default-ca.key',
+                       ca_cert='katello-default-ca.crt', set_cname=['a.internal'])
+assert os.getcwd() == '$DIRECTORY/elsewhere'
+assert server.paths['server-cert'] == '$DIRECTORY/ssl-build/a.example.com/server.crt', server
+assert steps == ['ca-key', 'ca-cert', 'server-key', 'server-cert-req', 'server-cert'], steps
+
+out = subprocess.check_output(['openssl', 'x509', '-noout', '-serial', '-fingerprint', '-sha256',
+                               '-in', server.paths['server-cert']]).decode('utf-8')
+assert 'serial=%X' % server.serial in out.replace('serial=0', 'serial='), (server, out)
+assert server.fingerprint in out, (server, out)
+
+# failures are exceptions, not exits
+try:
+    api.genCaKey(password, dir='$DIRECTORY/ssl-build', ca_key='katello-default-ca.key')
+except api.FileExistsException:
+    pass
+else:
+    raise AssertionError('an existing CA key was overwritten')
+try:
+    api.genServer('b.example.com', password, dir='$DIRECTORY/nowhere')
+except api.FailedFileDependencyException:
+    pass
+else:
+    raise AssertionError('generated a key set without a CA')
+EOF
+
+test ! -s output.txt
+test ! -e elsewhere/ssl-build
+openssl verify -CAfile ssl-build/katello-default-ca.crt ssl-build/a.example.com/server.crt
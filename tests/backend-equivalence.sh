@@ -0,0 +1,32 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+# strip what legitimately differs between two runs: keys, serials and dates.
+# OpenSSL 1.1.1 also puts a keyid into the self-signed CA's authority key id.
+normalize() {
+  openssl x509 -in $1 -noout -text -certopt no_pubkey,no_sigdump,no_serial,no_validity \
+    | grep -v keyid: | sed -E 's/([0-9A-F]{2}:){7,}[0-9A-F]{2}/HEX/; s/serial:[0-9A-F:]+/serial:SERIAL/'
+}
+
+for backend in openssl cryptography ; do
+  mkdir $backend
+  pushd $backend
+  katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --no-rpm --crypto-backend $backend --set-common-name example.com --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit
+  katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --no-rpm --crypto-backend $backend --set-hostname www.example.com --set-cname cname.example.com --set-org Katello --set-org-unit SomeOrgUnit
+  katello-ssl-tool --gen-client -p file:/etc/pki/katello/private/katello-default-ca.pwd --no-rpm --crypto-backend $backend --set-hostname client.example.com --set-org Katello
+  openssl verify -CAfile ssl-build/KATELLO-TRUSTED-SSL-CERT ssl-build/www.example.com/server.crt ssl-build/client.example.com/server.crt
+  normalize ssl-build/KATELLO-TRUSTED-SSL-CERT > ca.txt
+  normalize ssl-build/www.example.com/server.crt > server.txt
+  normalize ssl-build/client.example.com/server.crt > client.txt
+  openssl req -in ssl-build/www.example.com/server.csr -noout -text -reqopt no_pubkey,no_sigdump > csr.txt
+  popd
+done
+
+for f in ca.txt server.txt client.txt csr.txt ; do
+  diff -u openssl/$f cryptography/$f
+done
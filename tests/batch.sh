@@ -0,0 +1,37 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit
+
+cat > hosts.json <<MANIFEST
+{"hosts": [
+  {"hostname": "capsule1.example.com", "cnames": ["capsule1.internal"], "org": "Katello", "org_unit": "SMART_PROXY"},
+  {"hostname": "capsule2.example.com", "purpose": "client", "rpm": "capsule2.example.com-foreman-proxy-client"},
+  "capsule3.example.com"
+]}
+MANIFEST
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert-dir /etc/pki/katello-certs-tools/certs --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-country US --set-state "North Carolina" --set-city Raleigh --cert-expiration 36500 --batch hosts.json --jobs 2
+
+if [[ -x /usr/bin/tree ]] ; then
+	tree
+fi
+
+test -e ssl-build/capsule1.example.com/katello-httpd-ssl-key-pair-capsule1.example.com-1.0-1.noarch.rpm
+test -e ssl-build/capsule2.example.com/capsule2.example.com-foreman-proxy-client-1.0-1.noarch.rpm
+test -e ssl-build/capsule3.example.com/katello-httpd-ssl-key-pair-capsule3.example.com-1.0-1.noarch.rpm
+
+openssl x509 -in ssl-build/capsule1.example.com/server.crt -noout -text | grep -q DNS:capsule1.internal
+openssl x509 -in ssl-build/capsule2.example.com/server.crt -noout -text | grep -q "SSL Client"
+
+# an invalid manifest is rejected before anything is generated
+echo '[{"hostname": "capsule4.example.com"}, {"hostname": "capsule5.example.com", "purpose": "bogus"}]' > bad.json
+if katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --batch bad.json ; then
+  exit 1
+fi
+test ! -e ssl-build/capsule4.example.com
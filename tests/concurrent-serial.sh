@@ -0,0 +1,24 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+# concurrent runs against one CA must never hand out the same serial
+for host in a b c d ; do
+  katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname $host.example.com --no-rpm &
+done
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname e.example.com --random-serial --no-rpm &
+for job in $(jobs -p) ; do
+  wait $job
+done
+
+for host in a b c d e ; do
+  openssl verify -CAfile ssl-build/katello-default-ca.crt ssl-build/$host.example.com/server.crt
+done
+test $(for host in a b c d e ; do openssl x509 -noout -serial -in ssl-build/$host.example.com/server.crt ; done | sort -u | wc -l) -eq 5
+test $(wc -l < ssl-build/index.txt) -eq 5
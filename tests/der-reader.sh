@@ -0,0 +1,130 @@
+#!/bin/bash
+
+# The in-process DER reader of sslToolDer (the backends, --inventory,
+# --ledger, --reconcile): it agrees with python3-cryptography where that is
+# installed, and anything malformed fails with ValueError, the one error its
+# callers handle.
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-country US --set-org Katello --no-rpm
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname rsa.example.com --set-cname rsa.internal --no-rpm --key-type rsa --key-size 2048
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname ecdsa.example.com --no-rpm --key-type ecdsa --key-size 384
+katello-ssl-tool --gen-client -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname ed25519.example.com --no-rpm --key-type ed25519 --key-size 256
+
+python3 - <<PYTHON
+import glob
+import random
+
+from katello_certs_tools.sslToolDer import readDer, parseCertificate, parseCertReq, \
+    certKeyIds, certPublicKey, privateKeyInfo, privateKeyPublicKey
+
+certs = sorted(glob.glob('ssl-build/*.crt') + glob.glob('ssl-build/*/server.crt'))
+reqs = sorted(glob.glob('ssl-build/*/server.csr'))
+keys = sorted(glob.glob('ssl-build/*/server.key'))
+assert (len(certs), len(reqs), len(keys)) == (4, 3, 3), (certs, reqs, keys)
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.serialization import load_der_private_key
+except ImportError:
+    x509 = None
+
+# the fields that are read agree with cryptography
+if x509 is not None:
+    def sans(obj):
+        try:
+            ext = obj.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+        except x509.ExtensionNotFound:
+            return []
+        return ['DNS:' + name for name in ext.value.get_values_for_type(x509.DNSName)]
+
+    def keyIds(cert):
+        ids = []
+        for cls, attr in ((x509.SubjectKeyIdentifier, 'digest'), (x509.AuthorityKeyIdentifier, 'key_identifier')):
+            try:
+                keyId = getattr(cert.extensions.get_extension_for_class(cls).value, attr)
+            except x509.ExtensionNotFound:
+                keyId = None
+            ids.append(keyId and keyId.hex())
+        return tuple(ids)
+
+    def spki(obj):
+        return obj.public_key().public_bytes(serialization.Encoding.DER,
+                                             serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    for path in certs:
+        der = readDer(path)
+        cert = x509.load_der_x509_certificate(der)
+        info = parseCertificate(der)
+        assert info['serial'] == '%X' % cert.serial_number, (path, info)
+        notAfter = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after
+        assert info['notAfter'] == notAfter.strftime('%Y-%m-%dT%H:%M:%SZ'), (path, info)
+        assert info['sans'] == sans(cert), (path, info)
+        assert certKeyIds(der) == keyIds(cert), path
+        assert certPublicKey(der) == spki(cert), path
+    for path in reqs:
+        der = readDer(path, 'CERTIFICATE REQUEST')
+        req = x509.load_der_x509_csr(der)
+        info = parseCertReq(der)
+        assert info['sans'] == sans(req), (path, info)
+        assert info['publicKey'] == spki(req), path
+    for path in keys:
+        key = load_der_private_key(readDer(path, 'PRIVATE KEY'), None)
+        keySize = getattr(key, 'key_size', 256)
+        assert privateKeyInfo(readDer(path, 'PRIVATE KEY'))[1] == keySize, path
+        # Ed25519 keys only hold their seed
+        publicKey = privateKeyPublicKey(readDer(path, 'PRIVATE KEY'))
+        assert publicKey == (None if 'ed25519' in path else spki(key)), path
+
+# truncated or corrupted, anything fails with ValueError
+samples = [(parser, readDer(path, label))
+           for paths, label, parsers in ((certs, 'CERTIFICATE', (parseCertificate, certKeyIds, certPublicKey)),
+                                         (reqs, 'CERTIFICATE REQUEST', (parseCertReq,)),
+                                         (keys, 'PRIVATE KEY', (privateKeyInfo, privateKeyPublicKey)))
+           for path in paths for parser in parsers]
+
+def broken(der, rnd):
+    yield der[:rnd.randrange(len(der))]
+    data = bytearray(der)
+    for _i in range(rnd.randint(1, 3)):
+        data[rnd.randrange(len(data))] = rnd.randrange(256)
+    yield bytes(data)
+    pos = rnd.randrange(len(der))
+    yield der[:pos] + der[pos + rnd.randint(1, 8):]
+
+rnd = random.Random(2013)
+for parser, der in samples:
+    for _i in range(300):
+        for data in broken(der, rnd):
+            try:
+                parser(data)
+            except ValueError:
+                pass
+    for data in (b'', b'\x30', b'\x30\x84\xff\xff\xff\xff', b'\x30\x00', b'\x30\x03\x02\x01\x00'):
+        try:
+            parser(data)
+        except ValueError:
+            continue
+        raise AssertionError('%s accepted %r' % (parser.__name__, data))
+PYTHON
+
+# a truncated certificate is listed as an error by --inventory
+python3 - <<PYTHON
+import base64
+
+from katello_certs_tools.sslToolDer import readDer
+
+der = readDer('ssl-build/rsa.example.com/server.crt')[:600]
+with open('ssl-build/rsa.example.com/server.crt', 'w') as fo:
+    fo.write('-----BEGIN CERTIFICATE-----\n%s\n-----END CERTIFICATE-----\n'
+             % base64.encodebytes(der).decode('ascii'))
+PYTHON
+katello-ssl-tool --inventory > inventory.txt
+grep "^-  *error  *rsa.example.com.*truncated DER" inventory.txt
@@ -0,0 +1,54 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname a.example.com --set-cname a.internal --no-rpm
+katello-ssl-tool --gen-client -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname b.example.com --cert-expiration 10 --no-rpm
+
+katello-ssl-tool --inventory --format json > inventory.json
+test -f ssl-build/katello-inventory.json
+
+# every field agrees with openssl
+python3 - <<PYTHON
+import json
+import subprocess
+
+entries = dict((e['host'] or 'ca', e) for e in json.load(open('inventory.json')))
+assert sorted(entries) == ['a.example.com', 'b.example.com', 'ca'], entries
+assert [entries[h]['kind'] for h in ('ca', 'a.example.com', 'b.example.com')] == ['ca', 'server', 'client'], entries
+assert entries['a.example.com']['sans'] == ['DNS:a.example.com', 'DNS:a.internal'], entries
+for e in entries.values():
+    out = subprocess.check_output(['openssl', 'x509', '-noout', '-serial', '-subject', '-nameopt', 'RFC2253',
+                                   '-in', e['path']]).decode('utf-8')
+    assert 'serial=%s\n' % e['serial'] in out.replace('serial=0', 'serial='), (e, out)
+    assert 'subject=%s\n' % e['subject'] in out, (e, out)
+    assert (e['keyType'], e['keySize']) == ('RSA', 4096), e
+PYTHON
+
+test "$(katello-ssl-tool --inventory --expiring-within 30 | tail -n +2 | awk '{print $3}')" = b.example.com
+
+# a broken certificate is listed, not fatal; the cache notices the change
+echo garbage > ssl-build/a.example.com/server.crt
+katello-ssl-tool --inventory > inventory.txt
+grep "^-  *error  *a.example.com" inventory.txt
+
+# a build directory with the default file names: the CA certificate
+# (KATELLO-TRUSTED-SSL-CERT) has no .crt suffix
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --dir default-build --set-common-name example.com --no-rpm
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --dir default-build --set-hostname c.example.com --no-rpm
+katello-ssl-tool --inventory --dir default-build --format json > default.json
+python3 - <<PYTHON
+import json
+
+entries = json.load(open('default.json'))
+assert sorted((e['host'], e['kind']) for e in entries if e['host']) == [('c.example.com', 'server')], entries
+assert [e['path'].rsplit('/', 1)[-1] for e in entries if e['kind'] == 'ca'] == ['KATELLO-TRUSTED-SSL-CERT'], entries
+PYTHON
+katello-ssl-tool --ledger --import --dir default-build
+test "$(katello-ssl-tool --ledger --dir default-build --format json | python3 -c 'import json, sys; print(sorted(r["kind"] for r in json.load(sys.stdin)))')" = "['ca', 'server']"
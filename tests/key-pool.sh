@@ -0,0 +1,26 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+katello-ssl-tool --fill-key-pool --size 2 --jobs 2
+test $(ls ssl-build/key-pool/*.key | wc -l) -eq 2
+
+# concurrent claims must never hand out the same key
+katello-ssl-tool --gen-server --key-only --use-key-pool --set-hostname a.example.com &
+katello-ssl-tool --gen-server --key-only --use-key-pool --set-hostname b.example.com &
+wait
+
+test $(ls ssl-build/key-pool/*.key 2>/dev/null | wc -l) -eq 0
+if cmp -s ssl-build/a.example.com/server.key ssl-build/b.example.com/server.key ; then
+  exit 1
+fi
+
+# an empty pool falls back to generating the key inline
+katello-ssl-tool --gen-server --key-only --use-key-pool --set-hostname c.example.com
+test -s ssl-build/c.example.com/server.key
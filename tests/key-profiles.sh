@@ -0,0 +1,46 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --no-rpm --set-country US --set-org Katello --key-type ecdsa --key-size 384
+
+openssl x509 -in ssl-build/katello-default-ca.crt -noout -text > ca.txt
+grep -q "ecdsa-with-SHA384" ca.txt
+grep -q "NIST CURVE: P-384" ca.txt
+
+for profile in "rsa 2048" "ecdsa 256" "ed25519 256" ; do
+  set -- $profile
+  katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname $1.example.com --set-country US --no-rpm --key-type $1 --key-size $2
+  openssl verify -CAfile ssl-build/katello-default-ca.crt ssl-build/$1.example.com/server.crt
+  python3 -c "from katello_certs_tools.sslToolBackend import getBackend; assert getBackend('cryptography').verifyCert('ssl-build/katello-default-ca.crt', 'ssl-build/$1.example.com/server.crt')[0] == 0"
+  openssl x509 -in ssl-build/$1.example.com/server.crt -noout -text > $1.txt
+  # signed with the digest of the (P-384) CA key
+  grep -q "ecdsa-with-SHA384" $1.txt
+done
+
+grep -q "Public-Key: (2048 bit)" rsa.txt
+grep -q "Key Encipherment" rsa.txt
+grep -q "NIST CURVE: P-256" ecdsa.txt
+grep -q "ED25519" ed25519.txt
+for t in ecdsa ed25519 ; do
+  if grep -q "Key Encipherment" $t.txt ; then
+    exit 1
+  fi
+done
+
+# the pool of another profile is not the default one
+katello-ssl-tool --fill-key-pool --size 2 --key-type ecdsa
+test "$(ls ssl-build/key-pool/ecdsa-256/*.key | wc -l)" = 2
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname pooled.example.com --set-country US --no-rpm --key-type ecdsa --use-key-pool
+test "$(ls ssl-build/key-pool/ecdsa-256/*.key | wc -l)" = 1
+openssl x509 -in ssl-build/pooled.example.com/server.crt -noout -text | grep -q "NIST CURVE: P-256"
+
+# invalid profiles are rejected
+ret=0
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname bad.example.com --key-type ecdsa --key-size 4096 || ret=$?
+test $ret = 35
+test ! -e ssl-build/bad.example.com
@@ -0,0 +1,33 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+for host in a b ; do
+  katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname $host.example.com --no-rpm
+done
+OLD_SERIAL=$(openssl x509 -noout -serial -in ssl-build/a.example.com/server.crt | cut -d= -f2)
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname a.example.com --no-rpm
+
+# the replaced certificate is still on record
+test $(katello-ssl-tool --ledger --hostname a.example.com | tail -n +2 | wc -l) -eq 2
+katello-ssl-tool --ledger --serial $OLD_SERIAL | grep a.example.com
+
+FINGERPRINT=$(openssl x509 -noout -fingerprint -sha256 -in ssl-build/b.example.com/server.crt | cut -d= -f2)
+SERIAL=$(openssl x509 -noout -serial -in ssl-build/b.example.com/server.crt | cut -d= -f2)
+katello-ssl-tool --ledger --fingerprint $FINGERPRINT --format json > b.json
+python3 -c "import json; [b] = json.load(open('b.json')); assert b['serial'] == '$SERIAL'.lstrip('0') and b['hostname'] == 'b.example.com', b"
+
+# index.txt on demand, as openssl ca writes it
+katello-ssl-tool --ledger --format index > index.txt
+diff <(cut -f1,2,4,6 index.txt | sort) <(cut -f1,2,4,6 ssl-build/index.txt | sort)
+
+# build directories older than the ledger
+rm ssl-build/katello-ledger.db
+katello-ssl-tool --ledger --import
+test $(katello-ssl-tool --ledger | tail -n +2 | wc -l) -eq 3
@@ -0,0 +1,37 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --set-common-name example.com --ca-cert-rpm katello-default-ca --rpm-builder native
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --set-hostname www.example.com --server-rpm www.example.com-apache --rpm-builder native
+
+# no src.rpm with the native builder
+test ! -e ssl-build/katello-default-ca-1.0-1.src.rpm
+test ! -e ssl-build/www.example.com/www.example.com-apache-1.0-1.src.rpm
+test "$(cat ssl-build/www.example.com/latest.txt)" = "www.example.com-apache-1.0-1.noarch.rpm"
+
+CA_RPM=ssl-build/katello-default-ca-1.0-1.noarch.rpm
+SERVER_RPM=ssl-build/www.example.com/www.example.com-apache-1.0-1.noarch.rpm
+
+rpm -K --nosignature $CA_RPM $SERVER_RPM
+test "$(rpm -qp --qf '%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}' $CA_RPM)" = "katello-default-ca-1.0-1.noarch"
+test "$(rpm -qpl $CA_RPM)" = "/etc/pki/katello-certs-tools/KATELLO-TRUSTED-SSL-CERT"
+rpm -qp --qf '[%{FILEMODES:perms} %{FILEUSERNAME} %{FILENAMES}\n]' $SERVER_RPM | grep -q -- "-rw------- root /etc/pki/katello-certs-tools/private/server.key"
+rpm -qp --scripts $SERVER_RPM | grep -q "postuninstall scriptlet"
+
+# the payload is what went in
+rpm2cpio $SERVER_RPM | cpio -i --quiet --to-stdout ./etc/pki/katello-certs-tools/certs/server.crt | cmp - ssl-build/www.example.com/server.crt
+
+# unchanged inputs: the latest RPM is kept, not rebuilt
+katello-ssl-tool --gen-ca --rpm-only --ca-cert-rpm katello-default-ca --rpm-builder native
+katello-ssl-tool --gen-server --rpm-only --set-hostname www.example.com --server-rpm www.example.com-apache --rpm-builder native
+test ! -e ssl-build/katello-default-ca-1.0-2.noarch.rpm
+test ! -e ssl-build/www.example.com/www.example.com-apache-1.0-2.noarch.rpm
+
+# the release is bumped off the native RPMs as well
+katello-ssl-tool --gen-ca --rpm-only --ca-cert-rpm katello-default-ca --rpm-builder native --rpm-vendor "Example Corp."
+test -e ssl-build/katello-default-ca-1.0-2.noarch.rpm
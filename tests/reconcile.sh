@@ -0,0 +1,97 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --no-rpm --set-country US --set-org Katello
+
+GEN_SERVER="katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname foo.example.com --set-cname bar.example.com --set-country US --set-org Katello --reconcile"
+HOST=ssl-build/foo.example.com
+
+$GEN_SERVER > first.txt
+grep -q "key        regenerating: server.key is missing" first.txt
+test -f $HOST/katello-httpd-ssl-key-pair-foo.example.com-1.0-1.noarch.rpm
+
+# nothing changed: nothing is regenerated
+cp -p $HOST/server.crt before.crt
+$GEN_SERVER > second.txt
+grep -q "key        skipped" second.txt
+grep -q "cert-req   skipped" second.txt
+grep -q "cert       skipped" second.txt
+cmp $HOST/server.crt before.crt
+test ! -e $HOST/server.key.1
+test ! -e $HOST/katello-httpd-ssl-key-pair-foo.example.com-1.0-2.noarch.rpm
+
+# expiring: only the certificate
+$GEN_SERVER --expiring-within 100000d > expiring.txt
+grep -q "cert-req   skipped" expiring.txt
+grep -q "cert       regenerating: the certificate expires" expiring.txt
+
+# another purpose: the request is signed again
+katello-ssl-tool --gen-client -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname foo.example.com --set-cname bar.example.com --set-country US --set-org Katello --reconcile > client.txt
+grep -q "cert-req   skipped" client.txt
+grep -q "cert       regenerating: a server certificate, not a client one" client.txt
+test ! -e $HOST/server.csr.1
+
+# another cname: the request and the certificate, from the same key
+$GEN_SERVER --set-cname baz.example.com > cname.txt
+grep -q "key        skipped" cname.txt
+grep -q "cert-req   regenerating: the request names are" cname.txt
+openssl x509 -in $HOST/server.crt -noout -text | grep -q "DNS:baz.example.com"
+
+# a new CA: signed again
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --no-rpm --set-country US --set-org Katello
+$GEN_SERVER --set-cname baz.example.com > ca.txt
+grep -q "cert       regenerating: the certificate is not signed by the current CA" ca.txt
+openssl verify -CAfile ssl-build/katello-default-ca.crt $HOST/server.crt
+
+# issuer and key identifiers of the current CA, signed by another key: the
+# signature is verified, with either backend
+for backend in openssl cryptography ; do
+  python3 - $HOST/server.crt <<PYTHON
+import sys
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+with open(sys.argv[1], 'rb') as fo:
+    cert = x509.load_pem_x509_certificate(fo.read())
+builder = x509.CertificateBuilder().subject_name(cert.subject).issuer_name(cert.issuer) \
+    .public_key(cert.public_key()).serial_number(cert.serial_number) \
+    .not_valid_before(getattr(cert, 'not_valid_before_utc', None) or cert.not_valid_before) \
+    .not_valid_after(getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after)
+for extension in cert.extensions:
+    builder = builder.add_extension(extension.value, extension.critical)
+key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+with open(sys.argv[1], 'wb') as fo:
+    fo.write(builder.sign(key, hashes.SHA256()).public_bytes(serialization.Encoding.PEM))
+PYTHON
+  $GEN_SERVER --set-cname baz.example.com --crypto-backend $backend > forged-$backend.txt
+  grep -q "cert-req   skipped" forged-$backend.txt
+  grep -q "cert       regenerating: the certificate is not signed by the current CA" forged-$backend.txt
+  openssl verify -CAfile ssl-build/katello-default-ca.crt $HOST/server.crt
+done
+$GEN_SERVER --set-cname baz.example.com > signed.txt
+grep -q "cert       skipped: .*signed by the current CA" signed.txt
+
+# another key profile: everything
+$GEN_SERVER --set-cname baz.example.com --key-type ecdsa --key-size 256 > profile.txt
+grep -q "key        regenerating: the key is rsa-4096, not ecdsa-256" profile.txt
+openssl x509 -in $HOST/server.crt -noout -text | grep -q "NIST CURVE: P-256"
+
+# a replaced key of the same profile, even one older than the request: the
+# request and the certificate
+for profile in "ecdsa 256 -algorithm EC -pkeyopt ec_paramgen_curve:P-256" "ed25519 256 -algorithm ED25519" ; do
+  set -- $profile
+  $GEN_SERVER --set-cname baz.example.com --key-type $1 --key-size $2 > /dev/null
+  openssl genpkey ${@:3} -out $HOST/server.key
+  touch -d 2020-01-01 $HOST/server.key
+  $GEN_SERVER --set-cname baz.example.com --key-type $1 --key-size $2 > replaced-$1.txt
+  grep -q "key        skipped" replaced-$1.txt
+  grep -q "cert-req   regenerating: the request is not of the key" replaced-$1.txt
+  test "$(openssl pkey -in $HOST/server.key -pubout)" = "$(openssl x509 -in $HOST/server.crt -noout -pubkey)"
+done
@@ -0,0 +1,37 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname a.example.com --set-cname a.internal --set-org AOrg --cert-expiration 5
+katello-ssl-tool --gen-client -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname b.example.com --cert-expiration 5 --no-rpm
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname c.example.com --no-rpm
+
+SUBJECT=$(openssl x509 -noout -subject -in ssl-build/a.example.com/server.crt)
+SANS=$(openssl x509 -noout -ext subjectAltName -in ssl-build/a.example.com/server.crt)
+C_SERIAL=$(openssl x509 -noout -serial -in ssl-build/c.example.com/server.crt)
+md5sum ssl-build/*/server.key > keys.md5
+
+katello-ssl-tool --renew --expiring-within 30d -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --jobs 2
+
+# the expiring certificates were re-signed for the same key, name and SANs
+md5sum -c keys.md5
+for host in a b ; do
+  openssl verify -CAfile ssl-build/katello-default-ca.crt ssl-build/$host.example.com/server.crt
+  openssl x509 -noout -checkend $((30*86400)) -in ssl-build/$host.example.com/server.crt
+done
+test "$(openssl x509 -noout -subject -in ssl-build/a.example.com/server.crt)" = "$SUBJECT"
+test "$(openssl x509 -noout -ext subjectAltName -in ssl-build/a.example.com/server.crt)" = "$SANS"
+test "$(openssl x509 -noout -text -in ssl-build/b.example.com/server.crt | grep -A1 "Netscape Cert Type" | tail -1 | tr -d " ")" = SSLClient
+
+# the certificate that does not expire was left alone
+test "$(openssl x509 -noout -serial -in ssl-build/c.example.com/server.crt)" = "$C_SERIAL"
+
+# RPMs are rebuilt only for the hosts that had one
+grep -q "key-pair-a.example.com-1.0-2.noarch.rpm" ssl-build/a.example.com/latest.txt
+test ! -e ssl-build/b.example.com/latest.txt
@@ -0,0 +1,55 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+SOCKET=$DIRECTORY/katello-ssl.sock
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --ca-cert-rpm katello-default-ca --set-country US --set-state "North Carolina" --set-city Raleigh --set-org Katello --set-org-unit SomeOrgUnit --no-rpm
+
+katello-ssl-tool --serve --socket $SOCKET -p file:/etc/pki/katello/private/katello-default-ca.pwd --jobs 2 --backlog 1 &
+SERVER=$!
+trap "kill $SERVER 2>/dev/null || true; rm -rf $DIRECTORY" EXIT
+
+for i in $(seq 1 50) ; do
+  test -S $SOCKET && break
+  sleep 0.1
+done
+test "$(stat -c %a $SOCKET)" = 600
+
+client() {
+  python3 -m katello_certs_tools.sslToolServe $SOCKET "$@"
+}
+
+# more requests than workers and queue: the rest wait for room
+PIDS=""
+for host in a b c d ; do
+  client --gen-server --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname $host.example.com --no-rpm &
+  PIDS="$PIDS $!"
+done
+for pid in $PIDS ; do
+  wait $pid
+done
+
+for host in a b c d ; do
+  openssl verify -CAfile ssl-build/katello-default-ca.crt ssl-build/$host.example.com/server.crt
+done
+test $(for host in a b c d ; do openssl x509 -noout -serial -in ssl-build/$host.example.com/server.crt ; done | sort -u | wc -l) -eq 4
+
+# errors come back with the exit code the commandline would have
+RET=0
+client --gen-server --set-hostname e.example.com --set-country USA --no-rpm || RET=$?
+test $RET -eq 32
+RET=0
+client --fill-key-pool || RET=$?
+test $RET -eq 41
+
+# a request running past its timeout is killed
+test $(python3 -c "from katello_certs_tools.sslToolServe import request; print(request('$SOCKET', ['--gen-server', '--set-hostname', 'f.example.com', '--no-rpm'], timeout=0.001)['code'])") -eq 40
+
+kill $SERVER
+wait $SERVER
+test ! -e $SOCKET
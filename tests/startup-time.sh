@@ -0,0 +1,35 @@
+#!/bin/bash
+
+# cold start budget: the imports of the cheapest step,
+# "katello-ssl-tool --gen-server --key-only", have to stay below
+# STARTUP_BUDGET_MS and must not pull in rpm, multiprocessing or cryptography.
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+BUDGET_US=$(( ${STARTUP_BUDGET_MS:-250} * 1000 ))
+
+python3 -X importtime $(command -v katello-ssl-tool) --gen-server --key-only --set-hostname host.example.com 2> importtime.log
+test -s ssl-build/host.example.com/server.key
+
+if grep -E '\| +(rpm|concurrent\.futures|cryptography)$' importtime.log ; then
+  exit 1
+fi
+
+# sum of the cumulative times of the top level imports
+total=$(awk -F'|' '/^import time: +[0-9]/ && $3 ~ /^ [^ ]/ { sum += $2 } END { print sum }' importtime.log)
+test $total -lt $BUDGET_US
+
+# the settings are figured when read: checking the commandline resolves a
+# few of them and never reads the host's openssl.cnf
+python3 - <<PYTHON
+from katello_certs_tools.sslToolCli import processCommandline
+
+options, settings = processCommandline(['--gen-server', '--key-only', '--set-hostname', 'host.example.com'])
+assert settings._conf is None
+assert len(settings._values) < len(settings) / 2, sorted(settings._values)
+PYTHON
+katello-ssl-tool --gen-server --set-hostname host.example.com --set-country USA 2>&1 | grep -q "country code must be exactly two characters"
@@ -0,0 +1,29 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --no-rpm --set-country US --set-org Katello
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname foo.example.com --set-country US --no-rpm --tar --tar-compression gzip
+
+ARCHIVE=ssl-build/foo.example.com/katello-httpd-ssl-archive-foo.example.com-1.0-1.tar.gz
+test -f $ARCHIVE
+[[ $(stat -c %a $ARCHIVE) == 600 ]]
+tar -tzvf $ARCHIVE > listing.txt
+grep -q -- "^-rw------- root/root .* etc/pki/katello-certs-tools/private/server.key$" listing.txt
+grep -q -- "^-rw-r--r-- root/root .* etc/pki/katello-certs-tools/certs/server.crt$" listing.txt
+
+# deploys what was generated
+mkdir root
+tar -C root -xzf $ARCHIVE
+cmp root/etc/pki/katello-certs-tools/private/server.key ssl-build/foo.example.com/server.key
+cmp root/etc/pki/katello-certs-tools/certs/server.crt ssl-build/foo.example.com/server.crt
+
+# built with the RPM, the archive takes its version-release
+katello-ssl-tool --gen-server --set-hostname foo.example.com --rpm-only --tar
+test -f ssl-build/foo.example.com/katello-httpd-ssl-key-pair-foo.example.com-1.0-1.noarch.rpm
+test -f ssl-build/foo.example.com/katello-httpd-ssl-archive-foo.example.com-1.0-1.tar
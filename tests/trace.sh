@@ -0,0 +1,51 @@
+#!/bin/bash
+
+DIRECTORY=$(mktemp -d)
+trap "rm -rf $DIRECTORY" EXIT
+cd $DIRECTORY
+
+set -xe
+
+katello-ssl-tool --gen-ca -p file:/etc/pki/katello/private/katello-default-ca.pwd --force --ca-cert-dir /etc/pki/katello-certs-tools/certs --set-common-name example.com --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --no-rpm --set-country US --set-org Katello
+
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-hostname a.example.com --set-country US --no-rpm --trace single.json
+
+printf '{"hosts": ["b.example.com", "c.example.com"]}' > hosts.json
+katello-ssl-tool --gen-server -p file:/etc/pki/katello/private/katello-default-ca.pwd --ca-cert katello-default-ca.crt --ca-key katello-default-ca.key --set-country US --no-rpm --batch hosts.json --jobs 2 --trace batch.json -vv > output.txt
+
+grep -q "Timing summary" output.txt
+grep -q genServerCert output.txt
+
+python3 - <<PYTHON
+import json
+
+events = json.load(open('single.json'))['traceEvents']
+spans = [e for e in events if e['ph'] == 'X']
+names = [e['name'] for e in spans]
+for name in ('katello-ssl-tool --gen-server', 'genServerKey', 'genServerCertReq', 'genServerCert', 'openssl ca'):
+    assert name in names, (name, names)
+openssl = [e for e in spans if e['cat'] == 'process']
+assert all(e['args']['exitcode'] == 0 and 'stdout_bytes' in e['args'] for e in openssl), openssl
+# the passphrase is nowhere in the trace
+assert open('/etc/pki/katello/private/katello-default-ca.pwd').read().strip() not in open('single.json').read()
+
+# stages nest within the command
+root = [e for e in spans if e['cat'] == 'command'][0]
+for e in spans:
+    assert root['ts'] <= e['ts'] and e['ts'] + e['dur'] <= root['ts'] + root['dur'] + 1000, e
+
+# the keys of the batch are generated, and traced, in worker processes
+events = json.load(open('batch.json'))['traceEvents']
+certs = [e for e in events if e['name'] == 'genServerCert']
+assert len(certs) == 2, certs
+keys = [e for e in events if e['name'] == '_genKeyWorker']
+assert len(keys) == 2, keys
+workers = set(e['pid'] for e in keys)
+root = [e for e in events if e.get('cat') == 'command'][0]
+assert root['pid'] not in workers, (root, workers)
+names = dict((e['pid'], e['args']['name']) for e in events if e['ph'] == 'M')
+assert all(names[pid].startswith('worker') for pid in workers), names
+PYTHON
+
+# nothing is left behind
+test -z "$(ls /tmp/katello-ssl-trace-* 2>/dev/null)"